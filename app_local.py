@@ -4,84 +4,229 @@ BaiduCBIT 本地版本 - 完全兼容服务器端API
 连接远程服务器进行AI图像生成
 """
 
+import time
+
+# 启动耗时统计起点，尽量早于其它导入
+_IMPORT_START = time.perf_counter()
+
 import os
 import sys
 import json
-import time
 import base64
+import mimetypes
 import hashlib
 import hmac
+import io
+import threading
 import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from datetime import datetime
-from typing import Dict, Any, Optional
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Any, List, Optional
 
 # 添加当前目录到Python路径
 sys.path.insert(0, str(Path(__file__).parent))
 
-from flask import Flask, render_template, request, jsonify, send_from_directory, Response
+from flask import Blueprint, Flask, current_app, request, jsonify, send_from_directory, Response, stream_with_context
 from flask_cors import CORS
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import text
+from sqlalchemy import func, text
 from dotenv import load_dotenv
+from werkzeug.local import LocalProxy
+from werkzeug.security import safe_join
 import requests
 
-# 加载环境变量
-load_dotenv(dotenv_path='config_local.env')
+import image_preprocess
+import server_timing
+import static_assets
+import upstream_json
+from file_serving import FileSender
+from hedging import Hedger
+from image_preprocess import ImagePreprocessor
+from job_eta import PROGRESS_STATUSES, elapsed_ms, observe as observe_eta, predict as predict_eta
+from job_outbox import OutboxDispatcher, PermanentError
+from job_export import csv_stream, iter_job_rows, ndjson_stream, zip_stream
+from job_params import compact_legacy_params, decode_params, store_params
+from job_retention import RetentionWorker, configure_sqlite
+from job_rollups import PERIODS, install_rollups, read_stats
+from result_prefetch import ResultPrefetcher, file_key, file_pin
+from shared_cache import LocalCache, open_cache
+from upstream_pool import Backend, BackendPool, backend_tag, parse_server_urls
+from video_stream import VideoCache, request_headers, stream_response
+
+
+class StartupReport:
+    """启动耗时报告 - 记录从导入到可服务各阶段的耗时"""
+
+    LABELS = {
+        'imports': '导入依赖',
+        'config': '加载配置',
+        'app': '创建应用',
+        'database': '初始化数据库',
+        'ready': '开始监听',
+        'first_request': '首个请求',
+    }
+
+    def __init__(self, origin: float):
+        self.origin = origin
+        self.phases: Dict[str, float] = {}
+        self._last = origin
+
+    def mark(self, name: str):
+        """记录阶段结束时间，同名阶段只记录第一次"""
+        if name in self.phases:
+            return
+        now = time.perf_counter()
+        self.phases[name] = (now - self._last) * 1000
+        self._last = now
+
+    def as_dict(self) -> Dict[str, float]:
+        result = {name: round(ms, 1) for name, ms in self.phases.items()}
+        result['total'] = round((self._last - self.origin) * 1000, 1)
+        return result
+
+    def summary(self) -> str:
+        lines = ["⏱️  启动耗时:"]
+        for name, ms in self.phases.items():
+            lines.append(f"   {self.LABELS.get(name, name)}: {ms:.1f}ms")
+        lines.append(f"   合计: {(self._last - self.origin) * 1000:.1f}ms")
+        return '\n'.join(lines)
+
+
+startup_report = StartupReport(_IMPORT_START)
+startup_report.mark('imports')
+
+
+def is_ci() -> bool:
+    """是否运行在CI环境"""
+    return os.getenv('CI', '').lower() == 'true'
+
+
+# 可以安全重复发送的读请求（结果和文件只存在于所属后端，对冲请求发往同一后端）
+HEDGED_PATHS = ('/api/result', '/api/proxy/view', '/api/video/status/')
+
 
 class RemoteAPIClient:
-    """远程API客户端 - 完全代理服务器端API"""
+    """远程API客户端 - 完全代理服务器端API
+
+    SERVER_URL 可以配置多个后端（逗号分隔），新任务按未完成任务数和健康状态路由，
+    后续请求由调用方通过 backend 参数固定到任务所属后端。
+    """
     
-    def __init__(self, server_url: str = None):
+    def __init__(self, server_url: str = None, cache=None):
         self.server_url = server_url or os.getenv('SERVER_URL', 'http://113.106.62.42:9500')
+        # 多进程部署时通过共享缓存交换健康状态与任务归属
+        self.cache = cache if cache is not None else LocalCache()
+        self.pool = BackendPool(
+            parse_server_urls(self.server_url),
+            job_ttl=float(os.getenv('UPSTREAM_JOB_TTL', '1800')),
+            cache=self.cache,
+        )
         self.session = requests.Session()
         self.session.headers.update({
             'User-Agent': 'BaiduCBIT-Local/2.0'
         })
+        # 记录上游建连耗时
+        adapter = server_timing.TimedHTTPAdapter()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._monitors: List[threading.Thread] = []
+        # 幂等读请求的对冲（可选）
+        self.hedger = Hedger(
+            HEDGED_PATHS,
+            percentile=float(os.getenv('HEDGE_PERCENTILE', '95')),
+            budget=float(os.getenv('HEDGE_BUDGET', '0.1')),
+            min_delay_ms=float(os.getenv('HEDGE_MIN_DELAY_MS', '20')),
+        ) if os.getenv('HEDGE_REQUESTS', 'false').lower() == 'true' else None
+    
+    @property
+    def healthy(self) -> Optional[bool]:
+        """后台探测结果，首次探测完成前为 None"""
+        return self.pool.healthy
     
-    def proxy_request(self, method: str, path: str, **kwargs) -> requests.Response:
-        """代理请求到远程服务器"""
-        url = f"{self.server_url}{path}"
-        return self.session.request(method, url, **kwargs)
+    def proxy_request(self, method: str, path: str, backend: str = None, **kwargs) -> requests.Response:
+        """代理请求到远程服务器
+
+        backend 为空时按负载选择后端，实际使用的后端地址记录在 response.backend 上。
+        启用对冲时，HEDGED_PATHS 下的GET请求慢于历史分位延迟会向同一后端再发一次。
+        始终以流式方式发起请求以区分首字节与响应体传输耗时，
+        调用方未要求 stream 时在此读取完整响应体。
+        """
+        target = self.pool.get(backend) or self.pool.choose()
+        url = f"{target.url}{path}"
+        stream = kwargs.pop('stream', False)
+        connect_before = server_timing.get('connect')
+        start = time.perf_counter()
+        try:
+            if self.hedger and self.hedger.applies(method, path):
+                response = self.hedger.run(path, lambda: self.session.request(method, url, stream=True, **kwargs))
+            else:
+                response = self.session.request(method, url, stream=True, **kwargs)
+        except (requests.ConnectionError, requests.Timeout):
+            # 被动健康检查：连接失败立即摘除，等待后台探测恢复
+            target.healthy = False
+            raise
+        waited = (time.perf_counter() - start) * 1000
+        server_timing.record('ttfb', waited - (server_timing.get('connect') - connect_before))
+        if not stream:
+            with server_timing.phase('transfer'):
+                response.content
+        response.backend = target.url
+        return response
     
-    def health_check(self) -> bool:
+    def health_check(self, backend: str = None) -> bool:
         """健康检查"""
+        target = self.pool.get(backend) or self.pool.primary
         try:
-            response = self.session.get(f"{self.server_url}/health", timeout=10)
+            response = self.session.get(f"{target.url}/health", timeout=10)
             return response.status_code == 200
         except:
             return False
 
-# 创建Flask应用
-app = Flask(__name__, 
-           template_folder='templates',
-           static_folder='static')
-CORS(app)
-
-# 配置
-app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'local-dev-key')
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB
-
-# 创建远程API客户端
-api_client = RemoteAPIClient()
-
-# 本地SQLite数据库（用于缓存）
-# 在CI环境中直接使用内存数据库
-ci_env = os.getenv('CI', '').lower() == 'true'
-if ci_env:
-    database_uri = 'sqlite:///:memory:'
-    print("🔧 CI环境检测到，使用内存数据库")
-else:
-    database_uri = os.getenv('SQLALCHEMY_DATABASE_URI', 'sqlite:///instance/local_cache.db')
-    # 确保数据库目录存在
-    db_path = database_uri.replace('sqlite:///', '')
-    db_dir = os.path.dirname(db_path)
-    if db_dir:
-        os.makedirs(db_dir, exist_ok=True)
+    def start_health_monitor(self, interval: float = 30):
+        """在后台线程中周期性检查各后端连接，不阻塞启动"""
+        if self._monitors:
+            return
+
+        def run(backend: Backend):
+            while True:
+                healthy = self._probe(backend, interval)
+                if healthy != backend.healthy:
+                    if healthy:
+                        print(f"✅ 服务器连接正常: {backend.url}")
+                    else:
+                        print(f"⚠️  警告: 无法连接到服务器 {backend.url}，请检查网络和服务器状态")
+                        print("   部分功能可能无法正常使用")
+                backend.healthy = healthy
+                time.sleep(interval)
+
+        for backend in self.pool.backends:
+            thread = threading.Thread(target=run, args=(backend,), name=f'upstream-health-{backend.url}', daemon=True)
+            thread.start()
+            self._monitors.append(thread)
+
+
+    def _probe(self, backend: Backend, interval: float) -> Optional[bool]:
+        """每个周期只有一个进程实际探测后端，其他进程读取共享的结果"""
+        if self.cache.add(f"health-probe:{backend.url}", os.getpid(), ttl=interval):
+            healthy = self.health_check(backend.url)
+            self.cache.set(f"health:{backend.url}", healthy, ttl=interval * 3)
+            return healthy
+        return self.cache.get(f"health:{backend.url}", backend.healthy)
+
+
+# 当前应用的远程API客户端
+api_client: RemoteAPIClient = LocalProxy(lambda: current_app.extensions['api_client'])
+
+db = SQLAlchemy()
+
+# 任务参数（去重压缩，见 job_params）
+class JobParams(db.Model):
+    __tablename__ = "job_params"
+    id = db.Column(db.Integer, primary_key=True)
+    digest = db.Column(db.String(64), unique=True, nullable=False)  # 规范化JSON的sha256
+    body = db.Column(db.LargeBinary, nullable=False)  # zlib压缩的参数JSON（不含热字段）
 
-app.config['SQLALCHEMY_DATABASE_URI'] = database_uri
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db = SQLAlchemy(app)
 
 # 本地缓存模型
 class LocalJob(db.Model):
@@ -89,77 +234,716 @@ class LocalJob(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     remote_job_id = db.Column(db.Integer, index=True)
     type = db.Column(db.String(50))
-    params = db.Column(db.Text)
+    params = db.Column(db.Text)  # 旧格式参数JSON，新任务使用 params_id/params_meta
     status = db.Column(db.String(20), default="queued")
-    prompt_id = db.Column(db.String(64), default="")
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    prompt_id = db.Column(db.String(64), default="", index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    backend = db.Column(db.String(255), default="")  # 任务所属后端地址
+    outputs = db.Column(db.Text)  # 输出文件列表（JSON）
+    completed_at = db.Column(db.DateTime)
+    params_id = db.Column(db.Integer, db.ForeignKey('job_params.id'), index=True)
+    params_meta = db.Column(db.Text)  # 热字段JSON：mode/width/height/steps/seed
+    param_mode = db.Column(db.String(50), db.Computed("json_extract(params_meta, '$.mode')"), index=True)
+    param_width = db.Column(db.Integer, db.Computed("json_extract(params_meta, '$.width')"), index=True)
+    param_height = db.Column(db.Integer, db.Computed("json_extract(params_meta, '$.height')"), index=True)
+    param_steps = db.Column(db.Integer, db.Computed("json_extract(params_meta, '$.steps')"), index=True)
+    param_seed = db.Column(db.Integer, db.Computed("json_extract(params_meta, '$.seed')"), index=True)
+    # 耗时记录：提交、上游受理、开始执行、完成（completed_at）
+    submitted_at = db.Column(db.DateTime)
+    accepted_at = db.Column(db.DateTime)
+    first_progress_at = db.Column(db.DateTime)
+
+    def set_params(self, data: Dict[str, Any]):
+        """以紧凑格式保存请求参数"""
+        self.params_id, self.params_meta = store_params(db.session, JobParams.__table__, data)
+
+    def get_params(self) -> Optional[Dict[str, Any]]:
+        body = db.session.get(JobParams, self.params_id).body if self.params_id else None
+        return decode_params(self.params_meta, body, self.params)
+
+    def eta_meta(self) -> Dict[str, Any]:
+        """耗时预测使用的热字段，缺少 mode 时使用任务类型"""
+        meta = json.loads(self.params_meta) if self.params_meta else {}
+        meta.setdefault('mode', self.type)
+        return meta
+
+
+# 异步提交发件箱（见 job_outbox），提交成功后删除
+class JobOutbox(db.Model):
+    __tablename__ = "job_outbox"
+    id = db.Column(db.Integer, primary_key=True)
+    job_id = db.Column(db.Integer, db.ForeignKey('local_jobs.id'), nullable=False, index=True)
+    payload = db.Column(db.Text, nullable=False)  # 原始请求JSON
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.Float, nullable=False, default=0, index=True)  # Unix时间戳
+    lease_until = db.Column(db.Float, nullable=False, default=0)  # 调度线程认领后的租约到期时间
+    failed = db.Column(db.Boolean, nullable=False, default=False)
+    last_error = db.Column(db.Text)
+
+
+# 耗时预测统计（见 job_eta），每个任务完成时增量更新
+class JobEta(db.Model):
+    __tablename__ = "job_eta"
+    mode = db.Column(db.String(50), primary_key=True)
+    steps = db.Column(db.Integer, primary_key=True)
+    pixels = db.Column(db.Integer, primary_key=True)  # 像素数分桶（512x512 为 1）
+    count = db.Column(db.Integer, nullable=False, default=0)
+    total_ms = db.Column(db.Float, nullable=False)  # 提交到完成
+    run_count = db.Column(db.Integer, nullable=False, default=0)
+    run_ms = db.Column(db.Float)  # 开始执行到完成
+
+
+# 用量汇总（由 job_rollups 中的触发器维护）
+class JobRollup(db.Model):
+    __tablename__ = "job_rollups"
+    period = db.Column(db.String(8), primary_key=True)  # hour / day
+    bucket = db.Column(db.String(16), primary_key=True)
+    type = db.Column(db.String(50), primary_key=True)
+    status = db.Column(db.String(20), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+
+class JobLatencyRollup(db.Model):
+    __tablename__ = "job_latency_rollups"
+    period = db.Column(db.String(8), primary_key=True)
+    bucket = db.Column(db.String(16), primary_key=True)
+    type = db.Column(db.String(50), primary_key=True)
+    le_ms = db.Column(db.Integer, primary_key=True)  # 直方图桶上界
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+
+def upgrade_schema():
+    """为旧数据库补齐模型新增的列（create_all 不会修改已存在的表）"""
+    table = LocalJob.__table__
+    existing = {c['name'] for c in db.inspect(db.engine).get_columns(table.name)}
+    with db.engine.begin() as conn:
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(db.engine.dialect)}"
+            if column.computed is not None:
+                # SQLite 只允许 ALTER TABLE 添加 VIRTUAL 生成列
+                ddl += f" GENERATED ALWAYS AS ({column.computed.sqltext}) VIRTUAL"
+            default = column.default.arg if column.default is not None and column.default.is_scalar else None
+            if isinstance(default, str):
+                ddl += " DEFAULT '" + default.replace("'", "''") + "'"
+            elif isinstance(default, (int, float)):
+                ddl += f" DEFAULT {default}"
+            conn.execute(text(ddl))
+            print(f"🔧 数据库升级: {table.name} 新增列 {column.name}")
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+
+
+def job_backend(prompt_id: str) -> Optional[str]:
+    """查找任务所属后端：先查内存映射，再查 LocalJob"""
+    if not prompt_id:
+        return None
+    url = api_client.pool.pinned(prompt_id)
+    if url:
+        return url
+    job = LocalJob.query.filter_by(prompt_id=prompt_id).order_by(LocalJob.id.desc()).first()
+    if job and api_client.pool.get(job.backend):
+        api_client.pool.pin(prompt_id, job.backend)
+        return job.backend
+    return None
+
+
+def record_job_finished(prompt_id: str, succeeded: bool, outputs: List[dict]):
+    """任务结束时记录状态、完成时间与输出文件，只记录第一次；成功的任务计入耗时预测"""
+    job = LocalJob.query.filter_by(prompt_id=prompt_id).order_by(LocalJob.id.desc()).first()
+    if job is None or job.completed_at is not None:
+        return
+    job.status = 'completed' if succeeded else 'failed'
+    job.completed_at = datetime.utcnow()
+    job.outputs = json.dumps(outputs, ensure_ascii=False)
+    if succeeded:
+        observe_eta(db.session, JobEta.__table__, job.eta_meta(),
+                    elapsed_ms(job.submitted_at or job.created_at, job.completed_at),
+                    elapsed_ms(job.first_progress_at, job.completed_at))
+    db.session.commit()
+
+
+def record_job_progress(prompt_id: str) -> Optional[LocalJob]:
+    """上游第一次报告任务开始执行时记录时间"""
+    job = LocalJob.query.filter_by(prompt_id=prompt_id).order_by(LocalJob.id.desc()).first()
+    if job is None or job.first_progress_at is not None:
+        return None
+    job.first_progress_at = datetime.utcnow()
+    db.session.commit()
+    return job
+
+
+def job_deadline(job: LocalJob) -> Optional[float]:
+    """按历史耗时预计的完成时间（Unix时间戳），没有历史时返回 None"""
+    predicted = predict_eta(db.session, JobEta.__table__, job.eta_meta())
+    if predicted is None:
+        return None
+    total_ms, run_ms = predicted
+    # 已开始执行时按执行耗时从开始时间推算，更准确
+    if job.first_progress_at is not None and run_ms is not None:
+        start, duration = job.first_progress_at, run_ms
+    else:
+        start, duration = job.submitted_at or job.created_at, total_ms
+    return start.replace(tzinfo=timezone.utc).timestamp() + duration / 1000
+
+
+def eta_seconds(deadline: Optional[float]) -> Optional[float]:
+    if deadline is None:
+        return None
+    return round(max(0.0, deadline - time.time()), 1)
+
+
+def result_eta(prompt_id: str, refresh: bool = False) -> Optional[float]:
+    """进行中任务的预计剩余秒数
+
+    预计完成时间在提交和开始执行时计算并放入共享缓存，轮询时不需要查询数据库。
+    """
+    cache = current_app.extensions['shared_cache']
+    entry = None if refresh else cache.get(f"eta:{prompt_id}")
+    if entry is None:
+        job = LocalJob.query.filter_by(prompt_id=prompt_id).order_by(LocalJob.id.desc()).first()
+        entry = {'deadline': job_deadline(job) if job else None}
+        cache.set(f"eta:{prompt_id}", entry, ttl=current_app.config['RESULT_CACHE_TTL'])
+    return eta_seconds(entry['deadline'])
+
+
+def upload_backend(data: Dict[str, Any]) -> Optional[str]:
+    """请求引用了已上传文件（image/mask）时，返回持有这些文件的后端"""
+    if not isinstance(data, dict):
+        return None
+    for field in ('image', 'mask'):
+        value = data.get(field)
+        if isinstance(value, str):
+            url = api_client.pool.pinned(f"upload:{value}")
+            if url:
+                return url
+    return None
+
+
+def default_database_uri() -> str:
+    """本地SQLite数据库（用于缓存），在CI环境中直接使用内存数据库"""
+    if is_ci():
+        print("🔧 CI环境检测到，使用内存数据库")
+        return 'sqlite:///:memory:'
+
+    database_uri = os.getenv('SQLALCHEMY_DATABASE_URI', 'sqlite:///instance/local_cache.db')
+    if not database_uri.startswith('sqlite:///') or database_uri == 'sqlite:///:memory:':
+        return database_uri
+    # 相对路径按工作目录解析（Flask-SQLAlchemy 默认相对 instance 目录，会多出一层 instance/）
+    db_path = os.path.abspath(database_uri.replace('sqlite:///', ''))
+    # 确保数据库目录存在
+    db_dir = os.path.dirname(db_path)
+    if db_dir:
+        os.makedirs(db_dir, exist_ok=True)
+    return f"sqlite:///{db_path}"
+
+
+def start_params_compaction():
+    """旧记录的 params 文本在后台分批迁移为紧凑存储"""
+    table = LocalJob.__table__
+    with db.engine.connect() as conn:
+        pending = conn.execute(
+            db.select(table.c.id).where(table.c.params.isnot(None), table.c.params_id.is_(None)).limit(1)
+        ).first()
+    if pending is None:
+        return
+    engine = db.engine
+
+    def run():
+        try:
+            migrated = compact_legacy_params(engine, table, JobParams.__table__)
+            print(f"🗜️ 已迁移 {migrated} 条任务参数为紧凑存储")
+        except Exception as e:
+            print(f"⚠️ 任务参数迁移失败: {e}")
+
+    threading.Thread(target=run, name='params-compaction', daemon=True).start()
+
+
+def retention_days() -> float:
+    """RETENTION_DAYS，0 表示不启用任务保留策略"""
+    return float(os.getenv('RETENTION_DAYS', '0'))
+
+
+def remove_job_files(app: Flask, rows: List[dict]):
+    """删除已归档任务预取到本地的输出图片与缓存的视频"""
+    prefetcher = app.extensions.get('result_prefetcher')
+    video_cache = app.extensions.get('video_cache')
+    for row in rows:
+        if video_cache and row.get('type') == 'video' and row.get('prompt_id'):
+            video_cache.remove(row['prompt_id'])
+        if prefetcher and row.get('outputs'):
+            outputs = upstream_json.try_loads(row['outputs'].encode('utf-8'))
+            if isinstance(outputs, list):
+                prefetcher.remove(row.get('backend'), outputs)
+
+
+def start_retention(app: Flask):
+    """按 RETENTION_DAYS 在后台归档并删除过期任务（0 表示不启用）"""
+    days = retention_days()
+    if days <= 0 or is_ci() or db.engine.url.database in (None, '', ':memory:'):
+        return
+    worker = RetentionWorker(
+        db.engine,
+        LocalJob.__table__,
+        days,
+        os.getenv('ARCHIVE_DIR', './archive'),
+        batch_size=int(os.getenv('RETENTION_BATCH_SIZE', '200')),
+        convert_max_mb=float(os.getenv('RETENTION_VACUUM_CONVERT_MAX_MB', '64')),
+        params_table=JobParams.__table__,
+        cache=app.extensions['shared_cache'],
+        on_deleted=lambda rows: remove_job_files(app, rows),
+    )
+    worker.start(float(os.getenv('RETENTION_INTERVAL', '3600')))
+    app.extensions['retention_worker'] = worker
+
+
+def submit_generate(app: Flask, payload: Dict[str, Any]) -> Dict[str, Any]:
+    """发件箱调度线程中提交生成任务，返回写回 LocalJob 的字段"""
+    with app.app_context():
+        response = api_client.proxy_request('POST', '/api/generate', backend=upload_backend(payload),
+                                            json=payload, timeout=120)
+        # 408/429 与 5xx 属于暂时性错误，其他 4xx 重试也不会成功
+        if 400 <= response.status_code < 500 and response.status_code not in (408, 429):
+            raise PermanentError(f"HTTP {response.status_code}: {response.text[:200]}")
+        response.raise_for_status()
+        result = upstream_json.try_loads(response.content)
+        if not (isinstance(result, dict) and 'job_id' in result):
+            raise PermanentError(f"上游未受理任务: {response.text[:200]}")
+        prompt_id = result.get('prompt_id') or ''
+        # 没有 prompt_id 的任务无法查询结果，也就无法释放计数，不计入未完成任务
+        if prompt_id:
+            api_client.pool.begin_job(api_client.pool.get(response.backend), prompt_id)
+        return {'remote_job_id': result['job_id'], 'prompt_id': prompt_id, 'backend': response.backend,
+                'accepted_at': datetime.utcnow()}
+
+
+def start_outbox(app: Flask):
+    """创建发件箱调度器；上次退出时有未提交的条目则立即启动"""
+    dispatcher = OutboxDispatcher(
+        db.engine,
+        JobOutbox.__table__,
+        LocalJob.__table__,
+        lambda payload: submit_generate(app, payload),
+        workers=int(os.getenv('OUTBOX_WORKERS', '4')),
+        max_attempts=int(os.getenv('OUTBOX_MAX_ATTEMPTS', '5')),
+    )
+    app.extensions['outbox_dispatcher'] = dispatcher
+    if dispatcher.pending():
+        dispatcher.start()
+
+
+_database_lock = threading.Lock()
+
+
+def init_database(app: Flask):
+    """初始化数据库（幂等），首次调用时执行准备钩子并建表"""
+    if app.extensions.get('database_ready'):
+        return
+    with _database_lock:
+        if app.extensions.get('database_ready'):
+            return
+        hook = app.extensions.get('database_init_hook')
+        if hook:
+            hook()
+        with app.app_context():
+            # 启用保留策略时才修改 auto_vacuum，WAL 需单独开启，不改变已有部署的数据库文件
+            wal = os.getenv('SQLITE_WAL', 'false').lower() == 'true'
+            if retention_days() > 0 or wal:
+                configure_sqlite(db.engine, incremental=retention_days() > 0, wal=wal)
+            db.create_all()
+            upgrade_schema()
+            install_rollups(db.engine)
+            start_params_compaction()
+            start_retention(app)
+            start_outbox(app)
+        app.extensions['database_ready'] = True
+        startup_report.mark('database')
+
+
+bp = Blueprint('local', __name__)
+
+
+def create_app(database_uri: str = None, database_init_hook: Callable[[], None] = None, prebuilt: bool = False) -> Flask:
+    """创建Flask应用
+
+    这里只做轻量配置：数据库准备与建表推迟到首个请求（或 main()）执行，
+    远程服务器连接检查在后台线程中进行，因此 /health 可以在启动后立即响应。
+    """
+    # 加载环境变量
+    load_dotenv(dotenv_path='config_local.env')
+    startup_report.mark('config')
+
+    app = Flask(__name__, 
+               template_folder='templates',
+               static_folder='static')
+    CORS(app)
+    server_timing.init_app(app)
+    static_assets.init_app(app)
+
+    # 配置
+    app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'local-dev-key')
+    app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_uri or default_database_uri()
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['PREBUILT_DB'] = prebuilt
+    # 异步提交：生成请求写入发件箱后立即返回 202（请求头 Prefer: respond-async 也可单独开启）
+    app.config['ASYNC_SUBMIT'] = os.getenv('ASYNC_SUBMIT', 'false').lower() == 'true'
+    db.init_app(app)
+
+    # 多进程共享缓存（未配置文件时为进程内缓存）
+    cache = open_cache(os.getenv('SHARED_CACHE_PATH'), max_entries=int(os.getenv('SHARED_CACHE_MAX_ENTRIES', '10000')))
+    app.extensions['shared_cache'] = cache
+    app.config['RESULT_CACHE_TTL'] = float(os.getenv('RESULT_CACHE_TTL', '3600'))
+    app.config['UPLOAD_CACHE_TTL'] = float(os.getenv('UPLOAD_CACHE_TTL', '3600'))
+
+    # 创建远程API客户端
+    client = RemoteAPIClient(cache=cache)
+    app.extensions['api_client'] = client
+    # 任务完成后预取输出图片到本地
+    download_dir = os.getenv('DOWNLOAD_DIR', './downloads')
+    prefetch = os.getenv('PREFETCH_RESULTS', 'true').lower() == 'true'
+    app.extensions['result_prefetcher'] = ResultPrefetcher(
+        client,
+        download_dir,
+        max_workers=int(os.getenv('PREFETCH_WORKERS', '4')),
+    ) if prefetch else None
+    # 完成的视频缓存到本地，之后的播放（含拖动进度）直接读磁盘
+    video_cache = os.getenv('VIDEO_CACHE', 'false').lower() == 'true'
+    app.extensions['video_cache'] = VideoCache(
+        client.session,
+        os.path.join(download_dir, 'videos'),
+        max_workers=int(os.getenv('VIDEO_CACHE_WORKERS', '2')),
+    ) if video_cache else None
+    # 本地文件发送：默认 sendfile，部署在 nginx 后时可交给 nginx 发送（X-Accel-Redirect）
+    accel = {}
+    if os.getenv('X_ACCEL_REDIRECT', 'false').lower() == 'true':
+        accel = {
+            download_dir: os.getenv('X_ACCEL_DOWNLOADS_PREFIX', '/_internal/downloads/'),
+            os.path.join(app.static_folder, 'uploads'): os.getenv('X_ACCEL_UPLOADS_PREFIX', '/_internal/uploads/'),
+        }
+    app.extensions['file_sender'] = FileSender(accel)
+    # multipart 生成请求的并行上传
+    app.extensions['upload_executor'] = ThreadPoolExecutor(
+        max_workers=int(os.getenv('UPLOAD_WORKERS', '8')), thread_name_prefix='inline-upload')
+    # 上传图片预处理（需要 Pillow）
+    preprocess = os.getenv('UPLOAD_PREPROCESS', 'true').lower() == 'true' and image_preprocess.available()
+    app.extensions['image_preprocessor'] = ImagePreprocessor(
+        max_size=int(os.getenv('UPLOAD_MAX_SIZE', '2048')),
+        max_workers=int(os.getenv('UPLOAD_PREPROCESS_WORKERS', str(os.cpu_count() or 2))),
+    ) if preprocess else None
+    app.extensions['database_init_hook'] = database_init_hook
+    app.register_blueprint(bp)
+
+    @app.before_request
+    def _ensure_database():
+        try:
+            init_database(app)
+        except Exception as e:
+            # 不阻断请求，/health 会报告数据库状态，下个请求重试
+            print(f"⚠️  数据库初始化失败: {e}")
+        startup_report.mark('first_request')
+
+    # 检查服务器连接（CI环境中跳过以加快启动）
+    if not is_ci():
+        client.start_health_monitor(float(os.getenv('HEALTH_CHECK_INTERVAL', '30')))
+
+    startup_report.mark('app')
+    return app
+
+
+_default_app: Optional[Flask] = None
+
+
+def get_app() -> Flask:
+    """返回默认应用实例，首次访问时才创建"""
+    global _default_app
+    if _default_app is None:
+        _default_app = create_app()
+    return _default_app
+
+
+def __getattr__(name):
+    # 延迟创建应用：导入模块本身没有副作用，访问 app_local.app 时才构建
+    if name == 'app':
+        return get_app()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # 路由定义 - 完全兼容服务器端
-@app.route("/", methods=["GET"])
+@bp.route("/", methods=["GET"])
 def index():
     """主页"""
-    return render_template("index.html")
+    return static_assets.render_page("index.html")
+
+def upload_to_upstream(client: RemoteAPIClient, files: Dict[str, Any], backend: str = None):
+    """上传文件到后端，返回 (上游响应, 解析后的结果)
+
+    上传文件只存在于接收它的后端，成功时记录归属，后续生成任务需固定到该后端。
+    可在工作线程中调用，因此显式传入 client。
+    """
+    response = client.proxy_request('POST', '/api/upload', backend=backend, files=files, timeout=60)
+    result = None
+    if response.status_code == 200:
+        with server_timing.phase('json'):
+            result = upstream_json.try_loads(response.content)
+        if isinstance(result, dict) and result.get('path'):
+            client.pool.pin(f"upload:{result['path']}", response.backend)
+    return response, result
+
+def prepare_upload(preprocessor: Optional[ImagePreprocessor], filename: str, data: bytes, content_type: str):
+    """转发给后端的文件元组；启用预处理时先摆正、去除元数据并缩小图片"""
+    if preprocessor is None:
+        return (filename, data, content_type)
+    with server_timing.phase('preprocess'):
+        return preprocessor.process(filename, io.BytesIO(data), content_type)
 
-@app.route("/api/upload", methods=["POST"])
+def upload_file(client: RemoteAPIClient, cache, preprocessor: Optional[ImagePreprocessor], file,
+                backend: str = None, ttl: float = 3600):
+    """上传一个文件，返回 (响应, 解析后的结果)
+
+    按原始内容的 sha256 记录上传结果（多个 worker 共享），有效期内再次上传相同文件
+    且其所在后端可用时直接返回之前的响应。可在工作线程中调用，因此显式传入依赖。
+    """
+    data = file.stream.read()
+    key = f"upload:{hashlib.sha256(data).hexdigest()}"
+    entry = cache.get(key)
+    if entry and (backend is None or entry['backend'] == backend) and client.pool.get(entry['backend']):
+        result = upstream_json.loads(entry['body'])
+        client.pool.pin(f"upload:{result['path']}", entry['backend'])
+        return Response(entry['body'], content_type=entry['content_type']), result
+    
+    files = {'file': prepare_upload(preprocessor, file.filename, data, file.content_type)}
+    response, result = upload_to_upstream(client, files, backend)
+    if isinstance(result, dict) and result.get('path'):
+        cache.set(key, {
+            'backend': response.backend,
+            'body': response.content.decode('utf-8'),
+            'content_type': response.headers.get('Content-Type') or 'application/json',
+        }, ttl=ttl)
+    return upstream_json.passthrough(response), result
+
+@bp.route("/api/upload", methods=["POST"])
 def api_upload():
     """文件上传代理"""
     try:
         # 代理到远程服务器
-        files = {}
-        if 'file' in request.files:
-            file = request.files['file']
-            files['file'] = (file.filename, file.stream, file.content_type)
-        
-        response = api_client.proxy_request('POST', '/api/upload', files=files, timeout=60)
+        if 'file' not in request.files:
+            response, _ = upload_to_upstream(api_client, {})
+            return upstream_json.passthrough(response)
         
-        return jsonify(response.json()), response.status_code
+        response, _ = upload_file(api_client, current_app.extensions['shared_cache'],
+                                  current_app.extensions['image_preprocessor'], request.files['file'],
+                                  ttl=current_app.config['UPLOAD_CACHE_TTL'])
+        return response
         
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
 
-@app.route("/api/generate", methods=["POST"])
+# multipart 生成请求中随请求上传的文件字段，上传后替换为远程路径
+INLINE_UPLOAD_FIELDS = ('image', 'mask')
+
+def inline_uploads():
+    """解析 multipart 生成请求：payload 字段为JSON参数，image/mask 为文件
+
+    文件并行上传到同一个后端（已引用上传文件时用其所在后端），耗时取最慢的一路。
+    返回 (参数, None)；payload 不是JSON对象或任一上传失败时返回 (None, 错误响应)。
+    """
+    data = upstream_json.try_loads((request.form.get('payload') or '{}').encode('utf-8'))
+    if not isinstance(data, dict):
+        return None, (jsonify({"error": "payload 必须是JSON对象"}), 400)
+    files = {field: request.files[field] for field in INLINE_UPLOAD_FIELDS if field in request.files}
+    if not files:
+        return data, None
+    client = api_client._get_current_object()
+    backend = upload_backend(data) or client.pool.choose().url
+    executor = current_app.extensions['upload_executor']
+    cache = current_app.extensions['shared_cache']
+    preprocessor = current_app.extensions['image_preprocessor']
+    ttl = current_app.config['UPLOAD_CACHE_TTL']
+    
+    def upload(file):
+        return upload_file(client, cache, preprocessor, file, backend, ttl)
+    
+    futures = {field: executor.submit(upload, f) for field, f in files.items()}
+    with server_timing.phase('upload'):
+        for field, future in futures.items():
+            response, result = future.result()
+            if not (isinstance(result, dict) and result.get('path')):
+                return None, response
+            data[field] = result['path']
+    return data, None
+
+def enqueue_generate(data: Dict[str, Any]):
+    """写入发件箱并返回 202，由后台调度线程提交到远程服务器"""
+    if not isinstance(data, dict):
+        return jsonify({"error": "请求参数必须是JSON对象"}), 400
+    with server_timing.phase('db'):
+        local_job = LocalJob(type=data.get('mode', 'unknown'), status='pending', backend='',
+                             submitted_at=datetime.utcnow())
+        local_job.set_params(data)
+        db.session.add(local_job)
+        db.session.flush()
+        db.session.add(JobOutbox(job_id=local_job.id, payload=json.dumps(data, ensure_ascii=False)))
+        db.session.commit()
+        eta = eta_seconds(job_deadline(local_job))
+    current_app.extensions['outbox_dispatcher'].notify()
+    location = f"/api/result?local_id={local_job.id}"
+    return jsonify({"status": "accepted", "local_id": local_job.id, "eta_seconds": eta}), 202, {
+        'Location': location, 'Preference-Applied': 'respond-async'}
+
+def local_result(local_id: int):
+    """按本地任务ID查询：尚未提交时返回本地状态，已提交时返回远程 prompt_id（或 None）"""
+    job = db.session.get(LocalJob, local_id)
+    if job is None:
+        return None, (jsonify({"status": "error", "message": "任务不存在"}), 404)
+    if job.prompt_id:
+        return job.prompt_id, None
+    outbox = JobOutbox.query.filter_by(job_id=local_id).first()
+    if job.status == 'failed':
+        message = outbox.last_error if outbox else "提交失败"
+        return None, jsonify({"status": "error", "message": message, "local_id": local_id})
+    return None, jsonify({"status": "pending", "local_id": local_id,
+                          "attempts": outbox.attempts if outbox else 0,
+                          "eta_seconds": eta_seconds(job_deadline(job))})
+
+@bp.route("/api/generate", methods=["POST"])
 def generate():
-    """生图API代理"""
+    """生图API代理
+
+    支持JSON请求，或 multipart 请求（payload 字段为JSON参数，随附 image/mask 文件），
+    后者把上传与提交合并为一次往返。
+    """
     try:
-        data = request.get_json()
+        if request.mimetype == 'multipart/form-data':
+            data, failed = inline_uploads()
+            if failed is not None:
+                return failed
+        else:
+            data = request.get_json()
         
-        # 代理到远程服务器
-        response = api_client.proxy_request('POST', '/api/generate', json=data, timeout=120)
-        result = response.json()
+        if current_app.config['ASYNC_SUBMIT'] or 'respond-async' in request.headers.get('Prefer', ''):
+            return enqueue_generate(data)
+        
+        # 代理到远程服务器（引用了已上传文件时固定到上传所在后端）
+        submitted_at = datetime.utcnow()
+        response = api_client.proxy_request('POST', '/api/generate', backend=upload_backend(data), json=data, timeout=120)
+        result = None
+        if response.status_code == 200:
+            with server_timing.phase('json'):
+                result = upstream_json.try_loads(response.content)
         
         # 本地缓存任务信息
-        if response.status_code == 200 and 'job_id' in result:
+        if isinstance(result, dict) and 'job_id' in result:
+            prompt_id = result.get('prompt_id') or ''
+            if prompt_id:
+                api_client.pool.begin_job(api_client.pool.get(response.backend), prompt_id)
             local_job = LocalJob(
                 remote_job_id=result['job_id'],
                 type=data.get('mode', 'unknown'),
-                params=json.dumps(data, ensure_ascii=False),
                 status='queued',
-                prompt_id=result.get('prompt_id', '')
+                prompt_id=prompt_id,
+                backend=response.backend,
+                submitted_at=submitted_at,
+                accepted_at=datetime.utcnow(),
             )
-            db.session.add(local_job)
-            db.session.commit()
+            with server_timing.phase('db'):
+                local_job.set_params(data)
+                db.session.add(local_job)
+                db.session.commit()
+                eta = result_eta(prompt_id, refresh=True)
+            if eta is not None:
+                return upstream_json.passthrough(response, eta_seconds=eta)
         
-        return jsonify(result), response.status_code
+        return upstream_json.passthrough(response)
         
     except Exception as e:
         return jsonify({"error": f"生成失败: {str(e)}"}), 500
 
-@app.route("/api/result", methods=["GET"])
+@bp.route("/api/result", methods=["GET"])
 def api_result():
     """获取生成结果代理"""
     try:
         # 获取参数
         prompt_id = request.args.get("prompt_id", "")
+        local_id = request.args.get("local_id", type=int)
+        if local_id is not None:
+            # 异步提交的任务：提交到远程服务器之前由本地回答
+            prompt_id, reply = local_result(local_id)
+            if reply is not None:
+                return reply
         
-        # 代理到远程服务器
-        response = api_client.proxy_request('GET', '/api/result', params={'prompt_id': prompt_id}, timeout=30)
+        # 已完成的结果不会再变化，由任一 worker 缓存后共享
+        cache = current_app.extensions['shared_cache']
+        cached = cache.get(f"result:{prompt_id}") if prompt_id else None
+        if cached is not None:
+            # 结果可能由其他 worker 取得，本进程的未完成任务计数同样要释放
+            api_client.pool.finish_job(prompt_id)
+            return Response(cached['body'], content_type=cached['content_type'])
+        
+        # 代理到任务所属后端
+        response = api_client.proxy_request('GET', '/api/result', backend=job_backend(prompt_id),
+                                            params={'prompt_id': prompt_id}, timeout=30)
+        
+        # 轮询中大多是进行中的响应，不含终态时无需解析
+        result = None
+        if upstream_json.mentions(response.content, 'success', 'error'):
+            with server_timing.phase('json'):
+                result = upstream_json.try_loads(response.content)
         
-        return jsonify(response.json()), response.status_code
+        finished = isinstance(result, dict) and result.get('status') in ('success', 'error')
+        if prompt_id and not finished and response.status_code == 200:
+            # 进行中：第一次出现执行状态时记录开始时间（每个任务只写一次库），并附带预计剩余时间
+            refresh = False
+            if upstream_json.mentions(response.content, *PROGRESS_STATUSES) and cache.add(
+                    f"progress:{prompt_id}", 1, ttl=current_app.config['RESULT_CACHE_TTL']):
+                with server_timing.phase('db'):
+                    refresh = record_job_progress(prompt_id) is not None
+            with server_timing.phase('db'):
+                eta = result_eta(prompt_id, refresh=refresh)
+            if eta is not None:
+                return upstream_json.passthrough(response, eta_seconds=eta)
+        
+        if finished:
+            api_client.pool.finish_job(prompt_id)
+            images = [image for image in result.get('images') or [] if file_key(image)]
+            # 输出图片只能从生成它的后端读取，各后端的文件可能同名，按后端区分
+            tag = backend_tag(response.backend)
+            for image in images:
+                api_client.pool.pin(file_pin(tag, file_key(image)), response.backend)
+                tag_output(image, tag)
+            with server_timing.phase('db'):
+                record_job_finished(prompt_id, result['status'] == 'success', images)
+            prefetcher = current_app.extensions['result_prefetcher']
+            if prefetcher and images:
+                prefetcher.submit(response.backend, images)
+            body = upstream_json.dumps(result) if images else response.content
+            content_type = response.headers.get('Content-Type') or 'application/json'
+            if response.status_code == 200 and prompt_id:
+                cache.set(f"result:{prompt_id}", {
+                    'body': body.decode('utf-8'),
+                    'content_type': content_type,
+                }, ttl=current_app.config['RESULT_CACHE_TTL'])
+            return Response(body, status=response.status_code, content_type=content_type)
+        return upstream_json.passthrough(response)
         
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
 
-@app.route("/api/proxy/view", methods=["GET"])
+def tag_output(image: dict, tag: str):
+    """在输出图片描述中记录所属后端，查看链接带上 backend 参数"""
+    image['backend'] = tag
+    url = image.get('url')
+    if isinstance(url, str) and url.startswith('/api/proxy/view'):
+        image['url'] = url + ('&' if '?' in url else '?') + urllib.parse.urlencode({'backend': tag})
+
+def output_backend(tag: Optional[str], key) -> Optional[str]:
+    """输出文件所属后端的地址，没有 backend 参数（旧链接）时返回 None"""
+    if not tag:
+        return None
+    backend = api_client.pool.by_tag(tag)
+    return api_client.pool.pinned(file_pin(tag, key)) or (backend.url if backend else None)
+
+@bp.route("/api/proxy/view", methods=["GET"])
 def api_proxy_view():
     """代理ComfyUI图像查看"""
     try:
@@ -170,68 +954,215 @@ def api_proxy_view():
             'subfolder': request.args.get('subfolder', '')
         }
         
-        # 代理到远程服务器
-        response = api_client.proxy_request('GET', '/api/proxy/view', params=params, timeout=60, stream=True)
+        key = (params['type'], params['subfolder'], params['filename'])
+        owner = output_backend(request.args.get('backend'), key)
+        
+        # 已预取到本地的文件直接从磁盘返回（正在预取时稍作等待）
+        prefetcher = current_app.extensions['result_prefetcher']
+        if prefetcher and owner and params['filename']:
+            local = prefetcher.lookup(owner, key, wait=float(os.getenv('PREFETCH_WAIT', '10')))
+            if local:
+                return current_app.extensions['file_sender'].send(local, mimetype=mimetypes.guess_type(local.name)[0] or 'image/png')
+        
+        # 代理到文件所属后端；归属未知时依次尝试各后端
+        candidates = [owner] if owner else [b.url for b in api_client.pool.backends]
+        for backend in candidates:
+            response = api_client.proxy_request('GET', '/api/proxy/view', backend=backend, params=params, timeout=60, stream=True)
+            # 最后一个后端的响应原样返回，不能提前关闭
+            if response.status_code != 404 or backend == candidates[-1]:
+                break
+            response.close()
+        
+        with server_timing.phase('transfer'):
+            content = response.content
         
         if response.status_code != 200:
-            return Response(response.content, status=response.status_code)
+            return Response(content, status=response.status_code)
         
         content_type = response.headers.get('Content-Type', 'image/png')
-        return Response(response.content, mimetype=content_type)
+        return Response(content, mimetype=content_type)
         
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
 
-@app.route("/api/video/generate", methods=["POST"])
+@bp.route("/api/video/generate", methods=["POST"])
 def api_video_generate():
     """视频生成API代理"""
     try:
         data = request.get_json()
         
         # 代理到远程服务器
-        response = api_client.proxy_request('POST', '/api/video/generate', json=data, timeout=120)
+        submitted_at = datetime.utcnow()
+        response = api_client.proxy_request('POST', '/api/video/generate', backend=upload_backend(data),
+                                            json=data, timeout=120)
+        
+        result = None
+        if response.status_code == 200:
+            with server_timing.phase('json'):
+                result = upstream_json.try_loads(response.content)
         
-        return jsonify(response.json()), response.status_code
+        # 记录视频任务所属后端，状态查询固定到该后端
+        if isinstance(result, dict) and result.get('task_id'):
+            task_id = str(result['task_id'])
+            api_client.pool.begin_job(api_client.pool.get(response.backend), task_id)
+            with server_timing.phase('db'):
+                local_job = LocalJob(
+                    type='video',
+                    status='queued',
+                    prompt_id=task_id,
+                    backend=response.backend,
+                    submitted_at=submitted_at,
+                    accepted_at=datetime.utcnow(),
+                )
+                local_job.set_params(data)
+                db.session.add(local_job)
+                db.session.commit()
+        return upstream_json.passthrough(response)
         
     except Exception as e:
         return jsonify({"error": f"视频生成失败: {str(e)}"}), 500
 
-@app.route("/api/video/status/<task_id>", methods=["GET"])
+@bp.route("/api/video/status/<task_id>", methods=["GET"])
 def api_video_status(task_id):
     """视频任务状态查询代理"""
     try:
-        # 代理到远程服务器
-        response = api_client.proxy_request('GET', f'/api/video/status/{task_id}', timeout=30)
+        # 代理到任务所属后端
+        response = api_client.proxy_request('GET', f'/api/video/status/{task_id}', backend=job_backend(task_id), timeout=30)
+        
+        result = None
+        if upstream_json.mentions(response.content, 'done', 'error'):
+            with server_timing.phase('json'):
+                result = upstream_json.try_loads(response.content)
         
-        return jsonify(response.json()), response.status_code
+        if upstream_json.mentions(response.content, *PROGRESS_STATUSES) and current_app.extensions['shared_cache'].add(
+                f"progress:{task_id}", 1, ttl=current_app.config['RESULT_CACHE_TTL']):
+            with server_timing.phase('db'):
+                record_job_progress(task_id)
+        
+        if isinstance(result, dict) and result.get('status') in ('done', 'error'):
+            api_client.pool.finish_job(task_id)
+            outputs = [{'video_url': result['video_url']}] if result.get('video_url') else []
+            with server_timing.phase('db'):
+                record_job_finished(task_id, result['status'] == 'done', outputs)
+            video_cache = current_app.extensions['video_cache']
+            if video_cache and outputs:
+                video_cache.submit(task_id, video_source_url(result['video_url'], response.backend))
+        return upstream_json.passthrough(response)
         
     except Exception as e:
         return jsonify({"error": f"查询失败: {str(e)}"}), 500
 
-@app.route("/health", methods=["GET"])
+def video_source_url(video_url: str, backend: Optional[str]) -> str:
+    """上游返回的 video_url 可能是完整地址，也可能是相对任务所属后端的路径"""
+    if urllib.parse.urlsplit(video_url).scheme in ('http', 'https'):
+        return video_url
+    base = api_client.pool.get(backend) or api_client.pool.primary
+    return urllib.parse.urljoin(base.url + '/', video_url.lstrip('/'))
+
+def video_source(task_id: str) -> Optional[str]:
+    """已完成视频任务在上游的文件地址（由状态查询记录到 LocalJob.outputs）"""
+    job = LocalJob.query.filter_by(prompt_id=task_id, type='video').order_by(LocalJob.id.desc()).first()
+    outputs = json.loads(job.outputs) if job and job.outputs else []
+    video_url = next((o.get('video_url') for o in outputs if isinstance(o, dict) and o.get('video_url')), None)
+    if not video_url:
+        return None
+    return video_source_url(video_url, job_backend(task_id) or job.backend)
+
+@bp.route("/api/video/file/<task_id>", methods=["GET"])
+def api_video_file(task_id):
+    """视频播放/下载
+
+    转发 Range 请求头并流式返回上游的 206 分段响应，浏览器可以拖动进度；
+    启用 VIDEO_CACHE 时首次播放后在后台缓存到本地，之后从磁盘返回。?download=1 时作为附件下载。
+    """
+    try:
+        video_cache = current_app.extensions['video_cache']
+        local = video_cache.lookup(task_id) if video_cache else None
+        if local:
+            response = current_app.extensions['file_sender'].send(local, mimetype='video/mp4')
+        else:
+            with server_timing.phase('db'):
+                url = video_source(task_id)
+            if url is None:
+                return jsonify({"error": "视频不存在或尚未生成"}), 404
+            upstream = api_client.session.get(url, headers=request_headers(request.headers), stream=True, timeout=(10, 60))
+            if video_cache and upstream.status_code in (200, 206):
+                video_cache.submit(task_id, url)
+            response = stream_response(upstream)
+        if request.args.get('download'):
+            filename = local.name if local else 'video.mp4'
+            response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+        
+    except Exception as e:
+        return jsonify({"error": f"视频获取失败: {str(e)}"}), 500
+
+@bp.route("/health", methods=["GET"])
 def health():
     """健康检查"""
-    # 在CI环境中跳过远程服务器检查以加快响应
-    ci_env = os.getenv('CI', '').lower() == 'true'
+    # 远程服务器状态由后台线程探测，这里只读取结果以保证快速响应
+    ci_env = is_ci()
     if ci_env:
         server_healthy = True  # CI环境中假设服务器健康
     else:
-        server_healthy = api_client.health_check()
+        server_healthy = api_client.healthy
+    
+    # 检查数据库连接
+    db_healthy = True
+    try:
+        db.session.execute(text('SELECT 1'))
+        db_status = "connected"
+    except Exception as e:
+        db_healthy = False
+        db_status = f"error: {str(e)}"
     
     return jsonify({
         "status": "ok",
         "local": True,
         "server": server_healthy,
+        "database": db_healthy,
+        "database_status": db_status,
+        "database_uri": current_app.config['SQLALCHEMY_DATABASE_URI'],
         "server_url": api_client.server_url,
+        "backends": [b.to_dict() for b in api_client.pool.backends],
+        "hedging": api_client.hedger.stats() if api_client.hedger else None,
         "timestamp": datetime.now().isoformat(),
-        "ci_mode": ci_env
+        "ci_mode": ci_env,
+        "prebuilt_db": current_app.config['PREBUILT_DB'],
+        "startup_ms": startup_report.as_dict()
     })
 
-@app.route("/api/jobs", methods=["GET"])
+@bp.route("/api/stats", methods=["GET"])
+def stats():
+    """用量统计：按小时/天、类型、状态的任务数与排队到完成耗时分位数
+
+    参数: period=hour|day（默认 hour），since/until（ISO时间，默认最近24小时/30天），type。
+    只读取汇总表，不扫描 local_jobs。
+    """
+    period = request.args.get('period', 'hour')
+    if period not in PERIODS:
+        return jsonify({"error": f"不支持的统计粒度: {period}"}), 400
+    try:
+        until = _parse_time(request.args.get('until')) or datetime.utcnow()
+        since = _parse_time(request.args.get('since')) or until - (timedelta(days=1) if period == 'hour' else timedelta(days=30))
+    except ValueError as e:
+        return jsonify({"error": f"时间格式错误: {str(e)}"}), 400
+    with server_timing.phase('db'):
+        result = read_stats(db.engine, period, since, until, request.args.get('type'))
+    return jsonify(result)
+
+@bp.route("/api/jobs", methods=["GET"])
 def list_jobs():
     """列出本地缓存的任务"""
     try:
-        jobs = LocalJob.query.order_by(LocalJob.created_at.desc()).limit(50).all()
+        query = LocalJob.query
+        # 参数过滤走 param_* 生成列上的索引
+        if request.args.get('mode'):
+            query = query.filter(LocalJob.param_mode == request.args['mode'])
+        for field in ('width', 'height', 'steps'):
+            if request.args.get(field):
+                query = query.filter(getattr(LocalJob, f'param_{field}') == request.args.get(field, type=int))
+        jobs = query.order_by(LocalJob.created_at.desc()).limit(50).all()
         result = []
         for job in jobs:
             result.append({
@@ -240,19 +1171,105 @@ def list_jobs():
                 'type': job.type,
                 'status': job.status,
                 'prompt_id': job.prompt_id,
+                'mode': job.param_mode,
+                'width': job.param_width,
+                'height': job.param_height,
                 'created_at': job.created_at.isoformat()
             })
         return jsonify(result)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+def _parse_time(value: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(value) if value else None
+
+def _output_chunks(row: dict, image: dict):
+    """导出ZIP时读取任务输出图片：优先本地预取文件，否则从所属后端流式读取"""
+    key = file_key(image)
+    prefetcher = current_app.extensions['result_prefetcher']
+    local = prefetcher.lookup(row['backend'], key) if prefetcher and key and row.get('backend') else None
+    if local:
+        def read_local():
+            with open(local, 'rb') as f:
+                while True:
+                    chunk = f.read(256 * 1024)
+                    if not chunk:
+                        return
+                    yield chunk
+        return read_local()
+
+    backend = api_client.pool.get(row.get('backend')) or api_client.pool.primary
+    params = {'filename': key[2], 'type': key[0], 'subfolder': key[1]}
+    try:
+        response = api_client.session.get(f"{backend.url}/api/proxy/view", params=params, timeout=60, stream=True)
+    except requests.RequestException:
+        return None
+    if response.status_code != 200:
+        response.close()
+        return None
+
+    def read_remote():
+        try:
+            yield from response.iter_content(chunk_size=256 * 1024)
+        finally:
+            response.close()
+    return read_remote()
+
+@bp.route("/api/jobs/export", methods=["GET"])
+def export_jobs():
+    """流式导出任务历史
+
+    参数: format=ndjson|csv|zip，可选过滤 type、status、mode、since、until（ISO时间）。
+    zip 格式包含 jobs.ndjson 及各任务的输出图片。
+    """
+    fmt = request.args.get('format', 'ndjson').lower()
+    if fmt not in ('ndjson', 'csv', 'zip'):
+        return jsonify({"error": f"不支持的导出格式: {fmt}"}), 400
+    try:
+        filters = {
+            'type': request.args.get('type'),
+            'status': request.args.get('status'),
+            'mode': request.args.get('mode'),
+            'since': _parse_time(request.args.get('since')),
+            'until': _parse_time(request.args.get('until')),
+        }
+    except ValueError as e:
+        return jsonify({"error": f"时间格式错误: {str(e)}"}), 400
+    
+    # 以导出开始时的最大id为界，导出过程中新增的任务不计入
+    filters['max_id'] = db.session.query(func.max(LocalJob.id)).scalar() or 0
+    engine, table = db.engine, LocalJob.__table__
+    
+    def rows():
+        return iter_job_rows(engine, table, filters, params_table=JobParams.__table__)
+    
+    if fmt == 'ndjson':
+        body, mimetype = ndjson_stream(rows()), 'application/x-ndjson'
+    elif fmt == 'csv':
+        body, mimetype = csv_stream(rows()), 'text/csv; charset=utf-8'
+    else:
+        body, mimetype = zip_stream(rows, _output_chunks), 'application/zip'
+    
+    response = Response(stream_with_context(body), mimetype=mimetype)
+    filename = f"jobs-{datetime.now().strftime('%Y%m%d-%H%M%S')}.{fmt}"
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
 # 静态文件代理（如果本地没有）
-@app.route("/static/<path:filename>")
+@bp.route("/static/uploads/<path:filename>")
+def static_upload(filename):
+    """上传目录中的文件（sendfile 或 X-Accel-Redirect）"""
+    path = safe_join(os.path.join(current_app.static_folder, 'uploads'), filename)
+    if path is None or not os.path.isfile(path):
+        return Response("File not found", status=404)
+    return current_app.extensions['file_sender'].send(Path(path))
+
+@bp.route("/static/<path:filename>")
 def static_proxy(filename):
     """静态文件代理"""
     try:
         # 首先尝试本地文件
-        return send_from_directory(app.static_folder, filename)
+        return send_from_directory(current_app.static_folder, filename)
     except:
         try:
             # 如果本地没有，代理到远程服务器
@@ -267,11 +1284,11 @@ def static_proxy(filename):
             return Response(f"Error: {str(e)}", status=500)
 
 # 添加favicon支持
-@app.route("/favicon.ico")
+@bp.route("/favicon.ico")
 def favicon():
     """Favicon"""
     try:
-        return send_from_directory(app.static_folder, 'favicon.ico')
+        return send_from_directory(current_app.static_folder, 'favicon.ico')
     except:
         # 返回一个简单的透明图标
         return Response(
@@ -279,39 +1296,36 @@ def favicon():
             mimetype='image/png'
         )
 
-@app.errorhandler(404)
+@bp.app_errorhandler(404)
 def not_found(error):
     return jsonify({'error': 'Not found'}), 404
 
-@app.errorhandler(500)
+@bp.app_errorhandler(500)
 def internal_error(error):
     return jsonify({'error': 'Internal server error'}), 500
 
 def main():
     """主函数"""
     print("🚀 启动BaiduCBIT本地版本 v2.0...")
-    print(f"📡 服务器地址: {api_client.server_url}")
+    app = get_app()
     
-    # 创建数据库表
     with app.app_context():
-        try:
-            db.create_all()
-            db_type = "内存数据库" if app.config['SQLALCHEMY_DATABASE_URI'] == 'sqlite:///:memory:' else "本地数据库"
-            print(f"✓ {db_type}已初始化")
-        except Exception as e:
-            print(f"⚠️  数据库初始化失败: {e}")
-            raise
+        print(f"📡 服务器地址: {api_client.server_url}")
     
-    # 检查服务器连接（CI环境中跳过以加快启动）
-    ci_env = os.getenv('CI', '').lower() == 'true'
-    if not ci_env:
-        if api_client.health_check():
-            print("✅ 服务器连接正常")
-        else:
-            print("⚠️  警告: 无法连接到服务器，请检查网络和服务器状态")
-            print("   部分功能可能无法正常使用")
-    else:
+    # 创建数据库表
+    try:
+        init_database(app)
+        db_type = "内存数据库" if app.config['SQLALCHEMY_DATABASE_URI'] == 'sqlite:///:memory:' else "本地数据库"
+        print(f"✓ {db_type}已初始化")
+    except Exception as e:
+        print(f"⚠️  数据库初始化失败: {e}")
+        raise
+    
+    # 服务器连接检查在后台进行，不阻塞启动
+    if is_ci():
         print("🔧 CI环境检测到，跳过远程服务器连接检查")
+    else:
+        print("📡 正在后台检查服务器连接...")
     
     # 创建必要目录
     Path('./downloads').mkdir(exist_ok=True)
@@ -324,6 +1338,8 @@ def main():
     print(f"🌐 本地访问地址: http://{host}:{port}")
     print("📱 界面与服务器端完全一致")
     print("🔄 所有API请求将代理到远程服务器")
+    startup_report.mark('ready')
+    print(startup_report.summary())
     print("按 Ctrl+C 停止服务")
     
     app.run(host=host, port=port, debug=debug)
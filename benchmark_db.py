@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+"""
+数据库规模基准测试
+按 create_prebuilt_db.py 的表结构合成 1万 / 100万 / 1000万 行的 local_jobs，
+测量 /api/jobs 列表、prompt_id 查找、/api/stats 的延迟，多个写入进程并发执行 generate() 插入的吞吐，
+以及数据库文件大小。结果输出为 JSON，修改表结构或索引前后各运行一次即可对比:
+
+    python benchmark_db.py --sizes 10k 1m --out before.json
+    python benchmark_db.py --sizes 10k 1m --out after.json --compare before.json
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from create_prebuilt_db import create_indexes, create_schema
+
+# 合成数据参数
+MODES = ['txt2img', 'txt2img', 'txt2img', 'txt2img', 'txt2img', 'txt2img', 'img2img', 'inpaint', 'face_swap', 'video']
+SIZES = [512, 768, 1024, 1024, 1280]
+BACKEND = 'http://10.0.0.1:9500'
+HISTORY_DAYS = 365
+# 乘法哈希常数，用于由行号生成确定的“随机”值（子查询中的 random() 可能被 SQLite 重复求值）
+HASH = 2654435761
+
+# /api/jobs 列表场景：名称 -> 查询字符串
+LIST_QUERIES = {
+    'latest': '',
+    'mode': 'mode=inpaint',
+    'size': 'width=1024&height=1024',
+    'mode_steps': 'mode=txt2img&steps=30',
+}
+
+
+def parse_size(text: str) -> int:
+    """10k / 1m / 10m / 12345 -> 行数"""
+    text = text.strip().lower()
+    scale = {'k': 1000, 'm': 1000000}.get(text[-1:], 1)
+    return int(float(text.rstrip('km')) * scale)
+
+
+def prompt_id_for(i: int) -> str:
+    """合成数据第 i 行的 prompt_id（与 SQL 中的生成方式一致，UUID 形式）"""
+    return f"{(i * HASH) % 2 ** 32:08x}-{i % 65536:04x}-4{i % 4096:03x}-8{(i // 7) % 4096:03x}-{i:012x}"
+
+
+def _percentiles(samples_ms: List[float]) -> Dict[str, float]:
+    ordered = sorted(samples_ms)
+
+    def pick(p):
+        return round(ordered[min(len(ordered) - 1, int(len(ordered) * p))], 3)
+
+    return {'p50_ms': pick(0.50), 'p95_ms': pick(0.95), 'p99_ms': pick(0.99),
+            'mean_ms': round(statistics.fmean(ordered), 3), 'samples': len(ordered)}
+
+
+def synthesize(db_path: Path, rows: int, chunk: int = 1000000, page_size: int = 8192) -> float:
+    """生成包含 rows 行任务的数据库（建表、写入、建索引、ANALYZE、安装统计触发器），返回耗时秒数
+
+    写入用递归 CTE 在 SQLite 内部完成，1000万行也只需几分钟。
+    """
+    from job_params import encode_body
+
+    start = time.perf_counter()
+    if db_path.exists():
+        db_path.unlink()
+    conn = sqlite3.connect(str(db_path), isolation_level=None)
+    cursor = conn.cursor()
+    cursor.execute(f'PRAGMA page_size={page_size}')
+    cursor.execute('PRAGMA journal_mode=OFF')
+    cursor.execute('PRAGMA synchronous=OFF')
+    cursor.execute('PRAGMA cache_size=-262144')
+    cursor.execute('PRAGMA temp_store=MEMORY')
+    create_schema(cursor)
+
+    # 不同提示词的参数体，任务按行号共用
+    distinct = max(1, min(rows // 10, 10000))
+    cursor.execute('BEGIN')
+    cursor.executemany('INSERT INTO job_params (id, digest, body) VALUES (?, ?, ?)', (
+        (n + 1, *encode_body({'prompt': f'基准测试提示词 {n}', 'negative_prompt': '', 'guidance': 7.5,
+                              'client_id': f'bench-{n % 97}'}))
+        for n in range(distinct)
+    ))
+    cursor.execute('COMMIT')
+
+    origin = time.time() - HISTORY_DAYS * 86400
+    step = HISTORY_DAYS * 86400 / max(rows, 1)
+    modes = ' '.join(f"WHEN {n} THEN '{m}'" for n, m in enumerate(MODES))
+    sizes = ' '.join(f"WHEN {n} THEN {s}" for n, s in enumerate(SIZES))
+    insert = f"""
+        WITH RECURSIVE seq(i) AS (SELECT :first UNION ALL SELECT i + 1 FROM seq WHERE i < :last),
+        base AS (
+            SELECT i,
+                   CASE (i * 7) % {len(MODES)} {modes} END AS mode,
+                   (i * {HASH}) % 100 AS roll,
+                   :origin + i * :step AS ts
+            FROM seq
+        )
+        INSERT INTO local_jobs (remote_job_id, type, status, prompt_id, created_at, backend, outputs,
+                                completed_at, params_id, params_meta)
+        SELECT i, mode,
+               CASE WHEN roll < 90 THEN 'completed' WHEN roll < 95 THEN 'failed' ELSE 'queued' END,
+               printf('%08x-%04x-4%03x-8%03x-%012x', (i * {HASH}) % 4294967296, i % 65536, i % 4096,
+                      (i / 7) % 4096, i),
+               strftime('%Y-%m-%d %H:%M:%S', ts, 'unixepoch') || '.000000',
+               '{BACKEND}',
+               CASE WHEN roll < 90 THEN json_array(json_object(
+                   'filename', printf('ComfyUI_%08d_.png', i), 'subfolder', '', 'type', 'output')) END,
+               CASE WHEN roll < 95 THEN
+                   strftime('%Y-%m-%d %H:%M:%S', ts + 5 + (i * {HASH}) % 115, 'unixepoch') || '.000000' END,
+               1 + (i * {HASH}) % {distinct},
+               CASE WHEN mode = 'video' THEN json_object('mode', mode)
+                    ELSE json_object('mode', mode,
+                                     'width', CASE (i / 3) % {len(SIZES)} {sizes} END,
+                                     'height', CASE (i / 5) % {len(SIZES)} {sizes} END,
+                                     'steps', CASE WHEN roll < 60 THEN 30 WHEN roll < 85 THEN 20 ELSE 50 END,
+                                     'seed', (i * {HASH} + 12345) % 4294967296) END
+        FROM base
+    """
+    for first in range(1, rows + 1, chunk):
+        last = min(rows, first + chunk - 1)
+        cursor.execute('BEGIN')
+        cursor.execute(insert, {'first': first, 'last': last, 'origin': origin, 'step': step})
+        cursor.execute('COMMIT')
+        if rows > chunk:
+            print(f"   已生成 {last} / {rows} 行...")
+
+    create_indexes(cursor)
+    cursor.execute('ANALYZE')
+    cursor.execute('PRAGMA journal_mode=DELETE')
+    conn.close()
+
+    from sqlalchemy import create_engine
+    from job_rollups import install_rollups
+    engine = create_engine(f"sqlite:///{db_path.resolve()}")
+    install_rollups(engine)
+    engine.dispose()
+    return time.perf_counter() - start
+
+
+def _make_app(db_path: Path):
+    # 基准测试不访问远程服务器（CI 模式下不启动后端健康检查线程）
+    os.environ.setdefault('SERVER_URL', 'http://127.0.0.1:9')
+    os.environ['CI'] = 'true'
+    os.environ['PREFETCH_RESULTS'] = 'false'
+    os.environ['RETENTION_DAYS'] = '0'
+    from app_local import create_app, init_database
+
+    app = create_app(database_uri=f"sqlite:///{db_path.resolve()}")
+    init_database(app)
+    return app
+
+
+def measure_reads(db_path: Path, rows: int, iterations: int) -> Dict[str, Dict]:
+    """通过 Flask 测试客户端测量列表与统计接口，在应用上下文中测量 prompt_id 查找"""
+    from app_local import LocalJob, job_backend
+
+    app = _make_app(db_path)
+    client = app.test_client()
+    results: Dict[str, Dict] = {}
+
+    def timed(fn) -> Dict[str, float]:
+        fn()  # 预热缓存页
+        samples = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            fn()
+            samples.append((time.perf_counter() - start) * 1000)
+        return _percentiles(samples)
+
+    for name, query in LIST_QUERIES.items():
+        def list_jobs(query=query):
+            response = client.get(f'/api/jobs?{query}')
+            assert response.status_code == 200, response.data
+        results[f'list_{name}'] = timed(list_jobs)
+
+    since = (datetime.utcnow().replace(microsecond=0) - timedelta(days=30)).isoformat()
+    results['stats_day'] = timed(lambda: client.get(f'/api/stats?period=day&since={since}'))
+
+    rng = random.Random(rows)
+    with app.app_context():
+        # 结果轮询与任务完成记录都按 prompt_id 查找最新一条任务
+        def lookup():
+            job_backend(prompt_id_for(rng.randint(1, rows)))
+        results['lookup_prompt_id'] = timed(lookup)
+
+        def lookup_missing():
+            LocalJob.query.filter_by(prompt_id=f'missing-{rng.random()}').order_by(LocalJob.id.desc()).first()
+        results['lookup_missing'] = timed(lookup_missing)
+    return results
+
+
+def _writer(db_path: str, seconds: float, seed: int) -> List[float]:
+    """写入进程：与 generate() 相同的方式插入任务，返回每次提交的耗时（毫秒）"""
+    from app_local import LocalJob, db
+
+    app = _make_app(Path(db_path))
+    rng = random.Random(seed)
+    samples = []
+    with app.app_context():
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            mode = rng.choice(MODES)
+            params = {'mode': mode, 'prompt': f'并发写入 {rng.randint(0, 999)}', 'width': rng.choice(SIZES),
+                      'height': rng.choice(SIZES), 'steps': 30, 'seed': rng.getrandbits(32), 'client_id': f'w{seed}'}
+            start = time.perf_counter()
+            job = LocalJob(remote_job_id=rng.getrandbits(31), type=mode, status='queued',
+                           prompt_id=f'{seed:04x}-{rng.getrandbits(64):016x}', backend=BACKEND)
+            job.set_params(params)
+            db.session.add(job)
+            db.session.commit()
+            samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def measure_inserts(db_path: Path, writers: List[int], seconds: float) -> Dict[str, Dict]:
+    """每个写入进程模拟一个 gunicorn worker，统计总吞吐与单次提交延迟"""
+    context = multiprocessing.get_context('spawn')
+    results = {}
+    for count in writers:
+        with context.Pool(count) as pool:
+            start = time.perf_counter()
+            batches = pool.starmap(_writer, [(str(db_path), seconds, n) for n in range(count)])
+            elapsed = time.perf_counter() - start
+        samples = [ms for batch in batches for ms in batch]
+        # 吞吐按写入时长计算，不含进程启动时间
+        result = _percentiles(samples) if samples else {'samples': 0}
+        result['rows_per_s'] = round(len(samples) / seconds, 1)
+        result['wall_s'] = round(elapsed, 2)
+        results[str(count)] = result
+    return results
+
+
+def file_size(db_path: Path) -> int:
+    """数据库文件加上 WAL 文件的大小"""
+    return sum(p.stat().st_size for p in (db_path, Path(f'{db_path}-wal')) if p.exists())
+
+
+def run(sizes: List[int], workdir: Path, writers: List[int], write_seconds: float, iterations: int,
+        reuse: bool = False) -> dict:
+    """执行全部基准测试，返回可序列化为 JSON 的结果"""
+    workdir.mkdir(parents=True, exist_ok=True)
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+        },
+        'results': [],
+    }
+    for rows in sizes:
+        db_path = workdir / f'bench_{rows}.db'
+        print(f"📊 {rows} 行")
+        build_s = None
+        if not (reuse and db_path.exists()):
+            build_s = round(synthesize(db_path, rows), 2)
+            print(f"   生成耗时 {build_s}s")
+        size = file_size(db_path)
+        result = {
+            'rows': rows,
+            'build_s': build_s,
+            'file_bytes': size,
+            'bytes_per_row': round(size / max(rows, 1), 1),
+            'reads': measure_reads(db_path, rows, iterations),
+            'inserts': measure_inserts(db_path, writers, write_seconds),
+        }
+        result['file_bytes_after_inserts'] = file_size(db_path)
+        report['results'].append(result)
+        for name, stats in result['reads'].items():
+            print(f"   {name}: p50 {stats['p50_ms']}ms  p95 {stats['p95_ms']}ms")
+        for count, stats in result['inserts'].items():
+            print(f"   insert x{count}: {stats['rows_per_s']} 行/s  p95 {stats.get('p95_ms')}ms")
+    return report
+
+
+def compare(report: dict, baseline: dict) -> List[str]:
+    """与之前的结果对比，返回每项指标的变化（正数表示变慢/变大）"""
+    lines = []
+    before = {r['rows']: r for r in baseline.get('results', [])}
+    for result in report['results']:
+        old = before.get(result['rows'])
+        if old is None:
+            continue
+
+        def delta(label, new_value, old_value):
+            if new_value is None or not old_value:
+                return
+            lines.append(f"{result['rows']:>10} {label:<28} {old_value:>12} -> {new_value:<12} "
+                         f"{(new_value - old_value) / old_value * 100:+.1f}%")
+
+        delta('file_bytes', result['file_bytes'], old['file_bytes'])
+        for name, stats in result['reads'].items():
+            delta(f'{name} p95_ms', stats['p95_ms'], old['reads'].get(name, {}).get('p95_ms'))
+        for count, stats in result['inserts'].items():
+            delta(f'insert x{count} rows_per_s', stats['rows_per_s'], old['inserts'].get(count, {}).get('rows_per_s'))
+    return lines
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="local_jobs 数据库规模基准测试")
+    parser.add_argument('--sizes', nargs='+', default=['10k', '1m', '10m'], help="任务行数，如 10k 1m 10m")
+    parser.add_argument('--writers', nargs='+', type=int, default=[1, 4, 8], help="并发写入进程数")
+    parser.add_argument('--write-seconds', type=float, default=5, help="每轮并发写入的时长")
+    parser.add_argument('--iterations', type=int, default=200, help="每个读取场景的采样次数")
+    parser.add_argument('--workdir', help="合成数据库所在目录（默认临时目录）")
+    parser.add_argument('--reuse', action='store_true', help="workdir 中已有合成数据库时直接使用")
+    parser.add_argument('--out', default='benchmark_results.json', help="结果JSON文件，- 表示输出到标准输出")
+    parser.add_argument('--compare', metavar='BASELINE', help="与之前的结果JSON对比")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix='cbit-bench-') as tmp:
+        workdir = Path(args.workdir) if args.workdir else Path(tmp)
+        report = run([parse_size(s) for s in args.sizes], workdir, args.writers, args.write_seconds,
+                     args.iterations, reuse=args.reuse)
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out == '-':
+        print(text)
+    else:
+        Path(args.out).write_text(text + '\n', encoding='utf-8')
+        print(f"✅ 结果已写入 {args.out}")
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding='utf-8'))
+        print('\n'.join(compare(report, baseline)) or "没有可对比的规模")
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+静态资源构建工具
+为 static/ 下的 JS/CSS/图片生成带内容哈希的文件名，并预压缩 gzip / brotli 版本
+输出到 static/dist/，映射关系写入 static/dist/manifest.json
+"""
+
+import gzip
+import hashlib
+import json
+import shutil
+import sys
+from pathlib import Path
+
+try:
+    import brotli
+except ImportError:  # brotli 为可选依赖，缺失时只生成 gzip
+    brotli = None
+
+STATIC_DIR = Path(__file__).parent / "static"
+DIST_DIR = STATIC_DIR / "dist"
+MANIFEST_NAME = "manifest.json"
+
+# 参与构建的子目录（uploads 为用户上传内容，不参与）
+ASSET_DIRS = ["js", "css", "images"]
+
+# 值得预压缩的文本类资源
+COMPRESSIBLE_SUFFIXES = {".js", ".css", ".svg", ".json", ".html", ".txt", ".map"}
+
+# 小于该大小的文件压缩收益可以忽略
+MIN_COMPRESS_SIZE = 512
+
+
+def fingerprint(data: bytes) -> str:
+    """计算内容哈希"""
+    return hashlib.sha256(data).hexdigest()[:12]
+
+
+def build_asset(src: Path) -> str:
+    """构建单个资源，返回相对 static/ 的输出路径"""
+    data = src.read_bytes()
+    rel = src.relative_to(STATIC_DIR)
+    hashed_name = f"{src.stem}.{fingerprint(data)}{src.suffix}"
+    out = DIST_DIR / rel.parent / hashed_name
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_bytes(data)
+
+    if src.suffix in COMPRESSIBLE_SUFFIXES and len(data) >= MIN_COMPRESS_SIZE:
+        # mtime=0 保证相同内容的构建结果逐字节一致
+        out.with_name(out.name + ".gz").write_bytes(gzip.compress(data, compresslevel=9, mtime=0))
+        if brotli is not None:
+            out.with_name(out.name + ".br").write_bytes(brotli.compress(data, quality=11))
+
+    return out.relative_to(STATIC_DIR).as_posix()
+
+
+def build() -> dict:
+    """构建全部静态资源并写出 manifest"""
+    if DIST_DIR.exists():
+        shutil.rmtree(DIST_DIR)
+    DIST_DIR.mkdir(parents=True)
+
+    manifest = {}
+    for name in ASSET_DIRS:
+        base = STATIC_DIR / name
+        if not base.exists():
+            continue
+        for src in sorted(p for p in base.rglob("*") if p.is_file()):
+            manifest[src.relative_to(STATIC_DIR).as_posix()] = build_asset(src)
+
+    (DIST_DIR / MANIFEST_NAME).write_text(json.dumps(manifest, indent=2, sort_keys=True), encoding="utf-8")
+    return manifest
+
+
+def main():
+    """主函数"""
+    print("🔧 构建静态资源...")
+    if not STATIC_DIR.exists():
+        print("❌ 错误：找不到 static 目录")
+        sys.exit(1)
+
+    manifest = build()
+    for src, out in manifest.items():
+        print(f"✅ {src} -> {out}")
+
+    if brotli is None:
+        print("⚠️ 未安装 brotli，仅生成 gzip 预压缩文件")
+    print(f"📁 共构建 {len(manifest)} 个资源，清单: {DIST_DIR / MANIFEST_NAME}")
+
+
+if __name__ == "__main__":
+    main()
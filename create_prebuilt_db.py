@@ -2,13 +2,100 @@
 """
 创建预置数据库文件
 将数据库文件直接打包到Docker镜像中，避免权限问题
+
+也可以批量导入/导出任务（迁移实例、合并历史）:
+    python create_prebuilt_db.py --import jobs.ndjson old_cache.db
+    python create_prebuilt_db.py --export jobs.ndjson.gz
 """
 
+import argparse
+import gzip
+import json
 import os
 import sys
 import sqlite3
+import time
 from pathlib import Path
 from datetime import datetime
+from typing import Dict, Iterable, Iterator, List
+
+# 表结构（与app_local.py中的模型一致）
+SCHEMA = [
+    # 任务参数表（去重压缩存储）
+    '''
+    CREATE TABLE IF NOT EXISTS job_params (
+        id INTEGER PRIMARY KEY,
+        digest VARCHAR(64) NOT NULL UNIQUE,
+        body BLOB NOT NULL
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS local_jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        remote_job_id INTEGER,
+        type VARCHAR(50),
+        params TEXT,
+        status VARCHAR(20) DEFAULT 'queued',
+        prompt_id VARCHAR(64) DEFAULT '',
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        backend VARCHAR(255) DEFAULT '',
+        outputs TEXT,
+        completed_at TIMESTAMP,
+        params_id INTEGER REFERENCES job_params(id),
+        params_meta TEXT,
+        param_mode VARCHAR(50) GENERATED ALWAYS AS (json_extract(params_meta, '$.mode')) VIRTUAL,
+        param_width INTEGER GENERATED ALWAYS AS (json_extract(params_meta, '$.width')) VIRTUAL,
+        param_height INTEGER GENERATED ALWAYS AS (json_extract(params_meta, '$.height')) VIRTUAL,
+        param_steps INTEGER GENERATED ALWAYS AS (json_extract(params_meta, '$.steps')) VIRTUAL,
+        param_seed INTEGER GENERATED ALWAYS AS (json_extract(params_meta, '$.seed')) VIRTUAL,
+        submitted_at TIMESTAMP,
+        accepted_at TIMESTAMP,
+        first_progress_at TIMESTAMP
+    )
+    ''',
+    # 用量汇总表（由 job_rollups 中的触发器维护）
+    '''
+    CREATE TABLE IF NOT EXISTS job_rollups (
+        period VARCHAR(8) NOT NULL,
+        bucket VARCHAR(16) NOT NULL,
+        type VARCHAR(50) NOT NULL,
+        status VARCHAR(20) NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (period, bucket, type, status)
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS job_latency_rollups (
+        period VARCHAR(8) NOT NULL,
+        bucket VARCHAR(16) NOT NULL,
+        type VARCHAR(50) NOT NULL,
+        le_ms INTEGER NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (period, bucket, type, le_ms)
+    )
+    ''',
+]
+
+# 索引名与 SQLAlchemy 的 ix_<表>_<列> 一致，应用启动时不会重复创建
+INDEXED_COLUMNS = [
+    'remote_job_id', 'prompt_id', 'status', 'created_at', 'params_id',
+    'param_mode', 'param_width', 'param_height', 'param_steps', 'param_seed',
+]
+
+
+def create_schema(cursor):
+    """创建表（不含索引）"""
+    # 必须在建表前设置，删除任务后可增量回收空间
+    cursor.execute('PRAGMA auto_vacuum=INCREMENTAL')
+    for statement in SCHEMA:
+        cursor.execute(statement)
+
+
+def create_indexes(cursor):
+    """创建索引；批量导入时在数据写入后再建，比逐行维护索引快得多"""
+    for column in INDEXED_COLUMNS:
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS ix_local_jobs_{column} ON local_jobs({column})')
+
 
 def create_prebuilt_database():
     """创建预置数据库文件"""
@@ -33,26 +120,10 @@ def create_prebuilt_database():
         
         print("✅ 数据库连接成功")
         
-        # 创建LocalJob表（与app_local.py中的模型一致）
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS local_jobs (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                remote_job_id INTEGER,
-                type VARCHAR(50),
-                params TEXT,
-                status VARCHAR(20) DEFAULT 'queued',
-                prompt_id VARCHAR(64) DEFAULT '',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
+        # 创建表与索引（与app_local.py中的模型一致）
+        create_schema(cursor)
         print("✅ 创建local_jobs表成功")
-        
-        # 创建索引
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_remote_job_id ON local_jobs(remote_job_id)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_prompt_id ON local_jobs(prompt_id)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_status ON local_jobs(status)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_created_at ON local_jobs(created_at)')
+        create_indexes(cursor)
         
         print("✅ 创建索引成功")
         
@@ -98,6 +169,187 @@ def create_prebuilt_database():
         print(f"❌ 创建数据库失败: {e}")
         return False
 
+SQLITE_HEADER = b'SQLite format 3\x00'
+GZIP_MAGIC = b'\x1f\x8b'
+
+
+def _iter_sqlite_rows(source: Path) -> Iterator[dict]:
+    """读取另一个数据库中的任务（兼容旧表结构）"""
+    from sqlalchemy import MetaData, create_engine
+    from job_export import iter_job_rows
+
+    engine = create_engine(f"sqlite:///{source.resolve()}")
+    metadata = MetaData()
+    metadata.reflect(engine, only=lambda name, _: name in ('local_jobs', 'job_params'))
+    jobs = metadata.tables['local_jobs']
+    params = metadata.tables.get('job_params') if 'params_meta' in jobs.c else None
+    try:
+        yield from iter_job_rows(engine, jobs, {}, batch_size=5000, params_table=params)
+    finally:
+        engine.dispose()
+
+
+def iter_source_rows(source: Path) -> Iterator[dict]:
+    """读取导入源：NDJSON（可为gzip，如 /api/jobs/export 的导出或过期任务归档）或SQLite数据库"""
+    with open(source, 'rb') as f:
+        head = f.read(len(SQLITE_HEADER))
+    if head == SQLITE_HEADER:
+        yield from _iter_sqlite_rows(source)
+        return
+    opener = gzip.open if head.startswith(GZIP_MAGIC) else open
+    with opener(source, 'rt', encoding='utf-8-sig') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _db_time(value):
+    """统一为 SQLAlchemy 的 SQLite 时间格式，保证按字符串比较的范围查询正确"""
+    if not value:
+        return None
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value)
+        except ValueError:
+            return value
+    return value.strftime('%Y-%m-%d %H:%M:%S.%f')
+
+
+def _json_text(value):
+    if value is None or isinstance(value, str):
+        return value
+    return json.dumps(value, ensure_ascii=False)
+
+
+def _job_values(row: dict, digests: Dict[str, int], new_params: List[tuple]) -> tuple:
+    """导入行 -> local_jobs 插入值；参数按 job_params 格式去重压缩"""
+    from job_params import encode_body, split_params
+
+    params = row.get('params')
+    params_id = params_meta = legacy = None
+    if isinstance(params, dict):
+        meta, rest = split_params(params)
+        digest, body = encode_body(rest)
+        params_id = digests.get(digest)
+        if params_id is None:
+            params_id = digests[digest] = len(digests) + 1
+            new_params.append((params_id, digest, body))
+        params_meta = json.dumps(meta, ensure_ascii=False, separators=(',', ':'))
+    else:
+        legacy = _json_text(params)
+    return (
+        row.get('remote_job_id'),
+        row.get('type'),
+        legacy,
+        row.get('status') or 'queued',
+        row.get('prompt_id') or '',
+        _db_time(row.get('created_at')) or _db_time(datetime.utcnow()),
+        row.get('backend') or '',
+        _json_text(row.get('outputs')),
+        _db_time(row.get('completed_at')),
+        params_id,
+        params_meta,
+        _db_time(row.get('submitted_at')),
+        _db_time(row.get('accepted_at')),
+        _db_time(row.get('first_progress_at')),
+    )
+
+
+def _flush(cursor, jobs: List[tuple], params: List[tuple]):
+    cursor.executemany('INSERT INTO job_params (id, digest, body) VALUES (?, ?, ?)', params)
+    cursor.executemany('''
+        INSERT INTO local_jobs (remote_job_id, type, params, status, prompt_id, created_at,
+                                backend, outputs, completed_at, params_id, params_meta,
+                                submitted_at, accepted_at, first_progress_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', jobs)
+    jobs.clear()
+    params.clear()
+
+
+def _build_database(sources: List[Path], tmp_path: Path, batch_size: int, page_size: int):
+    """把导入源写入新的数据库文件，返回 (任务数, 参数份数, 开始时间, 写入完成时间)"""
+    conn = sqlite3.connect(str(tmp_path), isolation_level=None)
+    cursor = conn.cursor()
+    cursor.execute(f'PRAGMA page_size={page_size}')
+    cursor.execute('PRAGMA journal_mode=OFF')
+    cursor.execute('PRAGMA synchronous=OFF')
+    cursor.execute('PRAGMA cache_size=-65536')
+    cursor.execute('PRAGMA temp_store=MEMORY')
+    create_schema(cursor)
+
+    start = time.perf_counter()
+    digests: Dict[str, int] = {}
+    jobs: List[tuple] = []
+    params: List[tuple] = []
+    total = 0
+    cursor.execute('BEGIN')
+    for source in sources:
+        for row in iter_source_rows(source):
+            jobs.append(_job_values(row, digests, params))
+            total += 1
+            if len(jobs) >= batch_size:
+                _flush(cursor, jobs, params)
+                cursor.execute('COMMIT')
+                cursor.execute('BEGIN')
+                print(f"   已导入 {total} 条...")
+    _flush(cursor, jobs, params)
+    cursor.execute('COMMIT')
+    loaded = time.perf_counter()
+
+    create_indexes(cursor)
+    cursor.execute('ANALYZE')
+    cursor.execute('PRAGMA journal_mode=DELETE')
+    conn.close()
+
+    from sqlalchemy import create_engine
+    from job_rollups import install_rollups
+    engine = create_engine(f"sqlite:///{tmp_path.resolve()}")
+    install_rollups(engine)
+    engine.dispose()
+    return total, len(digests), start, loaded
+
+
+def bulk_import(sources: Iterable[Path], db_path: Path, batch_size: int = 50000, page_size: int = 8192) -> int:
+    """从多个导入源生成新的数据库文件，返回导入的任务数
+
+    目标文件是新建的构建产物，导入期间关闭日志与同步；
+    每 batch_size 行提交一次，全部写入后再建索引、ANALYZE 并安装统计触发器。
+    任务id重新分配，合并多份历史时不会冲突。
+    先写入同目录下的临时文件，成功后才替换 db_path，导入失败时原数据库保持不变。
+    """
+    sources = [Path(source) for source in sources]
+    if any(source.resolve() == db_path.resolve() for source in sources):
+        raise ValueError(f"导入源不能是目标数据库本身: {db_path}")
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = db_path.with_name(f".{db_path.name}.{os.getpid()}.tmp")
+    if tmp_path.exists():
+        tmp_path.unlink()
+    try:
+        total, params, start, loaded = _build_database(sources, tmp_path, batch_size, page_size)
+        os.chmod(str(tmp_path), 0o666)
+        os.replace(tmp_path, db_path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+    print(f"✅ 导入 {total} 条任务（{params} 份不同参数），"
+          f"写入 {loaded - start:.1f}s，建索引与统计 {time.perf_counter() - loaded:.1f}s")
+    return total
+
+
+def export_database(db_path: Path, out_path: Path) -> int:
+    """把数据库中的任务导出为 NDJSON（.gz 结尾时压缩），格式与导入一致"""
+    count = 0
+    opener = gzip.open if out_path.suffix == '.gz' else open
+    with opener(out_path, 'wb') as f:
+        for row in _iter_sqlite_rows(db_path):
+            f.write(json.dumps(row, ensure_ascii=False).encode('utf-8') + b'\n')
+            count += 1
+    print(f"✅ 导出 {count} 条任务到 {out_path}")
+    return count
+
+
 def test_database():
     """测试数据库连接"""
     print("\n🧪 测试数据库连接...")
@@ -132,6 +384,15 @@ def test_database():
 
 def main():
     """主函数"""
+    parser = argparse.ArgumentParser(description="创建预置数据库，或批量导入/导出任务")
+    parser.add_argument('--import', dest='sources', nargs='+', metavar='SOURCE',
+                        help="从 NDJSON(.gz) 或 SQLite 文件批量导入任务，生成新的数据库")
+    parser.add_argument('--export', metavar='FILE', help="把数据库中的任务导出为 NDJSON(.gz)")
+    parser.add_argument('--db', default='db/prebuilt_cache.db', help="数据库文件（默认 db/prebuilt_cache.db）")
+    parser.add_argument('--batch-size', type=int, default=50000, help="每个事务写入的行数")
+    parser.add_argument('--page-size', type=int, default=8192, help="SQLite 页大小")
+    args = parser.parse_args()
+    
     print("🚀 CBIT-AiStudio 预置数据库创建工具")
     print("=" * 50)
     
@@ -140,6 +401,18 @@ def main():
         print("❌ 错误：请在CBIT-AiStudio项目根目录运行此脚本")
         sys.exit(1)
     
+    if args.export:
+        export_database(Path(args.db), Path(args.export))
+        return
+    if args.sources:
+        try:
+            bulk_import([Path(p) for p in args.sources], Path(args.db), args.batch_size, args.page_size)
+        except (OSError, ValueError) as e:
+            print(f"❌ 导入失败，原数据库未改动: {e}")
+            sys.exit(1)
+        print(f"\n🎉 数据库已生成: {Path(args.db).absolute()}")
+        return
+    
     # 创建数据库
     if create_prebuilt_database():
         print("\n✅ 预置数据库创建成功！")
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+本地文件发送 - sendfile 零拷贝，或交给 nginx 通过 X-Accel-Redirect 发送
+预取到 ./downloads 的结果与 static/uploads 下的文件不经过 Python 读写：
+默认由 send_file 交给 WSGI 服务器的 file_wrapper（gunicorn 使用 sendfile 系统调用），
+配置了 X-Accel 前缀时只返回响应头，由反向代理直接发送文件，worker 立即释放
+"""
+
+import mimetypes
+import urllib.parse
+from pathlib import Path
+from typing import Dict, Optional
+
+from flask import Response, send_file
+
+
+class FileSender:
+    """按所在目录选择发送方式
+
+    accel 为 {本地目录: nginx internal location 前缀}，目录内的文件以
+    X-Accel-Redirect 响应，由 nginx 负责 Range、条件请求和传输；其余文件使用 send_file。
+    """
+
+    def __init__(self, accel: Optional[Dict[str, str]] = None):
+        self.accel = {Path(root).resolve(): prefix.rstrip('/') + '/' for root, prefix in (accel or {}).items()}
+
+    def accel_uri(self, path: Path) -> Optional[str]:
+        """文件对应的 X-Accel-Redirect 地址，不在配置的目录内时返回 None"""
+        path = Path(path).resolve()
+        for root, prefix in self.accel.items():
+            if path.is_relative_to(root):
+                return prefix + urllib.parse.quote(path.relative_to(root).as_posix())
+        return None
+
+    def send(self, path: Path, mimetype: Optional[str] = None, max_age: Optional[int] = None) -> Response:
+        """发送本地文件，支持 Range 与条件请求"""
+        mimetype = mimetype or mimetypes.guess_type(str(path))[0] or 'application/octet-stream'
+        uri = self.accel_uri(path)
+        if uri is None:
+            return send_file(path, mimetype=mimetype, conditional=True, max_age=max_age)
+        response = Response(status=200, mimetype=mimetype)
+        response.headers['X-Accel-Redirect'] = uri
+        if max_age is not None:
+            response.cache_control.public = True
+            response.cache_control.max_age = max_age
+        return response
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+对冲请求 - 幂等GET在超过历史分位延迟仍未响应时，向同一后端再发一次，先到者胜出
+用全局令牌预算限制对冲比例，上游负载最多翻倍
+"""
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, TimeoutError as FutureTimeout, wait
+from typing import Callable, Deque, Dict, Iterable, Optional
+
+
+def _close_quietly(future):
+    """落败请求完成后释放其连接"""
+    try:
+        response = future.result()
+    except Exception:
+        return
+    response.close()
+
+
+def _spawn(send: Callable[[], object]) -> Future:
+    """在独立线程中执行首次请求，不与对冲请求共用线程池，不会排在慢请求之后"""
+    future: Future = Future()
+
+    def run():
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(send())
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, name='hedged-primary', daemon=True).start()
+    return future
+
+
+class Hedger:
+    """对冲请求执行器
+
+    延迟阈值取该路径最近 window 次首字节耗时的 percentile 分位数（不低于 min_delay_ms），
+    样本不足时使用 default_delay_ms。每个请求向预算存入 budget 个令牌，
+    一次对冲消耗一个令牌，因此对冲请求数不超过总请求数的 budget 倍（budget 上限为 1）。
+    只有对冲请求使用线程池，池中已有 max_workers 个对冲在执行时不再对冲；
+    没有令牌或线程池已满时首次请求直接在调用线程中发送。
+    """
+
+    def __init__(self, paths: Iterable[str], percentile: float = 95, budget: float = 0.1,
+                 min_delay_ms: float = 20, default_delay_ms: float = 500, window: int = 256,
+                 max_tokens: float = 10, max_workers: int = 32):
+        self.paths = tuple(paths)
+        self.percentile = percentile
+        self.budget = min(max(budget, 0.0), 1.0)
+        self.min_delay_ms = min_delay_ms
+        self.default_delay_ms = default_delay_ms
+        self.window = window
+        self.max_tokens = max_tokens
+        self.hedged = 0
+        self.hedge_wins = 0
+        self._tokens = 0.0
+        self._max_workers = max_workers
+        self._hedges_running = 0
+        self._samples: Dict[str, Deque[float]] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='hedged-request')
+
+    def applies(self, method: str, path: str) -> bool:
+        return method == 'GET' and path.startswith(self.paths)
+
+    def _key(self, path: str) -> str:
+        return next((p for p in self.paths if path.startswith(p)), path)
+
+    def observe(self, path: str, duration_ms: float):
+        """记录一次首字节耗时"""
+        with self._lock:
+            samples = self._samples.setdefault(self._key(path), deque(maxlen=self.window))
+            samples.append(duration_ms)
+
+    def delay_ms(self, path: str) -> float:
+        with self._lock:
+            samples = sorted(self._samples.get(self._key(path), ()))
+        if len(samples) < 20:
+            return self.default_delay_ms
+        index = min(len(samples) - 1, int(len(samples) * self.percentile / 100))
+        return max(self.min_delay_ms, samples[index])
+
+    def _can_hedge(self) -> bool:
+        return self._tokens >= 1 and self._hedges_running < self._max_workers
+
+    def _submit_hedge(self, send: Callable[[], object]) -> Optional[Future]:
+        """消耗一个令牌发出对冲请求，没有令牌或线程池已满时返回 None"""
+        with self._lock:
+            if not self._can_hedge():
+                return None
+            self._tokens -= 1
+            self._hedges_running += 1
+            self.hedged += 1
+        future = self._executor.submit(send)
+        future.add_done_callback(self._hedge_done)
+        return future
+
+    def _hedge_done(self, _):
+        with self._lock:
+            self._hedges_running -= 1
+
+    def run(self, path: str, send: Callable[[], object]):
+        """执行请求，必要时发出对冲请求，返回先完成的成功响应"""
+        with self._lock:
+            self._tokens = min(self.max_tokens, self._tokens + self.budget)
+            can_hedge = self._can_hedge()
+        start = time.perf_counter()
+        if not can_hedge:
+            response = send()
+        else:
+            first = _spawn(send)
+            try:
+                response = first.result(timeout=self.delay_ms(path) / 1000)
+            except FutureTimeout:
+                second = self._submit_hedge(send)
+                response = self._race(first, second) if second is not None else first.result()
+        self.observe(path, (time.perf_counter() - start) * 1000)
+        return response
+
+    def _race(self, first, second):
+        done, _ = wait([first, second], return_when=FIRST_COMPLETED)
+        winner = first if first in done else second
+        loser = second if winner is first else first
+        if winner.exception() is not None:
+            # 先完成的失败了，改用另一个（仍失败时抛出其异常）
+            winner, loser = loser, winner
+        response = winner.result()
+        loser.add_done_callback(_close_quietly)
+        if winner is second:
+            with self._lock:
+                self.hedge_wins += 1
+        return response
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'hedged': self.hedged, 'hedge_wins': self.hedge_wins}
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+上传图片预处理 - 转发到远程服务器前按 EXIF 方向摆正、去除元数据并缩小到最大边长
+手机原图常有 12-16MB，模型实际只用到 1024 左右的分辨率，在本地缩小可以减少上传耗时和远端解码开销
+"""
+
+import importlib.util
+import io
+from concurrent.futures import ThreadPoolExecutor
+from typing import IO, Optional, Tuple, Union
+
+# 只处理这些格式，其他格式（如动图）原样转发
+FORMATS = {
+    'JPEG': ('image/jpeg', {'quality': 90}),
+    'PNG': ('image/png', {'compress_level': 1}),
+    'WEBP': ('image/webp', {'quality': 90}),
+}
+
+# EXIF Orientation 标签
+ORIENTATION = 0x0112
+# Pillow 中 XMP 元数据的键
+XMP_KEYS = {'xmp', 'XML:com.adobe.xmp'}
+
+UploadFile = Tuple[str, Union[bytes, IO[bytes]], Optional[str]]
+
+
+def available() -> bool:
+    """是否安装了 Pillow（可选依赖，缺失时原样转发）"""
+    return importlib.util.find_spec('PIL') is not None
+
+
+class ImagePreprocessor:
+    """在有界线程池中处理上传图片（Pillow 解码/缩放/编码时会释放GIL）
+
+    已经摆正、不超过 max_size 且不含 EXIF 的图片原样转发，避免无谓的重新编码。
+    保留 ICC 色彩配置，其余元数据（EXIF、GPS、XMP、注释等）全部去除。
+    """
+
+    def __init__(self, max_size: int = 2048, max_workers: int = 2):
+        self.max_size = max_size
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='image-preprocess')
+
+    def process(self, filename: str, stream: IO[bytes], content_type: Optional[str]) -> UploadFile:
+        """返回可直接交给 requests 的文件元组"""
+        return self._executor.submit(self._process, filename, stream.read(), content_type).result()
+
+    def _process(self, filename: str, data: bytes, content_type: Optional[str]) -> UploadFile:
+        # 首次使用时才导入，不增加启动耗时
+        from PIL import Image, ImageOps
+
+        try:
+            image = Image.open(io.BytesIO(data))
+        except Exception:
+            return filename, data, content_type
+        if image.format not in FORMATS or getattr(image, 'is_animated', False):
+            return filename, data, content_type
+
+        exif = image.getexif()
+        too_large = max(image.size) > self.max_size
+        if not too_large and not exif and not (image.info.keys() & XMP_KEYS):
+            return filename, data, content_type
+
+        fmt = image.format
+        mimetype, options = FORMATS[fmt]
+        if too_large and fmt == 'JPEG':
+            # JPEG 可以直接以 1/2、1/4、1/8 分辨率解码，省去大部分解码开销
+            image.draft('RGB', (self.max_size, self.max_size))
+        if exif.get(ORIENTATION, 1) != 1:
+            image = ImageOps.exif_transpose(image)
+        if max(image.size) > self.max_size:
+            image.thumbnail((self.max_size, self.max_size), Image.LANCZOS)
+
+        icc_profile = image.info.get('icc_profile')
+        out = io.BytesIO()
+        if icc_profile:
+            options = dict(options, icc_profile=icc_profile)
+        image.save(out, fmt, **options)
+        return filename, out.getvalue(), mimetype
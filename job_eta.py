@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+任务耗时预测 - 按 模式/步数/分辨率 维护完成耗时的滑动平均，用于返回预计剩余时间
+每个任务完成时用一条 UPSERT 更新对应的统计行，不需要重新扫描历史任务
+"""
+
+from datetime import datetime
+from typing import Optional, Tuple
+
+from sqlalchemy import case, func, literal, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+# 分辨率按像素数分桶，每桶 512x512
+PIXEL_BUCKET = 512 * 512
+# 滑动平均窗口：前 WINDOW 个样本为算术平均，之后每个新样本权重为 1/WINDOW，能跟上后端性能变化
+WINDOW = 20
+
+# upstream 结果中表示已开始执行的状态
+PROGRESS_STATUSES = ('running', 'processing')
+
+EtaKey = Tuple[str, int, int]
+
+
+def job_key(meta: dict) -> EtaKey:
+    """params_meta 热字段 -> (mode, steps, 像素桶)；视频等没有步数和尺寸的任务记为 0"""
+    mode = str(meta.get('mode') or 'unknown')
+    steps = meta.get('steps') if isinstance(meta.get('steps'), int) else 0
+    width, height = meta.get('width'), meta.get('height')
+    pixels = round(width * height / PIXEL_BUCKET) if isinstance(width, int) and isinstance(height, int) else 0
+    return mode, steps, pixels
+
+
+def elapsed_ms(start: Optional[datetime], end: Optional[datetime]) -> Optional[float]:
+    if start is None or end is None:
+        return None
+    return max(0.0, (end - start).total_seconds() * 1000)
+
+
+def _moving_average(table, column: str, count: str, excluded):
+    """新样本为 NULL 时保持原值，原值为 NULL 时直接取新样本"""
+    old, new = table.c[column], excluded[column]
+    return case(
+        (new.is_(None), old),
+        (old.is_(None), new),
+        else_=old + (new - old) / func.min(table.c[count] + 1, WINDOW),
+    )
+
+
+def observe(conn, table, meta: dict, total_ms: float, run_ms: Optional[float] = None):
+    """记录一个成功完成的任务
+
+    total_ms 为提交到完成的耗时，run_ms 为开始执行到完成的耗时（未观察到开始执行时为 None）。
+    conn 可以是 Connection 或 Session。
+    """
+    mode, steps, pixels = job_key(meta)
+    stmt = sqlite_insert(table).values(
+        mode=mode, steps=steps, pixels=pixels, count=1, total_ms=total_ms,
+        run_count=0 if run_ms is None else 1, run_ms=run_ms,
+    )
+    excluded = stmt.excluded
+    conn.execute(stmt.on_conflict_do_update(
+        index_elements=['mode', 'steps', 'pixels'],
+        set_={
+            'count': table.c.count + 1,
+            'total_ms': _moving_average(table, 'total_ms', 'count', excluded),
+            'run_count': table.c.run_count + case((excluded.run_ms.is_(None), 0), else_=1),
+            'run_ms': _moving_average(table, 'run_ms', 'run_count', excluded),
+        },
+    ))
+
+
+def predict(conn, table, meta: dict) -> Optional[Tuple[float, Optional[float]]]:
+    """预计 (提交到完成, 开始执行到完成) 的耗时（毫秒），没有同模式的历史时返回 None
+
+    优先使用步数与分辨率都相同的统计，否则退回同模式中最接近的一行，
+    并按步数比例缩放其中的执行时间。
+    """
+    mode, steps, pixels = job_key(meta)
+    row = conn.execute(
+        select(table.c.steps, table.c.total_ms, table.c.run_ms)
+        .where(table.c.mode == mode)
+        .order_by((table.c.steps == literal(steps)).desc(),
+                  (table.c.pixels == literal(pixels)).desc(),
+                  func.abs(table.c.pixels - pixels),
+                  table.c.count.desc())
+        .limit(1)
+    ).first()
+    if row is None:
+        return None
+    total, run = row.total_ms, row.run_ms
+    if run is not None and row.steps and steps and row.steps != steps:
+        scaled = run * steps / row.steps
+        total, run = max(0.0, total + scaled - run), scaled
+    return total, run
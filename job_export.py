@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+任务历史流式导出 - NDJSON / CSV / ZIP（含输出图片）
+按主键游标分批读取 local_jobs，响应边生成边发送，内存占用与表大小无关
+"""
+
+import csv
+import io
+import json
+import re
+import zipfile
+from datetime import datetime
+from typing import Callable, Dict, Iterable, Iterator, Optional
+
+from sqlalchemy import select
+
+from job_params import decode_params
+
+# 导出的列，顺序即 CSV 表头顺序
+EXPORT_COLUMNS = [
+    'id', 'remote_job_id', 'type', 'status', 'prompt_id', 'backend',
+    'created_at', 'completed_at', 'params', 'outputs',
+    'submitted_at', 'accepted_at', 'first_progress_at',
+]
+# 导出为ISO格式的时间列
+TIME_COLUMNS = ('created_at', 'completed_at', 'submitted_at', 'accepted_at', 'first_progress_at')
+
+# 攒够该大小再向客户端发送一次，减少小块写出的开销
+CHUNK_SIZE = 64 * 1024
+
+
+def _json_field(value):
+    """params/outputs 以JSON文本存储，导出时还原为对象"""
+    if not value:
+        return None
+    try:
+        return json.loads(value)
+    except ValueError:
+        return value
+
+
+def _filter_conditions(table, filters: Dict[str, object]) -> list:
+    """导出过滤参数 -> WHERE 条件"""
+    conditions = []
+    if filters.get('type'):
+        conditions.append(table.c.type == filters['type'])
+    if filters.get('status'):
+        conditions.append(table.c.status == filters['status'])
+    if filters.get('mode'):
+        conditions.append(table.c.param_mode == filters['mode'])
+    if filters.get('since'):
+        conditions.append(table.c.created_at >= filters['since'])
+    if filters.get('until'):
+        conditions.append(table.c.created_at < filters['until'])
+    if filters.get('max_id') is not None:
+        conditions.append(table.c.id <= filters['max_id'])
+    return conditions
+
+
+def _export_row(row, compact_params: bool) -> dict:
+    """查询行 -> 导出对象：时间转为ISO格式，参数与输出还原为对象"""
+    item = dict(row)
+    for key in TIME_COLUMNS:
+        if isinstance(item.get(key), datetime):
+            item[key] = item[key].isoformat()
+    if compact_params:
+        item['params'] = decode_params(item.pop('params_meta'), item.pop('params_body'), item.get('params'))
+    else:
+        item['params'] = _json_field(item.get('params'))
+    item['outputs'] = _json_field(item.get('outputs'))
+    return item
+
+
+def iter_job_rows(engine, table, filters: Dict[str, object], batch_size: int = 500,
+                  params_table=None) -> Iterator[dict]:
+    """按 id 游标分批读取任务
+
+    每批是一个独立的短查询，不会长时间持有读事务阻塞写入；
+    使用 Core 查询而不是 ORM 对象，避免 identity map 随导出行数增长。
+    给出 params_table 时关联读取紧凑存储的参数（见 job_params）。
+    """
+    columns = [table.c[name] for name in EXPORT_COLUMNS if name in table.c]
+    source = table
+    if params_table is not None:
+        columns += [table.c.params_meta, params_table.c.body.label('params_body')]
+        source = table.outerjoin(params_table, table.c.params_id == params_table.c.id)
+    conditions = _filter_conditions(table, filters)
+
+    last_id = 0
+    while True:
+        stmt = (select(*columns)
+                .select_from(source)
+                .where(table.c.id > last_id, *conditions)
+                .order_by(table.c.id)
+                .limit(batch_size))
+        with engine.connect() as conn:
+            rows = conn.execute(stmt).mappings().all()
+        if not rows:
+            return
+        for row in rows:
+            yield _export_row(row, params_table is not None)
+        last_id = rows[-1]['id']
+
+
+def _batched(pieces: Iterable[bytes]) -> Iterator[bytes]:
+    buffer = bytearray()
+    for piece in pieces:
+        buffer += piece
+        if len(buffer) >= CHUNK_SIZE:
+            yield bytes(buffer)
+            buffer.clear()
+    if buffer:
+        yield bytes(buffer)
+
+
+def ndjson_stream(rows: Iterable[dict]) -> Iterator[bytes]:
+    """每行一个JSON对象"""
+    return _batched(json.dumps(row, ensure_ascii=False).encode('utf-8') + b'\n' for row in rows)
+
+
+def csv_stream(rows: Iterable[dict]) -> Iterator[bytes]:
+    """CSV，params/outputs 列为JSON文本；带BOM便于Excel识别UTF-8"""
+    def lines():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        yield '\ufeff'.encode('utf-8')
+        writer.writerow(EXPORT_COLUMNS)
+        for row in rows:
+            writer.writerow([
+                json.dumps(row[c], ensure_ascii=False) if c in ('params', 'outputs') and row.get(c) is not None
+                else row.get(c, '')
+                for c in EXPORT_COLUMNS
+            ])
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue().encode('utf-8')
+    return _batched(lines())
+
+
+class _ChunkSink:
+    """只写、不可 seek 的输出目标，zipfile 会改用数据描述符流式写入"""
+
+    def __init__(self):
+        self._chunks = []
+        self.pending = 0
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self.pending += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        self.pending = 0
+        return data
+
+
+def _entry_name(job_id, index: int, filename: str, used: set) -> str:
+    """输出图片在归档中的名称：去掉上游文件名中的目录部分与 ..，不会解压到目标目录之外
+
+    不同子目录中的同名输出去掉目录后会重名，重名时加上输出序号。
+    """
+    name = re.split(r'[\\/]', filename)[-1].replace('..', '').strip() or 'output'
+    entry = f"images/{job_id}_{name}"
+    if entry in used:
+        entry = f"images/{job_id}_{index}_{name}"
+    used.add(entry)
+    return entry
+
+
+def zip_stream(rows_factory: Callable[[], Iterable[dict]],
+               open_output: Callable[[dict, dict], Optional[Iterable[bytes]]]) -> Iterator[bytes]:
+    """ZIP：jobs.ndjson 加每个任务的输出图片
+
+    第一遍把任务写入 jobs.ndjson，第二遍逐个写入输出图片，两遍都是游标读取，
+    不需要在内存中保留任务列表。图片已经是压缩格式，按 STORED 写入；
+    open_output 返回图片内容的分块迭代器，取不到时返回 None 跳过。
+    整个归档边生成边发送，不落临时文件。
+    """
+    sink = _ChunkSink()
+    now = datetime.now().timetuple()[:6]
+    with zipfile.ZipFile(sink, 'w', allowZip64=True) as archive:
+        manifest = zipfile.ZipInfo('jobs.ndjson', date_time=now)
+        manifest.compress_type = zipfile.ZIP_DEFLATED
+        with archive.open(manifest, 'w', force_zip64=True) as entry:
+            for row in rows_factory():
+                entry.write(json.dumps(row, ensure_ascii=False).encode('utf-8') + b'\n')
+                if sink.pending >= CHUNK_SIZE:
+                    yield sink.drain()
+
+        for row in rows_factory():
+            used = set()
+            for index, image in enumerate(row.get('outputs') or []):
+                if not isinstance(image, dict) or not image.get('filename'):
+                    continue
+                chunks = open_output(row, image)
+                if chunks is None:
+                    continue
+                info = zipfile.ZipInfo(_entry_name(row['id'], index, str(image['filename']), used), date_time=now)
+                info.compress_type = zipfile.ZIP_STORED
+                with archive.open(info, 'w', force_zip64=True) as entry:
+                    for chunk in chunks:
+                        entry.write(chunk)
+                        if sink.pending >= CHUNK_SIZE:
+                            yield sink.drain()
+    yield sink.drain()
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+异步提交发件箱 - /api/generate 先把请求写入 SQLite 发件箱并立即返回 202，
+后台调度线程再把任务提交到远程服务器（失败按指数退避重试，并发数有上限）
+上游短暂不可用时任务不会丢失，浏览器连接也不必等待上游受理
+"""
+
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import func, select, update
+
+
+class PermanentError(Exception):
+    """上游明确拒绝了任务（如参数错误），重试也不会成功"""
+
+
+class OutboxDispatcher:
+    """发件箱调度器
+
+    每轮用一条 UPDATE ... RETURNING 认领到期的条目并设置租约，多个进程共用同一个数据库时
+    同一条目不会被同时认领；进程在提交途中退出时，租约到期后由其他调度线程重新提交。
+    submit(payload) 提交成功时返回要写回 local_jobs 的字段（remote_job_id/prompt_id/backend），
+    抛出 PermanentError 时任务直接标记失败，其他异常按退避重试，最多 max_attempts 次。
+    """
+
+    def __init__(self, engine, outbox, jobs, submit: Callable[[dict], Dict[str, object]],
+                 workers: int = 4, max_attempts: int = 5, backoff: float = 2.0, max_backoff: float = 60,
+                 lease: float = 180, poll_interval: float = 1.0):
+        self.engine = engine
+        self.outbox = outbox
+        self.jobs = jobs
+        self.submit = submit
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self._inflight = 0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def pending(self) -> int:
+        """等待提交（含重试中）的条目数"""
+        t = self.outbox
+        with self.engine.connect() as conn:
+            return conn.execute(select(func.count()).select_from(t).where(t.c.failed.is_(False))).scalar()
+
+    def notify(self):
+        """有新条目写入，立即唤醒调度线程（首次调用时启动）"""
+        self.start()
+        self._wake.set()
+
+    def _claim(self, limit: int) -> List:
+        t = self.outbox
+        now = time.time()
+        due = (select(t.c.id)
+               .where(t.c.failed.is_(False), t.c.next_attempt_at <= now, t.c.lease_until <= now)
+               .order_by(t.c.id).limit(limit))
+        stmt = (update(t).where(t.c.id.in_(due))
+                .values(lease_until=now + self.lease, attempts=t.c.attempts + 1)
+                .returning(t.c.id, t.c.job_id, t.c.payload, t.c.attempts))
+        with self.engine.begin() as conn:
+            return conn.execute(stmt).all()
+
+    def _next_due(self) -> float:
+        """距最早一条等待重试的条目到期的秒数，没有时返回 poll_interval"""
+        t = self.outbox
+        with self.engine.connect() as conn:
+            due = conn.execute(select(func.min(t.c.next_attempt_at))
+                               .where(t.c.failed.is_(False), t.c.lease_until <= time.time())).scalar()
+        return self.poll_interval if due is None else max(0.0, min(self.poll_interval, due - time.time()))
+
+    def run_once(self, executor=None) -> int:
+        """认领空闲并发数以内的到期条目并提交，返回认领条数
+
+        未给出 executor 时在当前线程依次提交。
+        """
+        with self._lock:
+            free = self.workers - self._inflight
+        if free <= 0:
+            return 0
+        rows = self._claim(free)
+        for row in rows:
+            with self._lock:
+                self._inflight += 1
+            if executor is None:
+                self._dispatch(row)
+            else:
+                executor.submit(self._dispatch, row)
+        return len(rows)
+
+    def _dispatch(self, row):
+        try:
+            fields = self.submit(json.loads(row.payload))
+        except PermanentError as e:
+            self._fail(row, str(e))
+        except Exception as e:
+            if row.attempts >= self.max_attempts:
+                self._fail(row, str(e))
+            else:
+                self._retry(row, str(e))
+        else:
+            self._done(row, fields)
+        finally:
+            with self._lock:
+                self._inflight -= 1
+            self._wake.set()
+
+    def _done(self, row, fields: Dict[str, object]):
+        with self.engine.begin() as conn:
+            conn.execute(update(self.jobs).where(self.jobs.c.id == row.job_id).values(status='queued', **fields))
+            conn.execute(self.outbox.delete().where(self.outbox.c.id == row.id))
+
+    def _retry(self, row, error: str):
+        # 指数退避并加入抖动，避免上游恢复时所有条目同时重试
+        delay = min(self.max_backoff, self.backoff * 2 ** (row.attempts - 1)) * random.uniform(0.5, 1.0)
+        with self.engine.begin() as conn:
+            conn.execute(update(self.outbox).where(self.outbox.c.id == row.id)
+                         .values(next_attempt_at=time.time() + delay, lease_until=0, last_error=error))
+        print(f"🔁 任务 {row.job_id} 第 {row.attempts} 次提交失败，{delay:.1f}s 后重试: {error}")
+
+    def _fail(self, row, error: str):
+        with self.engine.begin() as conn:
+            conn.execute(update(self.jobs).where(self.jobs.c.id == row.job_id)
+                         .values(status='failed', completed_at=datetime.utcnow()))
+            conn.execute(update(self.outbox).where(self.outbox.c.id == row.id)
+                         .values(failed=True, lease_until=0, last_error=error))
+        print(f"❌ 任务 {row.job_id} 提交失败: {error}")
+
+    def start(self):
+        """启动调度线程：有空闲并发时认领条目，交给 workers 个提交线程"""
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='outbox-submit')
+
+            def run():
+                while True:
+                    # 先清除唤醒标记再认领，认领期间写入的条目会触发下一轮
+                    self._wake.clear()
+                    timeout = self.poll_interval
+                    try:
+                        self.run_once(executor)
+                        # 并发已满时等待提交完成的唤醒，否则等到下一条重试到期
+                        if self._inflight < self.workers:
+                            timeout = self._next_due()
+                    except Exception as e:
+                        print(f"⚠️ 发件箱调度失败: {e}")
+                    self._wake.wait(timeout)
+
+            self._thread = threading.Thread(target=run, name='job-outbox', daemon=True)
+            self._thread.start()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+任务参数紧凑存储 - 去重、压缩，热字段单独存放以便建索引
+mode/width/height/steps/seed 存入 local_jobs.params_meta（由生成列建索引），
+其余参数（提示词等）压缩后按内容摘要去重存入 job_params
+"""
+
+import hashlib
+import json
+import time
+import zlib
+from typing import Optional, Tuple
+
+from sqlalchemy import select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+# 单独存放并建索引的参数字段
+HOT_FIELDS = ('mode', 'width', 'height', 'steps', 'seed')
+NUMERIC_FIELDS = ('width', 'height', 'steps', 'seed')
+
+
+def split_params(data: dict) -> Tuple[dict, dict]:
+    """拆分为 (热字段, 其余参数)
+
+    seed 等每次都不同的字段不进入压缩体，相同提示词的任务才能共用同一份参数。
+    """
+    meta, rest = {}, {}
+    for key, value in data.items():
+        if key in HOT_FIELDS and isinstance(value, (str, int, float)) and not isinstance(value, bool):
+            if key in NUMERIC_FIELDS and isinstance(value, str):
+                try:
+                    value = int(value)
+                except ValueError:
+                    rest[key] = value
+                    continue
+            meta[key] = value
+        else:
+            rest[key] = value
+    return meta, rest
+
+
+def encode_body(rest: dict) -> Tuple[str, bytes]:
+    """规范化JSON后计算摘要并压缩，返回 (sha256, zlib数据)"""
+    text = json.dumps(rest, ensure_ascii=False, sort_keys=True, separators=(',', ':')).encode('utf-8')
+    return hashlib.sha256(text).hexdigest(), zlib.compress(text, 6)
+
+
+def decode_params(meta: Optional[str], body: Optional[bytes], legacy: Optional[str] = None) -> Optional[dict]:
+    """还原完整参数；旧记录只有 params 文本列"""
+    if meta is None and body is None:
+        if not legacy:
+            return None
+        try:
+            return json.loads(legacy)
+        except ValueError:
+            return legacy
+    params = json.loads(zlib.decompress(body)) if body else {}
+    if meta:
+        params.update(json.loads(meta))
+    return params
+
+
+def store_params(conn, params_table, data: dict) -> Tuple[int, str]:
+    """写入参数，返回 (job_params.id, params_meta)
+
+    conn 可以是 Connection 或 Session；相同内容只保存一份。
+    """
+    meta, rest = split_params(data if isinstance(data, dict) else {})
+    digest, body = encode_body(rest)
+    conn.execute(sqlite_insert(params_table).values(digest=digest, body=body)
+                 .on_conflict_do_nothing(index_elements=['digest']))
+    params_id = conn.execute(select(params_table.c.id).where(params_table.c.digest == digest)).scalar_one()
+    return params_id, json.dumps(meta, ensure_ascii=False, separators=(',', ':'))
+
+
+def compact_legacy_params(engine, jobs_table, params_table, batch_size: int = 500, pause: float = 0.05) -> int:
+    """把旧记录的 params 文本迁移为紧凑存储，每批一个短事务，返回迁移条数"""
+    migrated = 0
+    last_id = 0
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(
+                select(jobs_table.c.id, jobs_table.c.params)
+                .where(jobs_table.c.id > last_id,
+                       jobs_table.c.params.isnot(None), jobs_table.c.params_id.is_(None))
+                .order_by(jobs_table.c.id)
+                .limit(batch_size)
+            ).all()
+            for job_id, text in rows:
+                try:
+                    data = json.loads(text)
+                except ValueError:
+                    data = None
+                if not isinstance(data, dict):
+                    # 无法解析的旧参数原样保留在 params 列
+                    continue
+                params_id, meta = store_params(conn, params_table, data)
+                conn.execute(update(jobs_table).where(jobs_table.c.id == job_id)
+                             .values(params_id=params_id, params_meta=meta, params=None))
+                migrated += 1
+        if not rows:
+            return migrated
+        last_id = rows[-1][0]
+        time.sleep(pause)
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+任务数据保留策略 - 过期任务归档、分批删除与增量回收空间
+在后台线程中运行，每批只持有很短的写锁，不会阻塞 generate() 写入
+"""
+
+import gzip
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, List, Optional, Tuple
+
+from sqlalchemy import delete, event, exists, select
+
+from job_params import decode_params
+
+# SQLite auto_vacuum 取值
+AUTO_VACUUM_INCREMENTAL = 2
+
+
+def configure_sqlite(engine, incremental: bool = True, wal: bool = False):
+    """SQLite连接参数
+
+    incremental: auto_vacuum=INCREMENTAL，只对新建的数据库文件生效，使删除后的空间可以增量回收；
+    wal: WAL 让读写互不阻塞，但会在数据库旁生成 -wal/-shm 文件，所在目录需要可写。
+    busy_timeout 让短暂的写锁等待而不是直接报错。
+    """
+    if engine.dialect.name != 'sqlite' or engine.url.database in (None, '', ':memory:'):
+        return
+
+    @event.listens_for(engine, 'connect')
+    def _on_connect(dbapi_conn, record):
+        cursor = dbapi_conn.cursor()
+        if incremental:
+            cursor.execute('PRAGMA auto_vacuum=INCREMENTAL')
+        if wal:
+            cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA busy_timeout=5000')
+        cursor.close()
+
+
+def _jsonable(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+class RetentionWorker:
+    """过期任务归档器
+
+    每轮把 created_at 早于 days 天前的任务按批写入 gzip 压缩的 NDJSON 归档
+    （按月份分文件，追加写入），然后删除这批记录，最后用 incremental_vacuum 分步回收空闲页。
+    归档先于删除落盘，中途退出最多导致下次重复归档，不会丢数据。
+    给出 params_table 时归档中写入还原后的完整参数，归档文件可独立使用，
+    并在同一事务中删除这批任务引用、已不再被任何任务引用的参数。
+    给出 cache（见 shared_cache）时多个 worker 进程中每个周期只有一个执行归档。
+    给出 on_deleted 时每批删除提交后以这批任务调用，用于清理任务的本地文件。
+    """
+
+    def __init__(self, engine, table, days: float, archive_dir: str, batch_size: int = 200,
+                 vacuum_pages: int = 256, pause: float = 0.05, convert_max_mb: float = 64,
+                 params_table=None, cache=None, on_deleted: Optional[Callable[[List[dict]], None]] = None):
+        self.engine = engine
+        self.table = table
+        self.days = days
+        self.archive_dir = Path(archive_dir)
+        self.batch_size = batch_size
+        self.vacuum_pages = vacuum_pages
+        self.pause = pause
+        self.convert_max_mb = convert_max_mb
+        self.params_table = params_table
+        self.cache = cache
+        self.on_deleted = on_deleted
+        self._thread: Optional[threading.Thread] = None
+
+    def run_once(self) -> Tuple[int, int]:
+        """执行一轮归档与回收，返回 (归档行数, 回收页数)"""
+        cutoff = datetime.utcnow() - timedelta(days=self.days)
+        table = self.table
+        stmt = select(table)
+        if self.params_table is not None:
+            stmt = (select(table, self.params_table.c.body.label('params_body'))
+                    .select_from(table.outerjoin(self.params_table, table.c.params_id == self.params_table.c.id)))
+        stmt = stmt.where(table.c.created_at < cutoff).order_by(table.c.id).limit(self.batch_size)
+        archived = 0
+        while True:
+            # 读取不持有写锁
+            with self.engine.connect() as conn:
+                rows = conn.execute(stmt).mappings().all()
+            if not rows:
+                break
+            self._archive(rows)
+            # 每批一个短事务
+            with self.engine.begin() as conn:
+                conn.execute(delete(table).where(table.c.id.in_([row['id'] for row in rows])))
+                self._delete_orphan_params(conn, {row['params_id'] for row in rows if row.get('params_id')})
+            if self.on_deleted is not None:
+                self.on_deleted(rows)
+            archived += len(rows)
+            time.sleep(self.pause)
+
+        reclaimed = self.incremental_vacuum() if archived else 0
+        return archived, reclaimed
+
+    def _delete_orphan_params(self, conn, params_ids):
+        """删除已没有任务引用的参数（只检查本批任务引用过的参数）"""
+        if self.params_table is None or not params_ids:
+            return
+        params = self.params_table
+        conn.execute(delete(params).where(
+            params.c.id.in_(params_ids),
+            ~exists().where(self.table.c.params_id == params.c.id),
+        ))
+
+    def _archive(self, rows: List[dict]):
+        self.archive_dir.mkdir(parents=True, exist_ok=True)
+        groups = {}
+        for row in rows:
+            row = dict(row)
+            if self.params_table is not None:
+                row['params'] = decode_params(row.get('params_meta'), row.pop('params_body'), row.get('params'))
+            created = row.get('created_at')
+            month = created.strftime('%Y%m') if isinstance(created, datetime) else 'unknown'
+            groups.setdefault(month, []).append(row)
+        for month, items in groups.items():
+            path = self.archive_dir / f"{self.table.name}-{month}.ndjson.gz"
+            # 追加模式生成多成员 gzip，标准工具可直接连续解压
+            with gzip.open(path, 'ab') as f:
+                for row in items:
+                    line = json.dumps({k: _jsonable(v) for k, v in row.items()}, ensure_ascii=False)
+                    f.write(line.encode('utf-8') + b'\n')
+            with open(path, 'rb+') as f:
+                os.fsync(f.fileno())
+
+    def _auto_vacuum_mode(self) -> int:
+        with self.engine.connect() as conn:
+            return conn.exec_driver_sql('PRAGMA auto_vacuum').scalar() or 0
+
+    def ensure_incremental(self) -> bool:
+        """确保数据库支持增量回收
+
+        旧数据库需要一次 VACUUM 才能切换 auto_vacuum 模式，这会锁库，
+        因此只对不超过 convert_max_mb 的文件自动执行。
+        """
+        if self.engine.dialect.name != 'sqlite':
+            return False
+        if self._auto_vacuum_mode() == AUTO_VACUUM_INCREMENTAL:
+            return True
+        path = self.engine.url.database
+        size_mb = os.path.getsize(path) / (1024 * 1024) if path and os.path.exists(path) else 0
+        if size_mb > self.convert_max_mb:
+            print(f"⚠️ 数据库 {size_mb:.0f}MB 未启用增量回收，请在维护窗口执行: "
+                  f"PRAGMA auto_vacuum=INCREMENTAL; VACUUM;")
+            return False
+        with self.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+            conn.exec_driver_sql('PRAGMA auto_vacuum=INCREMENTAL')
+            conn.exec_driver_sql('VACUUM')
+        return self._auto_vacuum_mode() == AUTO_VACUUM_INCREMENTAL
+
+    def incremental_vacuum(self) -> int:
+        """分步回收空闲页，每步只回收 vacuum_pages 页"""
+        if self._auto_vacuum_mode() != AUTO_VACUUM_INCREMENTAL:
+            return 0
+        reclaimed = 0
+        while True:
+            with self.engine.connect() as conn:
+                free = conn.exec_driver_sql('PRAGMA freelist_count').scalar() or 0
+            if free == 0:
+                return reclaimed
+            step = min(free, self.vacuum_pages)
+            # 通过 execute() 每次只会回收一页，executescript 才会执行完整个步骤
+            with self.engine.connect() as conn:
+                conn.connection.driver_connection.executescript(f'PRAGMA incremental_vacuum({step})')
+            reclaimed += step
+            time.sleep(self.pause)
+
+    def claim(self, interval: float) -> bool:
+        """取得本周期的归档权，其他进程在 interval 秒内不会重复归档同一批任务"""
+        if self.cache is None:
+            return True
+        return self.cache.add(f"retention-run:{self.table.name}", os.getpid(), ttl=interval)
+
+    def start(self, interval: float = 3600):
+        """启动后台线程，每 interval 秒执行一轮"""
+        if self._thread is not None:
+            return
+
+        def run():
+            try:
+                self.ensure_incremental()
+            except Exception as e:
+                print(f"⚠️ 启用增量回收失败: {e}")
+            while True:
+                try:
+                    if self.claim(interval):
+                        archived, reclaimed = self.run_once()
+                        if archived:
+                            print(f"🗄️ 已归档 {archived} 条过期任务，回收 {reclaimed} 页")
+                except Exception as e:
+                    print(f"⚠️ 任务归档失败: {e}")
+                time.sleep(interval)
+
+        self._thread = threading.Thread(target=run, name='job-retention', daemon=True)
+        self._thread.start()
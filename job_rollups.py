@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+任务统计汇总 - 由 SQLite 触发器增量维护的小时/天汇总表
+/api/stats 只读取汇总表，耗时与 local_jobs 行数无关
+"""
+
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy import text
+
+# 汇总粒度 -> strftime 格式
+PERIODS = {
+    'hour': '%Y-%m-%dT%H:00',
+    'day': '%Y-%m-%d',
+}
+
+# 排队到完成耗时直方图的桶上界（毫秒），超出最大值的计入 OVERFLOW_MS
+LATENCY_BOUNDS_MS = [
+    500, 1000, 2000, 5000, 10000, 15000, 20000, 30000, 45000, 60000,
+    90000, 120000, 180000, 300000, 600000, 1200000, 1800000, 3600000,
+]
+OVERFLOW_MS = -1
+
+
+def _bucket(period: str, column: str) -> str:
+    return f"strftime('{PERIODS[period]}', COALESCE({column}, CURRENT_TIMESTAMP))"
+
+
+def _count_upsert(row: str, delta: int) -> str:
+    return ''.join(
+        f"""
+        INSERT INTO job_rollups (period, bucket, type, status, count)
+        VALUES ('{period}', {_bucket(period, f'{row}.created_at')},
+                COALESCE({row}.type, ''), COALESCE({row}.status, ''), {delta})
+        ON CONFLICT (period, bucket, type, status) DO UPDATE SET count = count + ({delta});"""
+        for period in PERIODS
+    )
+
+
+def _latency_upsert() -> str:
+    latency = "MAX(0, CAST((julianday(NEW.completed_at) - julianday(NEW.created_at)) * 86400000 AS INTEGER))"
+    bound = ' '.join(f"WHEN {latency} <= {b} THEN {b}" for b in LATENCY_BOUNDS_MS)
+    return ''.join(
+        f"""
+        INSERT INTO job_latency_rollups (period, bucket, type, le_ms, count)
+        VALUES ('{period}', {_bucket(period, 'NEW.created_at')}, COALESCE(NEW.type, ''),
+                CASE {bound} ELSE {OVERFLOW_MS} END, 1)
+        ON CONFLICT (period, bucket, type, le_ms) DO UPDATE SET count = count + 1;"""
+        for period in PERIODS
+    )
+
+
+# 删除（如过期归档）不回退统计：汇总表记录的是历史用量
+TRIGGERS = {
+    'trg_job_rollups_insert': f"""
+        CREATE TRIGGER IF NOT EXISTS trg_job_rollups_insert AFTER INSERT ON local_jobs
+        BEGIN {_count_upsert('NEW', 1)}
+        END""",
+    'trg_job_rollups_update': f"""
+        CREATE TRIGGER IF NOT EXISTS trg_job_rollups_update AFTER UPDATE OF status, type ON local_jobs
+        WHEN OLD.status IS NOT NEW.status OR OLD.type IS NOT NEW.type
+        BEGIN {_count_upsert('OLD', -1)} {_count_upsert('NEW', 1)}
+        END""",
+    'trg_job_latency_insert': f"""
+        CREATE TRIGGER IF NOT EXISTS trg_job_latency_insert AFTER INSERT ON local_jobs
+        WHEN NEW.completed_at IS NOT NULL
+        BEGIN {_latency_upsert()}
+        END""",
+    'trg_job_latency_complete': f"""
+        CREATE TRIGGER IF NOT EXISTS trg_job_latency_complete AFTER UPDATE OF completed_at ON local_jobs
+        WHEN OLD.completed_at IS NULL AND NEW.completed_at IS NOT NULL
+        BEGIN {_latency_upsert()}
+        END""",
+}
+
+
+def _backfill_sql() -> List[str]:
+    statements = []
+    latency = "MAX(0, CAST((julianday(completed_at) - julianday(created_at)) * 86400000 AS INTEGER))"
+    bound = ' '.join(f"WHEN {latency} <= {b} THEN {b}" for b in LATENCY_BOUNDS_MS)
+    for period in PERIODS:
+        statements.append(f"""
+            INSERT INTO job_rollups (period, bucket, type, status, count)
+            SELECT '{period}', {_bucket(period, 'created_at')}, COALESCE(type, ''), COALESCE(status, ''), COUNT(*)
+            FROM local_jobs GROUP BY 2, 3, 4""")
+        statements.append(f"""
+            INSERT INTO job_latency_rollups (period, bucket, type, le_ms, count)
+            SELECT '{period}', {_bucket(period, 'created_at')}, COALESCE(type, ''),
+                   CASE {bound} ELSE {OVERFLOW_MS} END, COUNT(*)
+            FROM local_jobs WHERE completed_at IS NOT NULL GROUP BY 2, 3, 4""")
+    return statements
+
+
+def install_rollups(engine):
+    """创建触发器（幂等）；首次创建时由现有任务回填汇总表
+
+    先执行一条空更新拿到写锁，多个进程同时启动时只有一个会回填。
+    """
+    if engine.dialect.name != 'sqlite':
+        return
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE job_rollups SET count = count WHERE 0"))
+        existing = {row[0] for row in conn.execute(
+            text("SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'trg_job_%'"))}
+        missing = [name for name in TRIGGERS if name not in existing]
+        if not missing:
+            return
+        if not existing:
+            conn.execute(text("DELETE FROM job_rollups"))
+            conn.execute(text("DELETE FROM job_latency_rollups"))
+            for statement in _backfill_sql():
+                conn.execute(text(statement))
+        for name in missing:
+            conn.execute(text(TRIGGERS[name]))
+
+
+def latency_percentiles(histogram: Dict[int, int], percentiles=(50, 90, 99)) -> Dict[str, Optional[float]]:
+    """由直方图估算分位数（桶内线性插值，超出最大桶时取最大上界）"""
+    total = sum(histogram.values())
+    result = {'count': total}
+    bounds = sorted(b for b in histogram if b != OVERFLOW_MS)
+    if histogram.get(OVERFLOW_MS):
+        bounds.append(OVERFLOW_MS)
+    for p in percentiles:
+        key = f'p{p}_ms'
+        if not total:
+            result[key] = None
+            continue
+        rank = total * p / 100
+        seen = 0
+        for le in bounds:
+            count = histogram[le]
+            if seen + count >= rank:
+                if le == OVERFLOW_MS:
+                    result[key] = float(LATENCY_BOUNDS_MS[-1])
+                else:
+                    index = LATENCY_BOUNDS_MS.index(le)
+                    lower = LATENCY_BOUNDS_MS[index - 1] if index else 0
+                    result[key] = round(lower + (le - lower) * (rank - seen) / count, 1)
+                break
+            seen += count
+    return result
+
+
+def read_stats(engine, period: str, since: datetime, until: datetime, job_type: Optional[str] = None) -> dict:
+    """读取 since 到 until 所在桶（含）之间的汇总"""
+    fmt = PERIODS[period]
+    params = {'period': period, 'since': since.strftime(fmt), 'until': until.strftime(fmt), 'type': job_type}
+    where = "period = :period AND bucket >= :since AND bucket <= :until AND (:type IS NULL OR type = :type)"
+    with engine.connect() as conn:
+        counts = conn.execute(text(
+            f"SELECT bucket, type, status, count FROM job_rollups WHERE {where} AND count != 0 "
+            f"ORDER BY bucket, type, status"), params).mappings().all()
+        latency = conn.execute(text(
+            f"SELECT type, le_ms, SUM(count) FROM job_latency_rollups WHERE {where} GROUP BY type, le_ms"),
+            params).all()
+
+    totals: Dict[str, Dict[str, int]] = {}
+    for row in counts:
+        by_status = totals.setdefault(row['type'], {})
+        by_status[row['status']] = by_status.get(row['status'], 0) + row['count']
+    histograms: Dict[str, Dict[int, int]] = {}
+    for job_type_, le, count in latency:
+        histograms.setdefault(job_type_, {})[le] = count
+
+    return {
+        'period': period,
+        'since': since.isoformat(),
+        'until': until.isoformat(),
+        'buckets': [dict(row) for row in counts],
+        'totals': totals,
+        'latency': {t: latency_percentiles(h) for t, h in histograms.items()},
+    }
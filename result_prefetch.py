@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+结果预取 - 任务完成后在后台把输出图片下载到本地 downloads 目录
+首次查看时直接从本地磁盘返回，不再经过远程服务器
+"""
+
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+
+from werkzeug.security import safe_join
+
+from upstream_pool import backend_tag
+
+# (type, subfolder, filename)
+FileKey = Tuple[str, str, str]
+
+
+def file_key(image: dict) -> Optional[FileKey]:
+    """从结果中的图片描述提取文件标识"""
+    filename = image.get('filename') if isinstance(image, dict) else None
+    if not filename:
+        return None
+    return (image.get('type') or 'output', image.get('subfolder') or '', filename)
+
+
+def file_pin(tag: str, key: FileKey) -> str:
+    """输出文件的归属键，同名文件在不同后端上是不同的文件"""
+    return f"file:{tag}:{'/'.join(key)}"
+
+
+class ResultPrefetcher:
+    """后台预取器
+
+    使用有界线程池下载，同一文件同时只下载一次；
+    文件先写入临时文件再原子替换，读取方不会看到半个文件。
+    各后端的文件存放在以 backend_tag 命名的子目录中。
+    """
+
+    def __init__(self, client, download_dir: str, max_workers: int = 4, timeout: float = 60):
+        self.client = client
+        self.download_dir = Path(download_dir).resolve()
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='result-prefetch')
+        self._inflight: Dict[Tuple[str, FileKey], Future] = {}
+        self._lock = threading.Lock()
+
+    def local_path(self, backend: str, key: FileKey) -> Optional[Path]:
+        """文件在本地存储中的位置，路径不安全时返回 None"""
+        file_type, subfolder, filename = key
+        parts = [p for p in (backend_tag(backend), file_type, subfolder, filename) if p]
+        path = safe_join(str(self.download_dir), *parts)
+        return Path(path) if path else None
+
+    def submit(self, backend: str, images: Iterable[dict]):
+        """提交一个已完成任务的输出图片"""
+        for image in images:
+            key = file_key(image)
+            path = self.local_path(backend, key) if key else None
+            if path is None or path.exists():
+                continue
+            with self._lock:
+                if (backend, key) in self._inflight:
+                    continue
+                future = self._executor.submit(self._download, backend, key, path)
+                self._inflight[(backend, key)] = future
+            future.add_done_callback(lambda _, k=(backend, key): self._done(k))
+
+    def lookup(self, backend: str, key: FileKey, wait: float = 0) -> Optional[Path]:
+        """返回 backend 上的文件在本地的副本；正在下载时最多等待 wait 秒"""
+        path = self.local_path(backend, key)
+        if path is None:
+            return None
+        if not path.exists() and wait > 0:
+            with self._lock:
+                future = self._inflight.get((backend, key))
+            if future is not None:
+                try:
+                    future.result(timeout=wait)
+                except Exception:
+                    return None
+        return path if path.exists() else None
+
+    def remove(self, backend: str, images: Iterable[dict]) -> int:
+        """删除任务输出在本地的副本，返回删除的文件数"""
+        removed = 0
+        for image in images:
+            key = file_key(image)
+            path = self.local_path(backend, key) if key and backend else None
+            if path is not None and path.is_file():
+                path.unlink()
+                removed += 1
+        return removed
+
+    def _done(self, inflight_key: Tuple[str, FileKey]):
+        with self._lock:
+            future = self._inflight.pop(inflight_key, None)
+        if future is not None and future.exception() is not None:
+            print(f"⚠️ 预取结果失败 {inflight_key[1][2]}: {future.exception()}")
+
+    def _download(self, backend: str, key: FileKey, path: Path):
+        file_type, subfolder, filename = key
+        params = {'filename': filename, 'type': file_type, 'subfolder': subfolder}
+        response = self.client.session.get(f"{backend}/api/proxy/view", params=params, timeout=self.timeout, stream=True)
+        try:
+            if response.status_code != 200:
+                return
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_name(f".{path.name}.{threading.get_ident()}.part")
+            try:
+                with open(tmp, 'wb') as f:
+                    for chunk in response.iter_content(chunk_size=256 * 1024):
+                        f.write(chunk)
+                os.replace(tmp, path)
+            finally:
+                if tmp.exists():
+                    tmp.unlink()
+        finally:
+            response.close()
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+请求耗时分解 - Server-Timing 响应头与慢请求采样剖析
+记录上游连接、首字节、传输、JSON编码、数据库提交等阶段耗时
+"""
+
+import os
+import sys
+import time
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional
+
+from flask import g, has_app_context, request
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+# 阶段名称 -> Server-Timing 描述（响应头只允许ASCII）
+PHASES = {
+    'connect': 'upstream connect',
+    'ttfb': 'upstream ttfb',
+    'transfer': 'upstream body',
+    'preprocess': 'image preprocess',
+    'upload': 'inline uploads',
+    'json': 'json decode/parse',
+    'db': 'localjob commit',
+    'total': 'total',
+}
+
+
+def record(name: str, duration_ms: float):
+    """累加当前请求某阶段的耗时（毫秒），不在请求上下文中时忽略"""
+    if not has_app_context():
+        return
+    timings = g.setdefault('_server_timing', {})
+    timings[name] = timings.get(name, 0.0) + duration_ms
+
+
+def get(name: str) -> float:
+    """读取当前请求某阶段已累计的耗时"""
+    if not has_app_context():
+        return 0.0
+    return g.get('_server_timing', {}).get(name, 0.0)
+
+
+@contextmanager
+def phase(name: str):
+    """计时上下文管理器"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, (time.perf_counter() - start) * 1000)
+
+
+def format_header(timings: Dict[str, float]) -> str:
+    """生成 Server-Timing 头"""
+    parts = []
+    for name, duration in timings.items():
+        desc = PHASES.get(name)
+        item = f"{name};dur={duration:.1f}"
+        if desc:
+            item += f';desc="{desc}"'
+        parts.append(item)
+    return ', '.join(parts)
+
+
+class _TimedConnectMixin:
+    """记录TCP/TLS建连耗时，复用的keep-alive连接不会触发"""
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            return super().connect()
+        finally:
+            record('connect', (time.perf_counter() - start) * 1000)
+
+
+class _TimedHTTPConnection(_TimedConnectMixin, HTTPConnection):
+    pass
+
+
+class _TimedHTTPSConnection(_TimedConnectMixin, HTTPSConnection):
+    pass
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class TimedHTTPAdapter(HTTPAdapter):
+    """挂载到 requests.Session 上，记录上游建连耗时"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _TimedHTTPConnectionPool,
+            'https': _TimedHTTPSConnectionPool,
+        }
+
+
+class SlowRequestProfiler:
+    """慢请求采样剖析器
+
+    后台线程按固定间隔采样正在处理的请求线程调用栈，
+    请求耗时超过阈值时以 folded stack 格式写入本地目录（可直接用于火焰图），
+    目录中只保留最近 keep 个文件。
+    """
+
+    def __init__(self, threshold_ms: float, out_dir: str, keep: int = 50, interval_ms: float = 5):
+        self.threshold_ms = threshold_ms
+        self.out_dir = Path(out_dir)
+        self.keep = keep
+        self.interval = interval_ms / 1000
+        self._active: Dict[int, Counter] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def begin(self):
+        """开始采样当前线程"""
+        with self._lock:
+            self._active[threading.get_ident()] = Counter()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='slow-request-profiler', daemon=True)
+                self._thread.start()
+
+    def end(self, elapsed_ms: float, label: str) -> Optional[Path]:
+        """结束采样，超过阈值时写出剖析文件"""
+        with self._lock:
+            samples = self._active.pop(threading.get_ident(), None)
+        if not samples or elapsed_ms < self.threshold_ms:
+            return None
+        return self._write(samples, elapsed_ms, label)
+
+    def _run(self):
+        me = threading.get_ident()
+        while True:
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with self._lock:
+                for ident, samples in self._active.items():
+                    frame = frames.get(ident)
+                    if frame is not None and ident != me:
+                        samples[self._collapse(frame)] += 1
+
+    @staticmethod
+    def _collapse(frame) -> str:
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(f"{Path(code.co_filename).name}:{code.co_name}:{frame.f_lineno}")
+            frame = frame.f_back
+        return ';'.join(reversed(stack))
+
+    def _write(self, samples: Counter, elapsed_ms: float, label: str) -> Optional[Path]:
+        try:
+            self.out_dir.mkdir(parents=True, exist_ok=True)
+            safe_label = ''.join(c if c.isalnum() else '_' for c in label).strip('_')[:80]
+            name = f"{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}_{safe_label}_{int(elapsed_ms)}ms.folded"
+            path = self.out_dir / name
+            with open(path, 'w', encoding='utf-8') as f:
+                for stack, count in samples.most_common():
+                    f.write(f"{stack} {count}\n")
+            self._rotate()
+            return path
+        except OSError as e:
+            print(f"⚠️ 写入慢请求剖析失败: {e}")
+            return None
+
+    def _rotate(self):
+        files = sorted(self.out_dir.glob('*.folded'), key=lambda p: p.stat().st_mtime)
+        for old in files[:-self.keep] if self.keep > 0 else files:
+            old.unlink(missing_ok=True)
+
+
+def init_app(app):
+    """注册请求钩子：为每个响应添加 Server-Timing 头，并按需开启慢请求剖析
+
+    环境变量:
+        SLOW_REQUEST_PROFILE_MS        慢请求阈值（毫秒），未设置或为0时不开启剖析
+        SLOW_REQUEST_PROFILE_DIR       剖析文件目录，默认 ./profiles
+        SLOW_REQUEST_PROFILE_KEEP      保留的剖析文件数量，默认 50
+        SLOW_REQUEST_PROFILE_INTERVAL  采样间隔（毫秒），默认 5
+    """
+    threshold = float(os.getenv('SLOW_REQUEST_PROFILE_MS', '0') or 0)
+    profiler = None
+    if threshold > 0:
+        profiler = SlowRequestProfiler(
+            threshold,
+            os.getenv('SLOW_REQUEST_PROFILE_DIR', './profiles'),
+            keep=int(os.getenv('SLOW_REQUEST_PROFILE_KEEP', '50')),
+            interval_ms=float(os.getenv('SLOW_REQUEST_PROFILE_INTERVAL', '5')),
+        )
+    app.extensions['slow_request_profiler'] = profiler
+
+    @app.before_request
+    def _start_timing():
+        g._server_timing_start = time.perf_counter()
+        if profiler:
+            profiler.begin()
+
+    @app.after_request
+    def _add_server_timing(response):
+        start = g.get('_server_timing_start')
+        if start is None:
+            return response
+        elapsed = (time.perf_counter() - start) * 1000
+        timings = dict(g.get('_server_timing', {}))
+        timings['total'] = elapsed
+        response.headers['Server-Timing'] = format_header(timings)
+        if profiler:
+            profiler.end(elapsed, f"{request.method}_{request.path}")
+        return response
+
+    @app.teardown_request
+    def _stop_profiling(exc):
+        # 异常未经过 after_request 时也要移除采样登记
+        if profiler and exc is not None:
+            profiler.end(0, '')
+
+    return profiler
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+多进程共享缓存 - 基于 SQLite 的键值存储，支持过期时间与条目数上限
+多个 worker 进程共用同一个缓存文件，后端健康状态、任务归属、已完成结果、上传文件摘要
+只需由一个进程向远程服务器获取一次；未配置缓存文件时退化为进程内缓存
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+
+class LocalCache:
+    """进程内缓存，接口与 SharedCache 相同"""
+
+    def __init__(self, max_entries: int = 10000, default_ttl: float = 300):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._data: 'OrderedDict[str, tuple]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.get(key)
+        if item is None or item[1] < time.time():
+            return default
+        return item[0]
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        with self._lock:
+            self._put(key, value, ttl)
+
+    def add(self, key: str, value: Any, ttl: Optional[float] = None) -> bool:
+        """key 不存在或已过期时写入并返回 True"""
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and item[1] >= time.time():
+                return False
+            self._put(key, value, ttl)
+            return True
+
+    def _put(self, key: str, value: Any, ttl: Optional[float]):
+        self._data[key] = (value, time.time() + (ttl if ttl is not None else self.default_ttl))
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def delete(self, key: str) -> bool:
+        with self._lock:
+            item = self._data.pop(key, None)
+        return item is not None and item[1] >= time.time()
+
+    def count(self, prefix: str) -> int:
+        """以 prefix 开头的未过期条目数"""
+        now = time.time()
+        with self._lock:
+            return sum(1 for key, item in self._data.items() if key.startswith(prefix) and item[1] >= now)
+
+
+class SharedCache:
+    """SQLite 键值缓存
+
+    值以 JSON 保存；每个线程使用自己的连接（fork 后自动重建），
+    WAL 模式下读取不被写入阻塞，主键点查在微秒级。
+    过期条目在读取时忽略，每 evict_every 次写入清理一次过期条目并把条目数压回 max_entries。
+    """
+
+    def __init__(self, path: str, max_entries: int = 10000, default_ttl: float = 300,
+                 max_value_bytes: int = 1024 * 1024, evict_every: int = 100):
+        self.path = path
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self.max_value_bytes = max_value_bytes
+        self.evict_every = evict_every
+        self._local = threading.local()
+        self._writes = 0
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn().execute(
+            'CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL)'
+            ' WITHOUT ROWID')
+        self._conn().execute('CREATE INDEX IF NOT EXISTS kv_expires ON kv (expires)')
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            # 缓存内容可以丢失，不需要每次提交都落盘
+            conn.execute('PRAGMA synchronous=OFF')
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def get(self, key: str, default: Any = None) -> Any:
+        row = self._conn().execute('SELECT value, expires FROM kv WHERE key = ?', (key,)).fetchone()
+        if row is None or row[1] < time.time():
+            return default
+        return json.loads(row[0])
+
+    def _encode(self, value: Any) -> Optional[str]:
+        text = json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+        return text if len(text) <= self.max_value_bytes else None
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        text = self._encode(value)
+        if text is None:
+            return
+        expires = time.time() + (ttl if ttl is not None else self.default_ttl)
+        self._conn().execute('INSERT OR REPLACE INTO kv (key, value, expires) VALUES (?, ?, ?)', (key, text, expires))
+        self._wrote()
+
+    def add(self, key: str, value: Any, ttl: Optional[float] = None) -> bool:
+        """key 不存在或已过期时写入并返回 True，可用作跨进程的“只做一次”标记"""
+        text = self._encode(value)
+        if text is None:
+            return False
+        now = time.time()
+        expires = now + (ttl if ttl is not None else self.default_ttl)
+        cursor = self._conn().execute(
+            'INSERT INTO kv (key, value, expires) VALUES (?, ?, ?) '
+            'ON CONFLICT (key) DO UPDATE SET value = excluded.value, expires = excluded.expires '
+            'WHERE kv.expires < ?', (key, text, expires, now))
+        self._wrote()
+        return cursor.rowcount > 0
+
+    def delete(self, key: str) -> bool:
+        """删除 key，返回删除前是否存在未过期的值"""
+        cursor = self._conn().execute('DELETE FROM kv WHERE key = ? RETURNING expires', (key,))
+        row = cursor.fetchone()
+        return row is not None and row[0] >= time.time()
+
+    def count(self, prefix: str) -> int:
+        """以 prefix 开头的未过期条目数（主键范围扫描）"""
+        row = self._conn().execute(
+            'SELECT COUNT(*) FROM kv WHERE key >= ? AND key < ? AND expires >= ?',
+            (prefix, prefix + '\U0010ffff', time.time())).fetchone()
+        return row[0]
+
+    def _wrote(self):
+        self._writes += 1
+        if self._writes % self.evict_every:
+            return
+        conn = self._conn()
+        conn.execute('DELETE FROM kv WHERE expires < ?', (time.time(),))
+        excess = conn.execute('SELECT COUNT(*) FROM kv').fetchone()[0] - self.max_entries
+        if excess > 0:
+            conn.execute('DELETE FROM kv WHERE key IN (SELECT key FROM kv ORDER BY expires LIMIT ?)', (excess,))
+
+
+def open_cache(path: Optional[str], max_entries: int = 10000):
+    """配置了缓存文件时使用共享缓存，否则使用进程内缓存"""
+    if path:
+        return SharedCache(path, max_entries=max_entries)
+    return LocalCache(max_entries=max_entries)
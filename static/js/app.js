@@ -117,15 +117,6 @@ $('#preset').addEventListener('change', e=>{
   if(v==='fine'){ $('#steps').value=20; $('#cfg').value=5.5; }
 });
 
-async function uploadFile(input){
-  if(!input.files||!input.files[0]) return null;
-  const form = new FormData();
-  form.append('file', input.files[0]);
-  const data = await fetchJSON('/api/upload', {method:'POST', body: form});
-  if(data.status!=='success') throw new Error(data.message||'上传失败');
-  return data;
-}
-
 // 进度条控制
 function showProgress(show){
   $('#progress').hidden = !show;
@@ -164,10 +155,15 @@ function finishProgress(){
   }, 1500);
 }
 
-async function pollResult(pid){
+// 同步提交返回 prompt_id；异步提交（202）返回 local_id，提交到后端前由本地应答
+function resultQuery(data){
+  return data.prompt_id ? `prompt_id=${encodeURIComponent(data.prompt_id)}` : `local_id=${data.local_id}`;
+}
+
+async function pollResult(query){
   for(let i=0;i<60;i++){
     try{
-      const d = await fetchJSON(`/api/result?prompt_id=${encodeURIComponent(pid)}`, {headers:{'Accept':'application/json'}});
+      const d = await fetchJSON(`/api/result?${query}`, {headers:{'Accept':'application/json'}});
       if(d.status==='success' && d.images && d.images.length){
         return d.images[0].url;
       }
@@ -187,6 +183,8 @@ $('#generate').addEventListener('click', async ()=>{
     initProgress();
     
     let payload = { mode, client_id: clientId };
+    // 随生成请求一起上传的文件，服务端并行上传到后端后再提交任务
+    const files = {};
     
     if(mode==='txt2img'){
       payload.prompt = $('#prompt').value || '写实风，亚洲女生，自然光，清晰面部细节';
@@ -199,39 +197,39 @@ $('#generate').addEventListener('click', async ()=>{
       if(seed) payload.seed = +seed;
       
       if(currentGenType==='init'){
-        const up = await uploadFile($('#file'));
-        if(!up) throw new Error('请上传垫图');
-        payload.image = up.path;
+        const file = $('#file').files[0];
+        if(!file) throw new Error('请上传垫图');
+        files.image = [file, file.name];
       }
     } else if(mode==='face_swap'){
-      const up = await uploadFile($('#file'));
-      if(!up) throw new Error('请上传需要换脸的图片');
-      payload.image = up.path;
+      const file = $('#file').files[0];
+      if(!file) throw new Error('请上传需要换脸的图片');
+      files.image = [file, file.name];
       payload.prompt = $('#prompt').value || '';
     } else if(mode==='inpaint'){
-      const up = await uploadFile($('#file'));
-      if(!up) throw new Error('请上传需要修复的图片');
-      payload.image = up.path;
+      const file = $('#file').files[0];
+      if(!file) throw new Error('请上传需要修复的图片');
+      files.image = [file, file.name];
       
-      // 若用户圈选了区域，导出 mask 并上传
+      // 若用户圈选了区域，导出 mask 一并上传
       const maskBlob = await exportMaskIfAny();
-      if(maskBlob){
-        const form = new FormData();
-        form.append('file', maskBlob, 'mask.png');
-        const mu = await fetchJSON('/api/upload', {method:'POST', body: form});
-        payload.mask = mu.path;
-      }
+      if(maskBlob) files.mask = [maskBlob, 'mask.png'];
       payload.prompt = $('#prompt').value || '';
     }
     
-    const data = await fetchJSON('/api/generate', {
-      method:'POST',
-      headers:{'Content-Type':'application/json','Accept':'application/json','X-Client-Id': clientId},
-      body: JSON.stringify(payload)
-    });
+    const headers = {'Accept':'application/json','X-Client-Id': clientId};
+    let body;
+    if(Object.keys(files).length){
+      body = new FormData();
+      body.append('payload', JSON.stringify(payload));
+      for(const [field, [blob, name]] of Object.entries(files)) body.append(field, blob, name);
+    }else{
+      headers['Content-Type'] = 'application/json';
+      body = JSON.stringify(payload);
+    }
+    const data = await fetchJSON('/api/generate', {method:'POST', headers, body});
     
-    const pid = data.prompt_id;
-    const url = await pollResult(pid);
+    const url = await pollResult(resultQuery(data));
     
     finishProgress();
     $('#result').hidden=false;
@@ -369,8 +367,7 @@ $('#apply-inpaint').addEventListener('click', async ()=>{
       body: JSON.stringify(payload)
     });
     
-    const pid = data.prompt_id;
-    const url = await pollResult(pid);
+    const url = await pollResult(resultQuery(data));
     
     finishProgress();
     $('#preview').src = url;
@@ -0,0 +1,583 @@
+// 初始化图标
+lucide.createIcons();
+
+// 全局变量
+let currentMode = 'txt2img';
+let currentResultQuery = null;
+let checkInterval = null;
+let checkCount = 0;
+let maxCheckCount = 300;
+let progressSimulation = null;
+let currentLang = 'zh'; // 默认中文
+
+// 主题切换
+const themeToggle = document.getElementById('theme-toggle');
+const html = document.documentElement;
+
+// 检查本地存储的主题
+const savedTheme = localStorage.getItem('theme');
+if (savedTheme) {
+    html.classList.toggle('dark', savedTheme === 'dark');
+} else {
+    // 检查系统主题偏好
+    const prefersDark = window.matchMedia('(prefers-color-scheme: dark)').matches;
+    html.classList.toggle('dark', prefersDark);
+}
+
+themeToggle.addEventListener('click', () => {
+    html.classList.toggle('dark');
+    const isDark = html.classList.contains('dark');
+    localStorage.setItem('theme', isDark ? 'dark' : 'light');
+    lucide.createIcons(); // 重新创建图标
+});
+
+// 语言切换
+const langToggle = document.getElementById('lang-toggle');
+const currentLangSpan = document.getElementById('current-lang');
+
+// 检查本地存储的语言
+const savedLang = localStorage.getItem('language');
+if (savedLang) {
+    currentLang = savedLang;
+    switchLanguage(currentLang);
+}
+
+langToggle.addEventListener('click', () => {
+    currentLang = currentLang === 'zh' ? 'en' : 'zh';
+    switchLanguage(currentLang);
+    localStorage.setItem('language', currentLang);
+});
+
+// 切换语言函数
+function switchLanguage(lang) {
+    currentLang = lang;
+    currentLangSpan.textContent = lang === 'zh' ? '中文' : 'English';
+
+    // 更新所有带有语言标签的元素
+    document.querySelectorAll('[data-zh][data-en]').forEach(element => {
+        if (element.tagName === 'INPUT' || element.tagName === 'TEXTAREA') {
+            element.placeholder = element.getAttribute(`data-${lang}-placeholder`) || element.getAttribute(`data-${lang}`) || element.textContent;
+        } else {
+            element.textContent = element.getAttribute(`data-${lang}`) || element.textContent;
+        }
+    });
+
+    // 更新提示词标题
+    const promptTitle = document.querySelector('#txt2img-panel h3');
+    if (promptTitle) {
+        promptTitle.innerHTML = `
+            <i data-lucide="edit-3" class="w-5 h-5 mr-2 text-primary-500"></i>
+            ${lang === 'zh' ? '提示词' : 'Prompt'}
+        `;
+        lucide.createIcons();
+    }
+}
+
+    // 模式切换
+    document.querySelectorAll('.mode-btn').forEach(btn => {
+        btn.addEventListener('click', function() {
+        const mode = this.dataset.mode;
+        switchMode(mode);
+    });
+});
+
+function switchMode(mode) {
+    currentMode = mode;
+
+    // 更新按钮状态
+    document.querySelectorAll('.mode-btn').forEach(btn => {
+        const isActive = btn.dataset.mode === mode;
+        if (isActive) {
+            btn.classList.add('bg-gradient-to-br', 'from-primary-500', 'to-primary-600', 'text-white', 'shadow-lg');
+            btn.classList.remove('bg-white/50', 'dark:bg-gray-800/50', 'text-gray-700', 'dark:text-gray-300', 'border', 'border-gray-200/50', 'dark:border-gray-700/50');
+        } else {
+            btn.classList.remove('bg-gradient-to-br', 'from-primary-500', 'to-primary-600', 'text-white', 'shadow-lg');
+            btn.classList.add('bg-white/50', 'dark:bg-gray-800/50', 'text-gray-700', 'dark:text-gray-300', 'border', 'border-gray-200/50', 'dark:border-gray-700/50');
+        }
+    });
+
+    // 切换面板
+    document.querySelectorAll('.mode-panel').forEach(panel => {
+        panel.classList.toggle('hidden', !panel.id.includes(mode));
+    });
+}
+
+// 预设提示词点击事件
+    document.querySelectorAll('.preset-btn').forEach(btn => {
+        btn.addEventListener('click', function() {
+        const prompt = this.dataset.prompt;
+        if (prompt) {
+            document.getElementById('prompt').value = prompt;
+            updateCharCount();
+        }
+    });
+});
+
+// 视频预设提示词点击事件
+document.querySelectorAll('.video-preset-btn').forEach(btn => {
+    btn.addEventListener('click', function() {
+        const prompt = this.dataset.prompt;
+        if (prompt) {
+            document.getElementById('video-prompt').value = prompt;
+            updateVideoCharCount();
+            }
+        });
+    });
+
+    // 字符计数
+function updateCharCount() {
+    const textarea = document.getElementById('prompt');
+    const counter = document.getElementById('charCount');
+    const count = Math.min(textarea.value.length, 1500);
+    textarea.value = textarea.value.substring(0, 1500); // 限制输入长度
+    counter.textContent = count;
+    counter.classList.toggle('text-red-500', count >= 1500);
+}
+
+function updateVideoCharCount() {
+    const textarea = document.getElementById('video-prompt');
+    const counter = document.getElementById('video-charCount');
+    const count = textarea.value.length;
+    counter.textContent = count;
+    counter.classList.toggle('text-red-500', count >= 400);
+}
+
+// 范围输入更新
+function initRangeInputs() {
+    const ranges = [
+        {id: 'steps', valueId: 'stepsValue'},
+        {id: 'guidance', valueId: 'guidanceValue'},
+        {id: 'noise-injection', valueId: 'noiseValue'},
+        {id: 'sharpening-strength', valueId: 'sharpenValue'},
+        {id: 'film-grain-strength', valueId: 'grainValue'}
+    ];
+
+    ranges.forEach(range => {
+        const input = document.getElementById(range.id);
+        const valueSpan = document.getElementById(range.valueId);
+        if (input && valueSpan) {
+            input.addEventListener('input', function() {
+                valueSpan.textContent = this.value;
+            });
+        }
+    });
+}
+
+// 图片上传处理
+function initImageUpload() {
+    const uploadArea = document.getElementById('image-upload-area');
+    const fileInput = document.getElementById('image-input');
+    const uploadPrompt = document.getElementById('upload-prompt');
+    const imagePreview = document.getElementById('image-preview');
+    const previewImg = document.getElementById('preview-img');
+    const filename = document.getElementById('image-filename');
+    const removeBtn = document.getElementById('remove-image');
+
+    uploadArea.addEventListener('click', () => fileInput.click());
+
+    uploadArea.addEventListener('dragover', (e) => {
+        e.preventDefault();
+        uploadArea.classList.add('border-primary-400', 'dark:border-primary-500');
+    });
+
+    uploadArea.addEventListener('dragleave', () => {
+        uploadArea.classList.remove('border-primary-400', 'dark:border-primary-500');
+    });
+
+    uploadArea.addEventListener('drop', (e) => {
+        e.preventDefault();
+        uploadArea.classList.remove('border-primary-400', 'dark:border-primary-500');
+        const files = e.dataTransfer.files;
+        if (files.length > 0) {
+            handleImageUpload(files[0]);
+        }
+    });
+
+    fileInput.addEventListener('change', (e) => {
+        if (e.target.files.length > 0) {
+            handleImageUpload(e.target.files[0]);
+        }
+    });
+
+    removeBtn.addEventListener('click', () => {
+        uploadPrompt.classList.remove('hidden');
+        imagePreview.classList.add('hidden');
+        fileInput.value = '';
+    });
+}
+
+function handleImageUpload(file) {
+    if (file.type.startsWith('image/')) {
+        const reader = new FileReader();
+        reader.onload = function(e) {
+            document.getElementById('preview-img').src = e.target.result;
+            document.getElementById('image-filename').textContent = file.name;
+            document.getElementById('upload-prompt').classList.add('hidden');
+            document.getElementById('image-preview').classList.remove('hidden');
+        };
+        reader.readAsDataURL(file);
+    } else {
+        alert('请上传图片文件！');
+    }
+}
+
+// 生成图像
+async function generateImage() {
+    const generateBtn = document.getElementById('generate-btn');
+    const status = document.getElementById('status');
+    const progressContainer = document.getElementById('progress-container');
+    const results = document.getElementById('results');
+
+    try {
+        // 清理之前的状态
+        if (checkInterval) {
+            clearInterval(checkInterval);
+            checkInterval = null;
+        }
+        if (progressSimulation) {
+            clearInterval(progressSimulation);
+            progressSimulation = null;
+        }
+        currentResultQuery = null;
+
+        generateBtn.disabled = true;
+        generateBtn.innerHTML = '<i data-lucide="loader" class="w-5 h-5 animate-spin mr-2"></i><span>创作中...</span>';
+
+        status.textContent = '正在生成...';
+        status.className = 'px-3 py-1 bg-yellow-100 dark:bg-yellow-900/30 text-yellow-800 dark:text-yellow-300 rounded-full text-sm font-medium';
+
+        // 显示进度条
+        progressContainer.classList.remove('hidden');
+        initProgressBar();
+
+        const data = collectFormData();
+
+        const response = await fetch('/api/generate', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify(data)
+        });
+
+        const result = await response.json();
+
+        if (result.error) {
+            throw new Error(result.error);
+        }
+
+        // 异步提交（202）时只返回本地任务ID，提交到后端之前由本地应答
+        currentResultQuery = result.prompt_id
+            ? `prompt_id=${encodeURIComponent(result.prompt_id)}`
+            : `local_id=${result.local_id}`;
+        status.textContent = result.prompt_id
+            ? `任务已提交 (${result.prompt_id.substring(0, 8)}...)`
+            : `任务已排队 (#${result.local_id})`;
+
+        // 开始检查结果
+        checkInterval = setInterval(checkResult, 1000);
+
+    } catch (error) {
+        status.textContent = `错误: ${error.message}`;
+        status.className = 'px-3 py-1 bg-red-100 dark:bg-red-900/30 text-red-800 dark:text-red-300 rounded-full text-sm font-medium';
+        progressContainer.classList.add('hidden');
+        generateBtn.disabled = false;
+        const btnText = currentLang === 'zh' ? '开始创作' : 'Start Creating';
+        generateBtn.innerHTML = `<i data-lucide="sparkles" class="w-5 h-5 mr-2"></i><span>${btnText}</span>`;
+        showPlaceholder();
+    }
+}
+
+// 收集表单数据
+function collectFormData() {
+    const size = document.getElementById('size').value.split('x');
+    return {
+        mode: 'txt2img',
+        width: parseInt(size[0]),
+        height: parseInt(size[1]),
+        steps: parseInt(document.getElementById('steps').value),
+        guidance: parseFloat(document.getElementById('guidance').value),
+        seed: document.getElementById('seed').value ? parseInt(document.getElementById('seed').value) : null,
+        noise_injection: parseFloat(document.getElementById('noise-injection').value),
+        sharpening_strength: parseFloat(document.getElementById('sharpening-strength').value),
+        film_grain_strength: parseFloat(document.getElementById('film-grain-strength').value),
+        prompt: document.getElementById('prompt').value,
+        negative_prompt: document.getElementById('negative').value
+    };
+}
+
+// 初始化进度条
+function initProgressBar() {
+    const progressBar = document.getElementById('progress-bar');
+    const progressPercentage = document.getElementById('progress-percentage');
+    const progressText = document.getElementById('progress-text');
+    const currentStepEl = document.getElementById('current-step');
+    const estimatedTimeEl = document.getElementById('estimated-time');
+
+    progressBar.style.width = '0%';
+    progressPercentage.textContent = '0%';
+    progressText.textContent = '正在初始化...';
+    currentStepEl.textContent = `步骤: 0/${document.getElementById('steps').value}`;
+    estimatedTimeEl.textContent = '预计: 计算中...';
+
+    setTimeout(() => {
+        updateProgress(5, '正在加载模型...', 0, parseInt(document.getElementById('steps').value));
+    }, 500);
+}
+
+// 更新进度条
+function updateProgress(percentage, text, currentStep, totalSteps, estimatedTime = null) {
+    document.getElementById('progress-bar').style.width = `${percentage}%`;
+    document.getElementById('progress-percentage').textContent = `${Math.round(percentage)}%`;
+    document.getElementById('progress-text').textContent = text;
+    document.getElementById('current-step').textContent = `步骤: ${currentStep}/${totalSteps}`;
+
+    if (estimatedTime) {
+        document.getElementById('estimated-time').textContent = `预计: ${estimatedTime}`;
+    }
+}
+
+// 检查结果
+async function checkResult() {
+    if (!currentResultQuery) return;
+
+    checkCount++;
+    if (checkCount > maxCheckCount) {
+        console.error('检查超时，停止检查');
+        document.getElementById('status').textContent = '生成超时，请重试';
+        document.getElementById('status').className = 'px-3 py-1 bg-yellow-100 dark:bg-yellow-900/30 text-yellow-800 dark:text-yellow-300 rounded-full text-sm font-medium';
+        stopChecking();
+        showPlaceholder();
+        return;
+    }
+
+    try {
+        const response = await fetch(`/api/result?${currentResultQuery}`);
+
+        if (!response.ok) {
+            console.error(`HTTP错误: ${response.status}`);
+            return;
+        }
+
+        const responseText = await response.text();
+        if (!responseText || responseText.trim() === '') {
+            console.log('收到空响应，继续等待...');
+            return;
+        }
+
+        let result;
+        try {
+            result = JSON.parse(responseText);
+        } catch (jsonError) {
+            console.error('JSON解析失败:', jsonError);
+            return;
+        }
+
+        if (result.status === 'success' && result.images) {
+            updateProgress(100, '生成完成！', parseInt(document.getElementById('steps').value), parseInt(document.getElementById('steps').value), '00:00');
+            setTimeout(() => {
+                displayResults(result.images);
+                stopChecking();
+            }, 1000);
+        } else if (result.status === 'error') {
+            document.getElementById('status').textContent = `错误: ${result.message}`;
+            document.getElementById('status').className = 'px-3 py-1 bg-red-100 dark:bg-red-900/30 text-red-800 dark:text-red-300 rounded-full text-sm font-medium';
+            stopChecking();
+            showPlaceholder();
+        } else if (result.status === 'pending' || result.status === 'running') {
+            if (!progressSimulation) {
+                const totalSteps = parseInt(document.getElementById('steps').value) || 30;
+                setTimeout(() => simulateProgress(totalSteps), 2000);
+            }
+        }
+    } catch (error) {
+        console.error('检查结果失败:', error);
+    }
+}
+
+// 模拟进度更新
+function simulateProgress(totalSteps) {
+    let currentStep = 0;
+    let percentage = 10;
+    const stepIncrement = 80 / totalSteps;
+
+    progressSimulation = setInterval(() => {
+        if (currentStep < totalSteps) {
+            currentStep++;
+            percentage += stepIncrement;
+
+            let text = '正在生成图像...';
+            if (currentStep <= 5) {
+                text = '正在编码提示词...';
+            } else if (currentStep <= totalSteps * 0.3) {
+                text = '正在初始采样...';
+            } else if (currentStep <= totalSteps * 0.7) {
+                text = '正在细化图像...';
+            } else if (currentStep <= totalSteps * 0.9) {
+                text = '正在优化细节...';
+            } else {
+                text = '正在后处理...';
+            }
+
+            const remainingTime = Math.max(0, (totalSteps - currentStep) * 2);
+            const minutes = Math.floor(remainingTime / 60);
+            const seconds = remainingTime % 60;
+            const timeStr = `${minutes}:${seconds.toString().padStart(2, '0')}`;
+
+            updateProgress(percentage, text, currentStep, totalSteps, timeStr);
+        } else {
+            clearInterval(progressSimulation);
+            updateProgress(90, '正在保存图像...', totalSteps, totalSteps, '00:05');
+        }
+    }, 1500);
+}
+
+// 显示结果
+function displayResults(images) {
+    const results = document.getElementById('results');
+    const progressContainer = document.getElementById('progress-container');
+
+    results.innerHTML = '';
+    progressContainer.classList.add('hidden');
+
+    images.forEach((img, index) => {
+        const div = document.createElement('div');
+        div.className = 'result-item mb-6 animate-fade-in';
+        div.innerHTML = `
+            <div class="relative rounded-2xl overflow-hidden bg-white/50 dark:bg-gray-800/50 border border-gray-200/50 dark:border-gray-700/50 shadow-lg group">
+                <img src="${img.url}" alt="生成的图像 ${index + 1}" class="w-full h-auto" />
+                <div class="absolute inset-0 bg-black/20 opacity-0 group-hover:opacity-100 transition-opacity flex items-center justify-center space-x-4">
+                    <button class="bg-white/90 dark:bg-gray-800/90 text-gray-800 dark:text-white p-3 rounded-xl hover:bg-white dark:hover:bg-gray-700 transition-all shadow-lg hover:-translate-y-1" onclick="downloadImage('${img.url}', '${img.filename}')" title="下载图片">
+                        <i data-lucide="download" class="w-5 h-5"></i>
+                    </button>
+                    <button class="bg-white/90 dark:bg-gray-800/90 text-gray-800 dark:text-white p-3 rounded-xl hover:bg-white dark:hover:bg-gray-700 transition-all shadow-lg hover:-translate-y-1" onclick="regenerateImage()" title="重新生成">
+                        <i data-lucide="refresh-cw" class="w-5 h-5"></i>
+                    </button>
+                    <button class="bg-white/90 dark:bg-gray-800/90 text-gray-800 dark:text-white p-3 rounded-xl hover:bg-white dark:hover:bg-gray-700 transition-all shadow-lg hover:-translate-y-1" onclick="openVideoModal('${img.url}')" title="生成视频">
+                        <i data-lucide="video" class="w-5 h-5"></i>
+                    </button>
+                </div>
+            </div>
+            <div class="mt-3 text-sm text-gray-500 dark:text-gray-400 text-center">${img.filename}</div>
+        `;
+        results.appendChild(div);
+    });
+
+    // 重新创建图标
+    lucide.createIcons();
+
+    document.getElementById('status').textContent = '生成完成';
+    document.getElementById('status').className = 'px-3 py-1 bg-green-100 dark:bg-green-900/30 text-green-800 dark:text-green-300 rounded-full text-sm font-medium';
+}
+
+// 显示占位符
+function showPlaceholder() {
+    const results = document.getElementById('results');
+    results.innerHTML = `
+        <div class="placeholder flex flex-col items-center justify-center py-16 text-center space-y-4">
+            <div class="w-24 h-24 bg-gradient-to-br from-primary-100 to-secondary-100 dark:from-primary-900/30 dark:to-secondary-900/30 rounded-3xl flex items-center justify-center animate-float">
+                <i data-lucide="sparkles" class="w-12 h-12 text-primary-500"></i>
+            </div>
+            <div class="space-y-2">
+                <p class="text-lg font-medium text-gray-700 dark:text-gray-300">准备开始创作</p>
+                <p class="text-gray-500 dark:text-gray-400 max-w-md">选择创作模式，输入提示词，点击生成按钮开始您的AI创作之旅</p>
+            </div>
+            <div class="flex items-center space-x-6 text-sm text-gray-400 dark:text-gray-500">
+                <div class="flex items-center space-x-2">
+                    <i data-lucide="globe" class="w-4 h-4"></i>
+                    <span>多语言支持</span>
+                </div>
+                <div class="flex items-center space-x-2">
+                    <i data-lucide="zap" class="w-4 h-4"></i>
+                    <span>高级AI模型</span>
+                </div>
+                <div class="flex items-center space-x-2">
+                    <i data-lucide="shield-check" class="w-4 h-4"></i>
+                    <span>专业后处理</span>
+                </div>
+            </div>
+        </div>
+    `;
+    lucide.createIcons();
+}
+
+// 停止检查
+function stopChecking() {
+    if (checkInterval) {
+        clearInterval(checkInterval);
+        checkInterval = null;
+    }
+    if (progressSimulation) {
+        clearInterval(progressSimulation);
+        progressSimulation = null;
+    }
+    document.getElementById('progress-container').classList.add('hidden');
+    document.getElementById('generate-btn').disabled = false;
+    document.getElementById('generate-btn').innerHTML = '<i data-lucide="sparkles" class="w-5 h-5 mr-2"></i><span>开始创作</span>';
+
+    currentResultQuery = null;
+    checkCount = 0;
+    lucide.createIcons();
+}
+
+// 下载图像
+function downloadImage(url, filename) {
+    const link = document.createElement('a');
+    link.href = url;
+    link.download = filename;
+    document.body.appendChild(link);
+    link.click();
+    document.body.removeChild(link);
+}
+
+// 重新生成
+function regenerateImage() {
+    generateImage();
+}
+
+// API测试
+async function testAPIs() {
+    // 健康检查
+    try {
+        const response = await fetch('/health');
+        const healthIcon = document.getElementById('health-status');
+        if (response.ok) {
+            healthIcon.innerHTML = '<i data-lucide="check-circle" class="w-6 h-6 text-green-500 mx-auto"></i>';
+            healthIcon.className = 'text-2xl font-bold mb-1 text-green-600';
+        } else {
+            healthIcon.innerHTML = '<i data-lucide="x-circle" class="w-6 h-6 text-red-500 mx-auto"></i>';
+            healthIcon.className = 'text-2xl font-bold mb-1 text-red-600';
+        }
+    } catch (error) {
+        const healthIcon = document.getElementById('health-status');
+        healthIcon.innerHTML = '<i data-lucide="x-circle" class="w-6 h-6 text-red-500 mx-auto"></i>';
+        healthIcon.className = 'text-2xl font-bold mb-1 text-red-600';
+    }
+
+    // 模型状态（简化显示）
+    const loraIcon = document.getElementById('lora-status');
+    loraIcon.innerHTML = '<i data-lucide="check-circle" class="w-6 h-6 text-blue-500 mx-auto"></i>';
+    loraIcon.className = 'text-2xl font-bold mb-1 text-blue-600';
+
+    // 队列状态（简化显示）
+    const queueIcon = document.getElementById('queue-status');
+    queueIcon.innerHTML = '<span class="text-purple-600">0</span>';
+    queueIcon.className = 'text-2xl font-bold mb-1 text-purple-600';
+
+    lucide.createIcons();
+}
+
+// 初始化
+document.addEventListener('DOMContentLoaded', function() {
+    // 绑定事件
+    document.getElementById('prompt').addEventListener('input', updateCharCount);
+    document.getElementById('video-prompt').addEventListener('input', updateVideoCharCount);
+    document.getElementById('generate-btn').addEventListener('click', generateImage);
+    document.getElementById('test-api-btn').addEventListener('click', testAPIs);
+
+    // 初始化功能
+    initRangeInputs();
+    initImageUpload();
+    testAPIs();
+
+    // 重新创建图标
+    lucide.createIcons();
+});
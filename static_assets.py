@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+指纹化静态资源 - 模板URL映射、预压缩协商与长期缓存
+构建步骤见 build_static.py
+"""
+
+import json
+import mimetypes
+from pathlib import Path
+from typing import Dict
+
+from flask import make_response, render_template, request, send_from_directory, url_for
+
+# 指纹化文件内容不会变化，可以永久缓存
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# 按优先级排列的预压缩格式：Content-Encoding -> 文件后缀
+PRECOMPRESSED = [('br', '.br'), ('gzip', '.gz')]
+
+
+def load_manifest(static_folder: str) -> Dict[str, str]:
+    """读取构建清单，未构建时返回空字典"""
+    path = Path(static_folder) / 'dist' / 'manifest.json'
+    try:
+        return json.loads(path.read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        return {}
+
+
+def negotiate_encoding(directory: Path, filename: str):
+    """根据 Accept-Encoding 选择存在的预压缩版本，返回 (文件名, 编码)"""
+    for encoding, suffix in PRECOMPRESSED:
+        if request.accept_encodings[encoding] and (directory / (filename + suffix)).is_file():
+            return filename + suffix, encoding
+    return filename, None
+
+
+def render_page(template: str, **context):
+    """渲染页面并附带 ETag，内容未变化时返回304"""
+    response = make_response(render_template(template, **context))
+    response.headers['Cache-Control'] = 'no-cache'
+    response.add_etag()
+    return response.make_conditional(request)
+
+
+def init_app(app):
+    """注册 asset_url 模板函数与指纹化资源路由"""
+    manifest = load_manifest(app.static_folder)
+    dist_dir = Path(app.static_folder) / 'dist'
+    app.extensions['static_manifest'] = manifest
+
+    @app.template_global()
+    def asset_url(path: str) -> str:
+        """返回资源的指纹化URL，未构建时回退到原始路径"""
+        return url_for('static', filename=manifest.get(path, path))
+
+    @app.route('/static/dist/<path:filename>')
+    def static_dist(filename):
+        """提供指纹化资源，优先返回预压缩版本"""
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        served, encoding = negotiate_encoding(dist_dir, filename)
+        response = send_from_directory(dist_dir, served, mimetype=mimetype, max_age=31536000)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+            response.headers.pop('Content-Disposition', None)
+        response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+        response.vary.add('Accept-Encoding')
+        return response
+
+    return manifest
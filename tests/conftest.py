@@ -0,0 +1,100 @@
+"""
+Shared fixtures: an in-process fake of the remote generation server
+"""
+import json
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+
+class FakeUpstream(ThreadingHTTPServer):
+    """Minimal stand-in for the remote ComfyUI proxy server"""
+
+    daemon_threads = True
+
+    def __init__(self, name):
+        super().__init__(('127.0.0.1', 0), _Handler)
+        self.name = name
+        self.requests = []
+        self.routes = {
+            ('GET', '/health'): lambda req: (200, {'status': 'ok'}),
+            ('POST', '/api/upload'): lambda req: (200, {'status': 'success', 'path': f'{name}/upload.png'}),
+            ('POST', '/api/generate'): lambda req: (200, {'job_id': 1, 'prompt_id': f'prompt-{name}'}),
+            ('GET', '/api/result'): lambda req: (200, {
+                'status': 'success',
+                'images': [{'filename': f'{name}.png', 'url': f'/api/proxy/view?filename={name}.png&type=output'}],
+            }),
+            ('GET', '/api/proxy/view'): self._view,
+        }
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+    def _view(self, req):
+        if req['query'].get('filename') != f'{self.name}.png':
+            return 404, {'error': 'not found'}
+        return 200, f'image-from-{self.name}'.encode(), 'image/png'
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def _dispatch(self, method):
+        parsed = urlparse(self.path)
+        length = int(self.headers.get('Content-Length') or 0)
+        req = {
+            'method': method,
+            'path': parsed.path,
+            'query': {k: v[0] for k, v in parse_qs(parsed.query).items()},
+            'headers': dict(self.headers),
+            'body': self.rfile.read(length) if length else b'',
+        }
+        self.server.requests.append(req)
+        route = self.server.routes.get((method, parsed.path))
+        result = route(req) if route else (404, {'error': 'not found'})
+        status, body = result[0], result[1]
+        content_type = result[2] if len(result) > 2 else 'application/json'
+        extra_headers = result[3] if len(result) > 3 else {}
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in extra_headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_POST(self):
+        self._dispatch('POST')
+
+
+@pytest.fixture
+def fake_upstream():
+    """Factory fixture starting fake upstream servers on free ports"""
+    servers = []
+
+    def start(name='a'):
+        server = FakeUpstream(name)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
@@ -111,6 +111,64 @@ class TestHealthCheck:
             assert 'server' in data
             assert 'timestamp' in data
 
+    def test_health_reports_startup_breakdown(self):
+        """Test health endpoint answers without probing the server inline"""
+        from app_local import app
+        
+        with app.test_client() as client:
+            data = client.get('/health').get_json()
+            assert 'startup_ms' in data
+            assert 'total' in data['startup_ms']
+
+
+class TestAppFactory:
+    """Test lazy application factory"""
+    
+    def test_create_app_is_independent(self):
+        """Test each factory call builds a separate, fully routed app"""
+        from app_local import create_app
+        
+        first = create_app(database_uri='sqlite:///:memory:')
+        second = create_app(database_uri='sqlite:///:memory:')
+        assert first is not second
+        assert '/api/generate' in [rule.rule for rule in second.url_map.iter_rules()]
+    
+    def test_database_initialized_on_first_request(self):
+        """Test table creation is deferred until the app is first used"""
+        from app_local import create_app
+        
+        app = create_app(database_uri='sqlite:///:memory:')
+        assert not app.extensions.get('database_ready')
+        with app.test_client() as client:
+            assert client.get('/api/jobs').status_code == 200
+        assert app.extensions['database_ready']
+    
+    def test_old_schema_upgraded(self, tmp_path):
+        """Test columns added to LocalJob are added to existing databases"""
+        import sqlite3
+        from app_local import create_app
+        
+        db_file = tmp_path / 'old.db'
+        conn = sqlite3.connect(str(db_file))
+        conn.execute("""CREATE TABLE local_jobs (id INTEGER PRIMARY KEY, remote_job_id INTEGER, type VARCHAR(50),
+                        params TEXT, status VARCHAR(20), prompt_id VARCHAR(64), created_at TIMESTAMP)""")
+        conn.commit()
+        conn.close()
+        
+        app = create_app(database_uri=f'sqlite:///{db_file}')
+        with app.test_client() as client:
+            assert client.get('/api/jobs').status_code == 200
+        columns = [row[1] for row in sqlite3.connect(str(db_file)).execute('PRAGMA table_info(local_jobs)')]
+        assert 'backend' in columns
+    
+    def test_prebuilt_app(self):
+        """Test the prebuilt database variant reuses the shared factory"""
+        from app_prebuilt_db import app
+        
+        assert app.config['PREBUILT_DB'] is True
+        with app.test_client() as client:
+            assert client.get('/health').get_json()['prebuilt_db'] is True
+
 
 if __name__ == '__main__':
     pytest.main([__file__])
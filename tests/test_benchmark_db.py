@@ -0,0 +1,50 @@
+"""
+Tests for the local_jobs scaling benchmark
+"""
+import json
+import sqlite3
+import sys
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+import benchmark_db
+
+
+class TestBenchmark:
+    """Test the synthesized tables and the machine-readable report"""
+
+    def test_synthesized_rows_match_app_schema(self, tmp_path):
+        """Test synthesized jobs use the app's column formats and known prompt ids"""
+        db_path = tmp_path / 'bench.db'
+        benchmark_db.synthesize(db_path, 500, chunk=200)
+
+        conn = sqlite3.connect(str(db_path))
+        assert conn.execute('SELECT COUNT(*) FROM local_jobs').fetchone()[0] == 500
+        row = conn.execute('SELECT prompt_id, created_at, param_mode FROM local_jobs WHERE id = 42').fetchone()
+        assert row[0] == benchmark_db.prompt_id_for(42)
+        assert len(row[1]) == len('2024-05-01 10:00:00.000000')
+        assert row[2] in benchmark_db.MODES
+        assert conn.execute("SELECT SUM(count) FROM job_rollups WHERE period = 'day'").fetchone()[0] == 500
+        conn.close()
+
+    def test_report_and_compare(self, tmp_path, monkeypatch):
+        """Test a small run writes JSON with every metric and compares against a baseline"""
+        monkeypatch.chdir(project_root)
+        # the benchmark configures the app through the environment; restore it afterwards
+        for name in ('SERVER_URL', 'CI', 'PREFETCH_RESULTS', 'RETENTION_DAYS'):
+            monkeypatch.setenv(name, 'http://127.0.0.1:9' if name == 'SERVER_URL' else '0')
+        out = tmp_path / 'result.json'
+        report = benchmark_db.main(['--sizes', '1k', '--writers', '2', '--write-seconds', '0.3',
+                                    '--iterations', '5', '--workdir', str(tmp_path), '--out', str(out)])
+
+        saved = json.loads(out.read_text(encoding='utf-8'))
+        assert saved == report
+        result = saved['results'][0]
+        assert result['rows'] == 1000 and result['file_bytes'] > 0
+        assert set(result['reads']) == {f'list_{name}' for name in benchmark_db.LIST_QUERIES} | {
+            'stats_day', 'lookup_prompt_id', 'lookup_missing'}
+        assert result['inserts']['2']['samples'] > 0
+        assert result['file_bytes_after_inserts'] >= result['file_bytes']
+        assert any('lookup_prompt_id' in line for line in benchmark_db.compare(saved, saved))
@@ -0,0 +1,105 @@
+"""
+Tests for bulk import/export in create_prebuilt_db.py
+"""
+import gzip
+import json
+import sqlite3
+import sys
+from pathlib import Path
+
+import pytest
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from create_prebuilt_db import bulk_import, export_database
+
+
+def _write_ndjson(path, rows):
+    with gzip.open(path, 'wt', encoding='utf-8') as f:
+        for row in rows:
+            f.write(json.dumps(row, ensure_ascii=False) + '\n')
+
+
+class TestBulkImport:
+    """Test loading jobs from NDJSON and SQLite sources"""
+
+    def test_merge_sources(self, tmp_path):
+        """Test NDJSON and legacy SQLite sources merge into one optimized database"""
+        ndjson = tmp_path / 'jobs.ndjson.gz'
+        _write_ndjson(ndjson, [
+            {'id': 1, 'type': 'txt2img', 'status': 'completed', 'created_at': f'2024-05-01T10:0{i}:00',
+             'completed_at': f'2024-05-01T10:0{i}:30', 'params': {'mode': 'txt2img', 'prompt': '猫', 'seed': i},
+             'outputs': [{'filename': f'{i}.png'}]}
+            for i in range(5)
+        ])
+        legacy = tmp_path / 'legacy.db'
+        conn = sqlite3.connect(str(legacy))
+        conn.execute("""CREATE TABLE local_jobs (id INTEGER PRIMARY KEY, remote_job_id INTEGER, type VARCHAR(50),
+                        params TEXT, status VARCHAR(20), prompt_id VARCHAR(64), created_at TIMESTAMP)""")
+        conn.execute("INSERT INTO local_jobs (id, type, params, status, created_at) VALUES "
+                     "(1, 'img2img', '{\"mode\": \"img2img\", \"width\": 640}', 'failed', '2024-05-02 08:00:00')")
+        conn.commit()
+        conn.close()
+
+        target = tmp_path / 'prebuilt.db'
+        assert bulk_import([ndjson, legacy], target, batch_size=2) == 6
+
+        conn = sqlite3.connect(str(target))
+        assert conn.execute('SELECT COUNT(*) FROM job_params').fetchone()[0] == 2
+        assert conn.execute('SELECT COUNT(*) FROM local_jobs WHERE param_width = 640').fetchone()[0] == 1
+        assert conn.execute('PRAGMA page_size').fetchone()[0] == 8192
+        assert conn.execute("SELECT COUNT(*) FROM sqlite_master WHERE name = 'sqlite_stat1'").fetchone()[0] == 1
+        indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        assert {'ix_local_jobs_created_at', 'ix_local_jobs_param_mode'} <= indexes
+        rollup = conn.execute("SELECT SUM(count) FROM job_rollups WHERE period = 'day'").fetchone()[0]
+        assert rollup == 6
+        conn.close()
+
+    def test_export_round_trip(self, tmp_path):
+        """Test an exported database imports back with the same jobs"""
+        source = tmp_path / 'jobs.ndjson.gz'
+        _write_ndjson(source, [{'type': 'video', 'status': 'queued', 'params': {'prompt': 'sea', 'steps': 8}}])
+        first, exported, second = tmp_path / 'a.db', tmp_path / 'out.ndjson', tmp_path / 'b.db'
+
+        bulk_import([source], first)
+        assert export_database(first, exported) == 1
+        bulk_import([exported], second)
+
+        row = json.loads(exported.read_text(encoding='utf-8'))
+        assert row['params'] == {'prompt': 'sea', 'steps': 8}
+        conn = sqlite3.connect(str(second))
+        assert conn.execute('SELECT type, param_steps FROM local_jobs').fetchall() == [('video', 8)]
+        conn.close()
+
+    def test_failed_import_keeps_target(self, tmp_path):
+        """Test a bad source or importing the target into itself leaves the database intact"""
+        source = tmp_path / 'jobs.ndjson.gz'
+        _write_ndjson(source, [{'type': 'txt2img', 'status': 'completed'}])
+        target = tmp_path / 'prebuilt.db'
+        bulk_import([source], target)
+
+        with pytest.raises(ValueError):
+            bulk_import([target, source], target)
+        with pytest.raises(FileNotFoundError):
+            bulk_import([source, tmp_path / 'missing.ndjson'], target)
+
+        conn = sqlite3.connect(str(target))
+        assert conn.execute('SELECT COUNT(*) FROM local_jobs').fetchone()[0] == 1
+        conn.close()
+        assert sorted(p.name for p in tmp_path.iterdir()) == ['jobs.ndjson.gz', 'prebuilt.db']
+
+    def test_latency_timestamps_round_trip(self, tmp_path):
+        """Test per-job latency timestamps survive import and export"""
+        times = {'created_at': '2024-05-01T10:00:00', 'submitted_at': '2024-05-01T10:00:00.500000',
+                 'accepted_at': '2024-05-01T10:00:01', 'first_progress_at': '2024-05-01T10:00:05',
+                 'completed_at': '2024-05-01T10:00:30'}
+        source = tmp_path / 'jobs.ndjson.gz'
+        _write_ndjson(source, [dict(type='txt2img', status='completed', **times)])
+        target, exported = tmp_path / 'a.db', tmp_path / 'out.ndjson'
+
+        bulk_import([source], target)
+        export_database(target, exported)
+
+        row = json.loads(exported.read_text(encoding='utf-8'))
+        assert {key: row[key] for key in times} == times
@@ -0,0 +1,80 @@
+"""
+Tests for sendfile / X-Accel-Redirect serving of local files
+"""
+import sys
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from file_serving import FileSender
+from upstream_pool import backend_tag
+
+
+def _client(fake_upstream, monkeypatch, tmp_path, accel):
+    upstream = fake_upstream('a')
+    monkeypatch.setenv('SERVER_URL', upstream.url)
+    monkeypatch.setenv('DOWNLOAD_DIR', str(tmp_path / 'downloads'))
+    monkeypatch.setenv('X_ACCEL_REDIRECT', 'true' if accel else 'false')
+    local_dir = tmp_path / 'downloads' / backend_tag(upstream.url) / 'output'
+    local_dir.mkdir(parents=True)
+    (local_dir / 'a b.png').write_bytes(b'local-image')
+    from app_local import create_app
+
+    app = create_app(database_uri='sqlite:///:memory:')
+    return upstream, app.test_client(), f'/api/proxy/view?filename=a%20b.png&type=output&backend={backend_tag(upstream.url)}'
+
+
+class _Wrapper:
+    """Stand-in for a server's wsgi.file_wrapper (gunicorn uses sendfile here)"""
+    used = []
+
+    def __init__(self, file, block_size=8192):
+        self.file = file
+        _Wrapper.used.append(file.name)
+
+    def __iter__(self):
+        return iter(lambda: self.file.read(8192), b'')
+
+    def close(self):
+        self.file.close()
+
+
+class TestFileServing:
+    """Test local outputs skip Python-level copying"""
+
+    def test_prefetched_file_uses_file_wrapper(self, fake_upstream, monkeypatch, tmp_path):
+        """Test local files are handed to the server's file wrapper with range support"""
+        upstream, client, view = _client(fake_upstream, monkeypatch, tmp_path, accel=False)
+        environ = {'wsgi.file_wrapper': _Wrapper}
+        response = client.get(view, environ_base=environ)
+        assert response.data == b'local-image'
+        assert response.headers['Content-Type'] == 'image/png'
+        assert _Wrapper.used[-1].endswith('a b.png')
+        assert not any(req['path'] == '/api/proxy/view' for req in upstream.requests)
+
+        response = client.get(view, headers={'Range': 'bytes=6-'})
+        assert (response.status_code, response.data) == (206, b'image')
+
+    def test_x_accel_redirect(self, fake_upstream, monkeypatch, tmp_path):
+        """Test nginx offload returns only headers pointing at the internal location"""
+        upstream, client, view = _client(fake_upstream, monkeypatch, tmp_path, accel=True)
+        response = client.get(view)
+        assert response.headers['X-Accel-Redirect'] == f'/_internal/downloads/{backend_tag(upstream.url)}/output/a%20b.png'
+        assert response.headers['Content-Type'] == 'image/png'
+        assert response.data == b''
+
+    def test_uploads_route(self, fake_upstream, monkeypatch, tmp_path):
+        """Test static/uploads is served locally and cannot escape its directory"""
+        upstream, client, _ = _client(fake_upstream, monkeypatch, tmp_path, accel=True)
+        client.application.static_folder = str(tmp_path / 'static')
+        client.application.extensions['file_sender'] = FileSender({str(tmp_path / 'static' / 'uploads'): '/_up/'})
+        (tmp_path / 'static' / 'uploads').mkdir(parents=True)
+        (tmp_path / 'static' / 'uploads' / 'face.jpg').write_bytes(b'jpg')
+        (tmp_path / 'static' / 'secret.txt').write_text('no')
+
+        response = client.get('/static/uploads/face.jpg')
+        assert response.headers['X-Accel-Redirect'] == '/_up/face.jpg'
+        assert response.headers['Content-Type'] == 'image/jpeg'
+        assert client.get('/static/uploads/../secret.txt').status_code == 404
+        assert client.get('/static/uploads/missing.jpg').status_code == 404
@@ -0,0 +1,113 @@
+"""
+Tests for hedged upstream GETs
+"""
+import sys
+import threading
+import time
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from hedging import Hedger
+
+
+class _Response:
+    def __init__(self, name):
+        self.name = name
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def _sender(delays):
+    """Return a send() whose n-th call sleeps delays[n] seconds"""
+    calls = []
+    lock = threading.Lock()
+
+    def send():
+        with lock:
+            n = len(calls)
+            calls.append(n)
+        time.sleep(delays[n])
+        return _Response(n)
+    return send, calls
+
+
+class TestHedger:
+    """Test hedge timing, winner selection and the budget"""
+
+    def test_fast_response_not_hedged(self):
+        """Test requests answering before the delay send one attempt"""
+        hedger = Hedger(['/api/result'], budget=1, default_delay_ms=200)
+        send, calls = _sender([0])
+        assert hedger.run('/api/result', send).name == 0
+        assert len(calls) == 1
+
+    def test_stalled_request_hedged(self):
+        """Test a stalled first attempt loses to the hedge and is closed"""
+        hedger = Hedger(['/api/result'], budget=1, default_delay_ms=20)
+        send, calls = _sender([0.5, 0])
+        start = time.perf_counter()
+        response = hedger.run('/api/result', send)
+        assert response.name == 1
+        assert time.perf_counter() - start < 0.4
+        assert hedger.stats() == {'hedged': 1, 'hedge_wins': 1}
+
+    def test_budget_limits_hedges(self):
+        """Test hedges never exceed the budgeted share of requests"""
+        hedger = Hedger(['/api/result'], budget=0.25, default_delay_ms=1)
+        for _ in range(8):
+            send, _ = _sender([0.02, 0.02])
+            hedger.run('/api/result', send)
+        assert hedger.hedged == 2
+
+    def test_saturated_pool_not_hedged(self):
+        """Test no hedge is queued behind hedges already filling the pool"""
+        hedger = Hedger(['/api/result'], budget=1, default_delay_ms=10, max_workers=1)
+        slow, _ = _sender([0.3, 0.3])
+        threading.Thread(target=hedger.run, args=('/api/result', slow)).start()
+        time.sleep(0.1)
+        send, calls = _sender([0.05])
+        assert hedger.run('/api/result', send).name == 0
+        assert len(calls) == 1
+        assert hedger.hedged == 1
+
+    def test_delay_follows_percentile(self):
+        """Test the hedge delay tracks observed latency"""
+        hedger = Hedger(['/api/proxy/view'], percentile=90, min_delay_ms=5)
+        for ms in range(1, 101):
+            hedger.observe('/api/proxy/view', ms)
+        assert hedger.delay_ms('/api/proxy/view') == 91
+        assert not hedger.applies('POST', '/api/proxy/view')
+        assert hedger.applies('GET', '/api/proxy/view')
+
+
+class TestHedgedClient:
+    """Test RemoteAPIClient hedges configured GETs"""
+
+    def test_result_hedged(self, fake_upstream, monkeypatch):
+        """Test a stalled /api/result poll is answered by the hedge"""
+        upstream = fake_upstream('a')
+        monkeypatch.setenv('SERVER_URL', upstream.url)
+        monkeypatch.setenv('HEDGE_REQUESTS', 'true')
+        monkeypatch.setenv('HEDGE_BUDGET', '1')
+        from app_local import RemoteAPIClient
+
+        calls = []
+
+        def result(req):
+            calls.append(req)
+            if len(calls) == 1:
+                time.sleep(1)
+            return 200, {'status': 'pending'}
+        upstream.routes[('GET', '/api/result')] = result
+
+        client = RemoteAPIClient()
+        client.hedger.default_delay_ms = 50
+        start = time.perf_counter()
+        response = client.proxy_request('GET', '/api/result', params={'prompt_id': 'p'}, timeout=5)
+        assert response.json() == {'status': 'pending'}
+        assert time.perf_counter() - start < 0.8
+        assert len(calls) == 2
@@ -0,0 +1,67 @@
+"""
+Tests for upload image normalization and downscaling
+"""
+import io
+import sys
+from pathlib import Path
+
+import pytest
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from image_preprocess import ImagePreprocessor
+
+Image = pytest.importorskip('PIL.Image')
+
+
+def _jpeg(size, orientation=None):
+    image = Image.new('RGB', size, (200, 100, 50))
+    exif = Image.Exif()
+    if orientation:
+        exif[0x0112] = orientation
+    exif[0x010F] = 'PhoneMaker'
+    out = io.BytesIO()
+    image.save(out, 'JPEG', exif=exif.tobytes())
+    return out.getvalue()
+
+
+class TestImagePreprocessor:
+    """Test orientation, metadata stripping and downscaling"""
+
+    def test_large_photo_rotated_and_downscaled(self):
+        """Test a rotated phone photo is upright, within max_size and has no EXIF"""
+        preprocessor = ImagePreprocessor(max_size=512)
+        name, data, content_type = preprocessor.process('photo.jpg', io.BytesIO(_jpeg((2000, 1000), 6)), 'image/jpeg')
+
+        image = Image.open(io.BytesIO(data))
+        assert (name, content_type) == ('photo.jpg', 'image/jpeg')
+        assert image.size == (256, 512)
+        assert not image.getexif()
+
+    def test_clean_small_image_untouched(self):
+        """Test images needing no changes are forwarded byte for byte"""
+        out = io.BytesIO()
+        Image.new('RGBA', (64, 64)).save(out, 'PNG')
+        original = out.getvalue()
+
+        preprocessor = ImagePreprocessor(max_size=512)
+        assert preprocessor.process('mask.png', io.BytesIO(original), 'image/png')[1] == original
+        assert preprocessor.process('notes.txt', io.BytesIO(b'hello'), 'text/plain')[1] == b'hello'
+
+    def test_upload_route_preprocesses(self, fake_upstream, monkeypatch):
+        """Test /api/upload forwards the normalized image"""
+        upstream = fake_upstream('a')
+        monkeypatch.setenv('SERVER_URL', upstream.url)
+        monkeypatch.setenv('UPLOAD_MAX_SIZE', '256')
+        from app_local import create_app
+
+        client = create_app(database_uri='sqlite:///:memory:').test_client()
+        original = _jpeg((1024, 768))
+        response = client.post('/api/upload', content_type='multipart/form-data',
+                               data={'file': (io.BytesIO(original), 'photo.jpg')})
+
+        assert response.status_code == 200
+        body = upstream.requests[-1]['body']
+        assert len(body) < len(original)
+        assert b'PhoneMaker' not in body
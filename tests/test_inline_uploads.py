@@ -0,0 +1,69 @@
+"""
+Tests for multipart /api/generate with inline image/mask uploads
+"""
+import io
+import json
+import sys
+import time
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+
+def _client(fake_upstream, monkeypatch):
+    upstream = fake_upstream('a')
+    monkeypatch.setenv('SERVER_URL', upstream.url)
+    monkeypatch.setenv('PREFETCH_RESULTS', 'false')
+    from app_local import create_app
+
+    return upstream, create_app(database_uri='sqlite:///:memory:').test_client()
+
+
+class TestInlineUploads:
+    """Test multipart /api/generate uploads files and submits in one request"""
+
+    def test_parallel_uploads_then_generate(self, fake_upstream, monkeypatch):
+        """Test image and mask upload concurrently and their paths reach the job"""
+        upstream, client = _client(fake_upstream, monkeypatch)
+
+        def upload(req):
+            time.sleep(0.3)
+            name = 'mask' if b'mask.png' in req['body'] else 'image'
+            return 200, {'status': 'success', 'path': f'a/{name}.png'}
+        upstream.routes[('POST', '/api/upload')] = upload
+
+        start = time.perf_counter()
+        response = client.post('/api/generate', content_type='multipart/form-data', data={
+            'payload': json.dumps({'mode': 'inpaint', 'prompt': 'fix'}),
+            'image': (io.BytesIO(b'img'), 'photo.png'),
+            'mask': (io.BytesIO(b'msk'), 'mask.png'),
+        })
+        elapsed = time.perf_counter() - start
+
+        assert response.get_json()['prompt_id'] == 'prompt-a'
+        assert elapsed < 0.55
+        submitted = json.loads(upstream.requests[-1]['body'])
+        assert submitted == {'mode': 'inpaint', 'prompt': 'fix', 'image': 'a/image.png', 'mask': 'a/mask.png'}
+
+    def test_failed_upload_returned(self, fake_upstream, monkeypatch):
+        """Test a failed upload stops the submission and keeps the upstream status"""
+        upstream, client = _client(fake_upstream, monkeypatch)
+        upstream.routes[('POST', '/api/upload')] = lambda req: (415, {'status': 'error', 'message': 'bad image'})
+
+        response = client.post('/api/generate', content_type='multipart/form-data', data={
+            'payload': '{"mode": "face_swap"}', 'image': (io.BytesIO(b'x'), 'x.gif'),
+        })
+        assert response.status_code == 415
+        assert not any(req['path'] == '/api/generate' for req in upstream.requests)
+
+    def test_invalid_payload_rejected(self, fake_upstream, monkeypatch):
+        """Test a malformed or non-object payload is a client error"""
+        upstream, client = _client(fake_upstream, monkeypatch)
+        for payload in ('{"mode": ', '["txt2img"]'):
+            response = client.post('/api/generate', content_type='multipart/form-data', data={
+                'payload': payload, 'image': (io.BytesIO(b'x'), 'x.png'),
+            })
+            assert response.status_code == 400
+            assert response.get_json() == {'error': 'payload 必须是JSON对象'}
+        assert not any(req['path'] in ('/api/upload', '/api/generate') for req in upstream.requests)
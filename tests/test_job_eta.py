@@ -0,0 +1,131 @@
+"""
+Tests for the per-job latency ledger and ETA predictor
+"""
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from sqlalchemy import Column, Float, Integer, MetaData, String, Table, create_engine
+
+from job_eta import job_key, observe, predict
+
+
+def _ledger():
+    engine = create_engine('sqlite://')
+    table = Table(
+        'job_eta', MetaData(),
+        Column('mode', String, primary_key=True),
+        Column('steps', Integer, primary_key=True),
+        Column('pixels', Integer, primary_key=True),
+        Column('count', Integer, nullable=False),
+        Column('total_ms', Float, nullable=False),
+        Column('run_count', Integer, nullable=False),
+        Column('run_ms', Float),
+    )
+    table.metadata.create_all(engine)
+    return engine.connect(), table
+
+
+def _client(upstream, monkeypatch):
+    upstream.routes[('POST', '/api/generate')] = lambda req: (200, {'job_id': 1, 'prompt_id': 'p1'})
+    monkeypatch.setenv('SERVER_URL', upstream.url)
+    monkeypatch.setenv('PREFETCH_RESULTS', 'false')
+    from app_local import create_app
+
+    app = create_app(database_uri='sqlite:///:memory:')
+    return app, app.test_client()
+
+
+class TestPredictor:
+    """Test the incremental moving average and lookup"""
+
+    def test_moving_average(self):
+        """Test samples are averaged and keyed by mode, steps and resolution"""
+        conn, table = _ledger()
+        meta = {'mode': 'txt2img', 'steps': 20, 'width': 1024, 'height': 1024}
+        assert job_key(meta) == ('txt2img', 20, 4)
+        assert predict(conn, table, meta) is None
+        observe(conn, table, meta, 1000, 800)
+        observe(conn, table, meta, 3000, None)
+        observe(conn, table, meta, 2000, 1200)
+        total, run = predict(conn, table, meta)
+        assert total == 2000
+        assert run == 1000
+        row = conn.execute(table.select()).one()
+        assert (row.count, row.run_count) == (3, 2)
+
+    def test_scales_run_time_by_steps(self):
+        """Test other step counts fall back to the nearest row scaled by steps"""
+        conn, table = _ledger()
+        observe(conn, table, {'mode': 'txt2img', 'steps': 10}, 3000, 2000)
+        assert predict(conn, table, {'mode': 'txt2img', 'steps': 20}) == (5000, 4000)
+        assert predict(conn, table, {'mode': 'img2img', 'steps': 10}) is None
+
+class TestEtaRoutes:
+    """Test timestamps are recorded and ETAs returned"""
+
+    def test_generate_and_result_report_eta(self, fake_upstream, monkeypatch):
+        """Test completed history yields ETAs and progress is recorded once"""
+        upstream = fake_upstream('a')
+        status = {'status': 'running'}
+        upstream.routes[('GET', '/api/result')] = lambda req: (200, status)
+        app, client = _client(upstream, monkeypatch)
+        params = {'mode': 'txt2img', 'prompt': '猫', 'steps': 4}
+
+        first = client.post('/api/generate', json=params).get_json()
+        assert 'eta_seconds' not in first
+        assert 'eta_seconds' not in client.get('/api/result?prompt_id=p1').get_json()
+        status['status'] = 'success'
+        client.get('/api/result?prompt_id=p1')
+
+        from app_local import JobEta, LocalJob, db
+
+        with app.app_context():
+            job = LocalJob.query.one()
+            assert job.submitted_at <= job.accepted_at <= job.first_progress_at <= job.completed_at
+            ledger = JobEta.query.one()
+            assert (ledger.mode, ledger.steps, ledger.count, ledger.run_count) == ('txt2img', 4, 1, 1)
+            ledger.total_ms, ledger.run_ms = 60000, 50000
+            db.session.commit()
+
+        upstream.routes[('POST', '/api/generate')] = lambda req: (200, {'job_id': 2, 'prompt_id': 'p2'})
+        status['status'] = 'queued'
+        second = client.post('/api/generate', json=params).get_json()
+        assert second['prompt_id'] == 'p2'
+        assert 50 < second['eta_seconds'] <= 60
+
+        status.update(status='running', error=None)
+        running = client.get('/api/result?prompt_id=p2').get_json()
+        assert running['status'] == 'running'
+        assert 40 < running['eta_seconds'] <= 50
+        client.get('/api/result?prompt_id=p2')
+        with app.app_context():
+            job = LocalJob.query.filter_by(prompt_id='p2').one()
+            assert job.first_progress_at is not None
+
+    def test_completed_job_updates_average(self, fake_upstream, monkeypatch):
+        """Test a finished job folds its total and run time into the ledger"""
+        upstream = fake_upstream('a')
+        upstream.routes[('GET', '/api/result')] = lambda req: (200, {'status': 'success', 'images': []})
+        app, client = _client(upstream, monkeypatch)
+        params = {'mode': 'txt2img', 'prompt': '猫', 'steps': 4}
+        client.post('/api/generate', json=params)
+
+        from app_local import JobEta, LocalJob, db
+
+        with app.app_context():
+            observe(db.session, JobEta.__table__, {'mode': 'txt2img', 'steps': 4}, 60000, 50000)
+            job = LocalJob.query.one()
+            now = datetime.utcnow()
+            job.submitted_at, job.first_progress_at = now - timedelta(seconds=10), now - timedelta(seconds=4)
+            db.session.commit()
+
+        client.get('/api/result?prompt_id=p1')
+        with app.app_context():
+            ledger = JobEta.query.one()
+            assert (ledger.count, ledger.run_count) == (2, 2)
+            assert 35000 <= ledger.total_ms < 35500
+            assert 27000 <= ledger.run_ms < 27500
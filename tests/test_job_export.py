@@ -0,0 +1,106 @@
+"""
+Tests for streaming job history export
+"""
+import csv
+import io
+import json
+import sys
+import zipfile
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+
+def make_app(monkeypatch, upstream_url='http://127.0.0.1:9'):
+    monkeypatch.setenv('SERVER_URL', upstream_url)
+    monkeypatch.setenv('PREFETCH_RESULTS', 'false')
+    from app_local import create_app
+
+    return create_app(database_uri='sqlite:///:memory:')
+
+
+def add_jobs(app, count, **fields):
+    from app_local import LocalJob, db
+
+    with app.app_context():
+        for i in range(count):
+            values = dict(type='txt2img', status='queued', prompt_id=f'p{i}', params=json.dumps({'prompt': f'第{i}张'}))
+            values.update(fields)
+            db.session.add(LocalJob(**values))
+        db.session.commit()
+
+
+class TestJobExport:
+    """Test /api/jobs/export"""
+
+    def test_ndjson_spans_batches(self, monkeypatch):
+        """Test every row is exported in id order across cursor batches"""
+        app = make_app(monkeypatch)
+        with app.test_client() as client:
+            client.get('/health')
+            add_jobs(app, 1203)
+            response = client.get('/api/jobs/export')
+            assert response.mimetype == 'application/x-ndjson'
+            rows = [json.loads(line) for line in response.data.decode('utf-8').splitlines()]
+
+        assert [row['id'] for row in rows] == list(range(1, 1204))
+        assert rows[5]['params'] == {'prompt': '第5张'}
+
+    def test_csv_with_filter(self, monkeypatch):
+        """Test CSV output honours the type filter"""
+        app = make_app(monkeypatch)
+        with app.test_client() as client:
+            client.get('/health')
+            add_jobs(app, 3)
+            add_jobs(app, 2, type='inpaint')
+            text = client.get('/api/jobs/export?format=csv&type=inpaint').data.decode('utf-8-sig')
+
+        rows = list(csv.DictReader(io.StringIO(text)))
+        assert len(rows) == 2
+        assert {row['type'] for row in rows} == {'inpaint'}
+
+    def test_rejects_unknown_format(self, monkeypatch):
+        """Test unsupported formats return 400"""
+        app = make_app(monkeypatch)
+        with app.test_client() as client:
+            assert client.get('/api/jobs/export?format=xml').status_code == 400
+
+    def test_zip_includes_outputs(self, fake_upstream, monkeypatch):
+        """Test the ZIP archive carries the manifest and output images"""
+        upstream = fake_upstream('a')
+        app = make_app(monkeypatch, upstream.url)
+        with app.test_client() as client:
+            client.get('/health')
+            add_jobs(app, 1, status='completed', backend=upstream.url,
+                     outputs=json.dumps([{'filename': 'a.png', 'type': 'output', 'subfolder': ''}]))
+            data = client.get('/api/jobs/export?format=zip').data
+
+        archive = zipfile.ZipFile(io.BytesIO(data))
+        assert archive.testzip() is None
+        assert archive.read('images/1_a.png') == b'image-from-a'
+        assert json.loads(archive.read('jobs.ndjson').splitlines()[0])['prompt_id'] == 'p0'
+
+    def test_zip_entry_names_sanitized(self):
+        """Test upstream filenames cannot place entries outside the images folder"""
+        from job_export import zip_stream
+
+        rows = [{'id': 1, 'outputs': [{'filename': '../../etc/evil.png'}, {'filename': 'sub\\..\\b.png'},
+                                      {'filename': 'a/x.png'}, {'filename': 'b/x.png'}]}]
+        data = b''.join(zip_stream(lambda: rows, lambda row, image: [image['filename'].encode()]))
+        archive = zipfile.ZipFile(io.BytesIO(data))
+        assert archive.namelist() == ['jobs.ndjson', 'images/1_evil.png', 'images/1_b.png',
+                                      'images/1_x.png', 'images/1_3_x.png']
+        assert archive.read('images/1_3_x.png') == b'b/x.png'
+
+    def test_zero_max_id_exports_nothing(self, monkeypatch):
+        """Test an export bounded by max_id=0 does not fall back to every row"""
+        from app_local import LocalJob, db
+        from job_export import iter_job_rows
+
+        app = make_app(monkeypatch)
+        with app.app_context():
+            db.create_all()
+        add_jobs(app, 3)
+        with app.app_context():
+            assert list(iter_job_rows(db.engine, LocalJob.__table__, {'max_id': 0})) == []
@@ -0,0 +1,96 @@
+"""
+Tests for asynchronous 202 submission through the job outbox
+"""
+import json
+import sys
+import time
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+
+def _app(upstream, monkeypatch, db_path):
+    monkeypatch.setenv('SERVER_URL', upstream.url)
+    monkeypatch.setenv('PREFETCH_RESULTS', 'false')
+    monkeypatch.setenv('ASYNC_SUBMIT', 'true')
+    from app_local import create_app
+
+    app = create_app(database_uri=f'sqlite:///{db_path}')
+    client = app.test_client()
+    client.get('/health')
+    app.extensions['outbox_dispatcher'].backoff = 0.01
+    return client
+
+
+def _poll(client, local_id, until, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        body = client.get(f'/api/result?local_id={local_id}').get_json()
+        if body['status'] in until or time.monotonic() > deadline:
+            return body
+        time.sleep(0.02)
+
+
+class TestAsyncSubmit:
+    """Test generate returns 202 and jobs are submitted in the background"""
+
+    def test_accepted_then_submitted_with_retries(self, fake_upstream, monkeypatch, tmp_path):
+        """Test a job survives upstream errors and its result is reachable by local id"""
+        upstream = fake_upstream('a')
+        attempts = []
+
+        def generate(req):
+            attempts.append(json.loads(req['body']))
+            if len(attempts) < 3:
+                return 503, b'busy', 'text/plain'
+            return 200, {'job_id': 9, 'prompt_id': 'prompt-9'}
+        upstream.routes[('POST', '/api/generate')] = generate
+        client = _app(upstream, monkeypatch, tmp_path / 'jobs.db')
+
+        response = client.post('/api/generate', json={'mode': 'txt2img', 'prompt': '猫', 'steps': 4})
+        assert response.status_code == 202
+        local_id = response.get_json()['local_id']
+        assert response.headers['Location'] == f'/api/result?local_id={local_id}'
+
+        body = _poll(client, local_id, ('success',))
+        assert body['status'] == 'success'
+        assert attempts == [{'mode': 'txt2img', 'prompt': '猫', 'steps': 4}] * 3
+        job = client.get('/api/jobs').get_json()[0]
+        assert (job['prompt_id'], job['status']) == ('prompt-9', 'completed')
+
+    def test_rejected_job_reports_error(self, fake_upstream, monkeypatch, tmp_path):
+        """Test a 4xx from upstream fails the job without retrying"""
+        upstream = fake_upstream('a')
+        upstream.routes[('POST', '/api/generate')] = lambda req: (400, {'error': 'bad mode'})
+        client = _app(upstream, monkeypatch, tmp_path / 'jobs.db')
+
+        local_id = client.post('/api/generate', json={'mode': 'nope'}).get_json()['local_id']
+        body = _poll(client, local_id, ('error',))
+        assert body['status'] == 'error' and 'bad mode' in body['message']
+        assert sum(req['path'] == '/api/generate' for req in upstream.requests) == 1
+        assert client.get('/api/result?local_id=999').status_code == 404
+
+    def test_outbox_survives_restart(self, fake_upstream, monkeypatch, tmp_path):
+        """Test jobs left in the outbox are submitted by the next process"""
+        down = fake_upstream('a')
+        down.routes[('POST', '/api/generate')] = lambda req: (502, b'down', 'text/plain')
+        first = _app(down, monkeypatch, tmp_path / 'jobs.db')
+        first.application.extensions['outbox_dispatcher'].max_attempts = 100
+        first.application.extensions['outbox_dispatcher'].backoff = 60
+        local_id = first.post('/api/generate', json={'mode': 'txt2img'}).get_json()['local_id']
+
+        # 第一次提交失败后第一个进程退出，新进程（另一个后端）启动时接手到期的条目
+        from app_local import JobOutbox, db
+        with first.application.app_context():
+            deadline = time.monotonic() + 5
+            while JobOutbox.query.one().last_error is None and time.monotonic() < deadline:
+                db.session.rollback()
+                time.sleep(0.02)
+            first.application.extensions['outbox_dispatcher'].workers = 0
+            assert _poll(first, local_id, ('pending',))['attempts'] == 1
+            db.session.execute(db.update(JobOutbox).values(next_attempt_at=0, lease_until=0))
+            db.session.commit()
+        up = fake_upstream('b')
+        second = _app(up, monkeypatch, tmp_path / 'jobs.db')
+        assert _poll(second, local_id, ('success',))['status'] == 'success'
@@ -0,0 +1,89 @@
+"""
+Tests for compact, deduplicated job params storage
+"""
+import json
+import sqlite3
+import sys
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from job_params import compact_legacy_params, decode_params, encode_body, split_params
+
+
+class TestParamsEncoding:
+    """Test splitting, compressing and restoring params"""
+
+    def test_round_trip(self):
+        """Test hot fields and the compressed body restore the original payload"""
+        data = {'mode': 'txt2img', 'prompt': '山水画 ' * 50, 'width': '512', 'seed': 42, 'cfg': 7.5}
+        meta, rest = split_params(data)
+        assert meta == {'mode': 'txt2img', 'width': 512, 'seed': 42}
+        _, body = encode_body(rest)
+        assert len(body) < len(json.dumps(rest, ensure_ascii=False).encode())
+        assert decode_params(json.dumps(meta), body) == dict(data, width=512)
+
+    def test_seed_does_not_affect_digest(self):
+        """Test jobs differing only in hot fields share one params body"""
+        first = encode_body(split_params({'prompt': 'cat', 'seed': 1, 'steps': 20})[1])
+        second = encode_body(split_params({'prompt': 'cat', 'seed': 2, 'steps': 30})[1])
+        assert first == second
+
+    def test_legacy_text(self):
+        """Test rows written before compact storage still decode"""
+        assert decode_params(None, None, '{"prompt": "cat"}') == {'prompt': 'cat'}
+        assert decode_params(None, None, None) is None
+
+
+class TestParamsStorage:
+    """Test jobs store params compactly and filter through indexed columns"""
+
+    def test_generate_dedups_and_filters(self, fake_upstream, monkeypatch, tmp_path):
+        """Test repeated prompts store one body and mode/width filters use indexes"""
+        upstream = fake_upstream('a')
+        monkeypatch.setenv('SERVER_URL', upstream.url)
+        monkeypatch.setenv('PREFETCH_RESULTS', 'false')
+        from app_local import JobParams, LocalJob, create_app, db
+
+        app = create_app(database_uri=f"sqlite:///{tmp_path / 'jobs.db'}")
+        with app.test_client() as client:
+            for seed, width in ((1, 512), (2, 512), (3, 768)):
+                payload = {'mode': 'txt2img', 'prompt': 'a cat', 'seed': seed, 'width': width}
+                assert client.post('/api/generate', json=payload).status_code == 200
+            jobs = client.get('/api/jobs?mode=txt2img&width=512').get_json()
+            exported = [json.loads(line) for line in client.get('/api/jobs/export').data.splitlines()]
+
+        assert len(jobs) == 2 and all(job['width'] == 512 for job in jobs)
+        assert sorted(row['params']['seed'] for row in exported) == [1, 2, 3]
+        assert exported[0]['params']['prompt'] == 'a cat'
+        with app.app_context():
+            assert JobParams.query.count() == 1
+            assert LocalJob.query.first().get_params()['width'] == 512
+            with db.engine.connect() as conn:
+                plan = conn.exec_driver_sql(
+                    "EXPLAIN QUERY PLAN SELECT id FROM local_jobs WHERE param_width = 512").all()
+        assert 'ix_local_jobs_param_width' in ' '.join(str(row) for row in plan)
+
+    def test_legacy_rows_compacted(self, tmp_path):
+        """Test old params text migrates to compact storage on upgraded databases"""
+        from app_local import JobParams, LocalJob, create_app, db, init_database
+
+        db_file = tmp_path / 'old.db'
+        conn = sqlite3.connect(str(db_file))
+        conn.execute("""CREATE TABLE local_jobs (id INTEGER PRIMARY KEY, remote_job_id INTEGER, type VARCHAR(50),
+                        params TEXT, status VARCHAR(20), prompt_id VARCHAR(64), created_at TIMESTAMP)""")
+        conn.executemany("INSERT INTO local_jobs (type, params) VALUES (?, ?)",
+                         [('img2img', json.dumps({'mode': 'img2img', 'steps': 20, 'prompt': 'dog'})),
+                          ('unknown', 'not json')])
+        conn.commit()
+        conn.close()
+
+        app = create_app(database_uri=f'sqlite:///{db_file}')
+        init_database(app)
+        with app.app_context():
+            compact_legacy_params(db.engine, LocalJob.__table__, JobParams.__table__, pause=0)
+            migrated, broken = LocalJob.query.order_by(LocalJob.id).all()
+            assert migrated.params is None and migrated.param_steps == 20
+            assert migrated.get_params() == {'mode': 'img2img', 'steps': 20, 'prompt': 'dog'}
+            assert broken.params == 'not json' and broken.get_params() == 'not json'
@@ -0,0 +1,139 @@
+"""
+Tests for archiving and compacting old jobs
+"""
+import gzip
+import json
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from job_retention import AUTO_VACUUM_INCREMENTAL, RetentionWorker
+
+
+def _app_with_jobs(tmp_path, ages):
+    from app_local import LocalJob, create_app, db, init_database
+
+    app = create_app(database_uri=f"sqlite:///{tmp_path / 'jobs.db'}")
+    init_database(app)
+    with app.app_context():
+        now = datetime.utcnow()
+        for age in ages:
+            db.session.add(LocalJob(type='image', status='completed', params='x' * 2000,
+                                    created_at=now - timedelta(days=age)))
+        db.session.commit()
+    return app
+
+
+class TestRetentionWorker:
+    """Test old jobs are archived, deleted and their space reclaimed"""
+
+    def test_archive_and_delete_in_batches(self, tmp_path):
+        """Test rows past the cutoff move to the archive and newer rows stay"""
+        from app_local import LocalJob, db
+
+        app = _app_with_jobs(tmp_path, [40] * 5 + [1] * 2)
+        with app.app_context():
+            worker = RetentionWorker(db.engine, LocalJob.__table__, 30, tmp_path / 'archive',
+                                     batch_size=2, pause=0)
+            archived, _ = worker.run_once()
+            remaining = LocalJob.query.count()
+
+        assert archived == 5
+        assert remaining == 2
+        lines = []
+        for path in (tmp_path / 'archive').glob('local_jobs-*.ndjson.gz'):
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                lines += [json.loads(line) for line in f]
+        assert sorted(row['id'] for row in lines) == [1, 2, 3, 4, 5]
+
+    def test_space_reclaimed_incrementally(self, tmp_path):
+        """Test freed pages are returned after deleting old rows"""
+        from app_local import LocalJob, db
+
+        app = _app_with_jobs(tmp_path, [40] * 50)
+        with app.app_context():
+            worker = RetentionWorker(db.engine, LocalJob.__table__, 30, tmp_path / 'archive',
+                                     vacuum_pages=4, pause=0)
+            assert worker.ensure_incremental()
+            _, reclaimed = worker.run_once()
+            with db.engine.connect() as conn:
+                assert conn.exec_driver_sql('PRAGMA auto_vacuum').scalar() == AUTO_VACUUM_INCREMENTAL
+                assert conn.exec_driver_sql('PRAGMA freelist_count').scalar() == 0
+
+        assert reclaimed > 0
+
+    def test_orphaned_params_deleted(self, tmp_path):
+        """Test parameters only referenced by archived jobs are removed"""
+        from app_local import JobParams, LocalJob, db
+
+        app = _app_with_jobs(tmp_path, [])
+        now = datetime.utcnow()
+        with app.app_context():
+            for age, prompt in ((40, 'old'), (40, 'shared'), (1, 'shared')):
+                job = LocalJob(type='image', status='completed', created_at=now - timedelta(days=age))
+                job.set_params({'mode': 'txt2img', 'prompt': prompt})
+                db.session.add(job)
+                db.session.commit()
+            assert JobParams.query.count() == 2
+
+            worker = RetentionWorker(db.engine, LocalJob.__table__, 30, tmp_path / 'archive',
+                                     pause=0, params_table=JobParams.__table__)
+            assert worker.run_once()[0] == 2
+            job = LocalJob.query.one()
+            assert [params.id for params in JobParams.query.all()] == [job.params_id]
+            assert job.get_params()['prompt'] == 'shared'
+
+    def test_one_worker_per_interval(self, tmp_path):
+        """Test processes sharing a cache take turns instead of archiving concurrently"""
+        from app_local import LocalJob
+        from shared_cache import SharedCache
+
+        workers = [RetentionWorker(None, LocalJob.__table__, 30, tmp_path / 'archive',
+                                   cache=SharedCache(str(tmp_path / 'cache.db')))
+                   for _ in range(2)]
+        assert [worker.claim(0.05) for worker in workers] == [True, False]
+        time.sleep(0.06)
+        assert workers[1].claim(0.05)
+        assert RetentionWorker(None, LocalJob.__table__, 30, tmp_path / 'archive').claim(0.05)
+
+    def test_sqlite_settings_opt_in(self, tmp_path, monkeypatch):
+        """Test journal and vacuum modes are left alone unless retention or WAL is enabled"""
+        from app_local import create_app, db, init_database
+
+        for env, expected in (({}, ('delete', 0)), ({'SQLITE_WAL': 'true'}, ('wal', 0))):
+            for name, value in env.items():
+                monkeypatch.setenv(name, value)
+            app = create_app(database_uri=f"sqlite:///{tmp_path / (str(len(env)) + '.db')}")
+            init_database(app)
+            with app.app_context(), db.engine.connect() as conn:
+                modes = (conn.exec_driver_sql('PRAGMA journal_mode').scalar(),
+                         conn.exec_driver_sql('PRAGMA auto_vacuum').scalar())
+            assert modes == expected
+
+    def test_archived_outputs_removed(self, tmp_path):
+        """Test prefetched outputs of archived jobs are deleted with the rows"""
+        from app_local import LocalJob, db, remove_job_files
+        from result_prefetch import ResultPrefetcher
+
+        app = _app_with_jobs(tmp_path, [])
+        prefetcher = ResultPrefetcher(None, str(tmp_path / 'downloads'), max_workers=1)
+        app.extensions['result_prefetcher'] = prefetcher
+        image = {'filename': 'a.png', 'type': 'output'}
+        with app.app_context():
+            for age in (40, 1):
+                db.session.add(LocalJob(type='txt2img', status='completed', backend=f'http://gpu{age}',
+                                        outputs=json.dumps([image]), created_at=datetime.utcnow() - timedelta(days=age)))
+            db.session.commit()
+            paths = [prefetcher.local_path(f'http://gpu{age}', ('output', '', 'a.png')) for age in (40, 1)]
+            for path in paths:
+                path.parent.mkdir(parents=True)
+                path.write_bytes(b'png')
+
+            worker = RetentionWorker(db.engine, LocalJob.__table__, 30, tmp_path / 'archive', pause=0,
+                                     on_deleted=lambda rows: remove_job_files(app, rows))
+            assert worker.run_once()[0] == 1
+        assert [path.exists() for path in paths] == [False, True]
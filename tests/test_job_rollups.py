@@ -0,0 +1,72 @@
+"""
+Tests for trigger-maintained usage rollups and /api/stats
+"""
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from job_rollups import OVERFLOW_MS, latency_percentiles
+
+
+class TestLatencyPercentiles:
+    """Test percentile estimates from the latency histogram"""
+
+    def test_interpolates_within_bucket(self):
+        """Test ranks are interpolated between bucket bounds"""
+        result = latency_percentiles({1000: 50, 2000: 50})
+        assert result['count'] == 100
+        assert result['p50_ms'] == 1000
+        assert 1000 < result['p90_ms'] <= 2000
+
+    def test_overflow_and_empty(self):
+        """Test overflow reports the largest bound and empty histograms report None"""
+        assert latency_percentiles({OVERFLOW_MS: 1})['p99_ms'] == 3600000
+        assert latency_percentiles({})['p50_ms'] is None
+
+
+class TestStatsApi:
+    """Test rollups follow inserts and status changes"""
+
+    def test_counts_and_latency(self, fake_upstream, monkeypatch):
+        """Test generated and finished jobs show up in hourly and daily stats"""
+        upstream = fake_upstream('a')
+        monkeypatch.setenv('SERVER_URL', upstream.url)
+        monkeypatch.setenv('PREFETCH_RESULTS', 'false')
+        from app_local import create_app
+
+        app = create_app(database_uri='sqlite:///:memory:')
+        with app.test_client() as client:
+            for _ in range(3):
+                client.post('/api/generate', json={'mode': 'txt2img'})
+            client.get('/api/result?prompt_id=prompt-a')
+            hourly = client.get('/api/stats').get_json()
+            daily = client.get('/api/stats?period=day&type=txt2img').get_json()
+            assert client.get('/api/stats?period=week').status_code == 400
+
+        for stats in (hourly, daily):
+            assert stats['totals'] == {'txt2img': {'queued': 2, 'completed': 1}}
+            assert stats['latency']['txt2img']['count'] == 1
+
+    def test_backfill_existing_jobs(self, tmp_path):
+        """Test jobs stored before the rollups existed are counted once"""
+        import sqlite3
+        from app_local import create_app
+
+        db_file = tmp_path / 'old.db'
+        created = datetime.utcnow() - timedelta(hours=2)
+        conn = sqlite3.connect(str(db_file))
+        conn.execute("""CREATE TABLE local_jobs (id INTEGER PRIMARY KEY, remote_job_id INTEGER, type VARCHAR(50),
+                        params TEXT, status VARCHAR(20), prompt_id VARCHAR(64), created_at TIMESTAMP)""")
+        conn.executemany("INSERT INTO local_jobs (type, status, created_at) VALUES (?, ?, ?)",
+                         [('video', 'failed', created.isoformat(sep=' '))] * 4)
+        conn.commit()
+        conn.close()
+
+        for _ in range(2):
+            app = create_app(database_uri=f'sqlite:///{db_file}')
+            with app.test_client() as client:
+                stats = client.get('/api/stats').get_json()
+            assert stats['totals'] == {'video': {'failed': 4}}
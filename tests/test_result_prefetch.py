@@ -0,0 +1,82 @@
+"""
+Tests for eager result prefetch into local storage
+"""
+import json
+import sys
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from upstream_pool import backend_tag
+
+
+class TestResultPrefetch:
+    """Test completed job outputs are served from local disk"""
+
+    def test_view_served_from_disk_after_completion(self, fake_upstream, monkeypatch, tmp_path):
+        """Test the first view after completion does not reach the upstream"""
+        upstream = fake_upstream('a')
+        monkeypatch.setenv('SERVER_URL', upstream.url)
+        monkeypatch.setenv('DOWNLOAD_DIR', str(tmp_path))
+        from app_local import LocalJob, create_app
+
+        app = create_app(database_uri='sqlite:///:memory:')
+        with app.test_client() as client:
+            client.post('/api/generate', json={'mode': 'txt2img'})
+            client.get('/api/result?prompt_id=prompt-a')
+
+            url = client.get('/api/result?prompt_id=prompt-a').get_json()['images'][0]['url']
+
+            prefetcher = app.extensions['result_prefetcher']
+            local = tmp_path / backend_tag(upstream.url) / 'output' / 'a.png'
+            assert prefetcher.lookup(upstream.url, ('output', '', 'a.png'), wait=5) == local
+
+            views_before = len([r for r in upstream.requests if r['path'] == '/api/proxy/view'])
+            response = client.get(url)
+            assert response.data == b'image-from-a'
+            response.close()
+            views_after = len([r for r in upstream.requests if r['path'] == '/api/proxy/view'])
+            assert views_after == views_before
+
+        with app.app_context():
+            job = LocalJob.query.filter_by(prompt_id='prompt-a').one()
+            assert job.status == 'completed'
+            assert job.completed_at is not None
+            assert json.loads(job.outputs)[0]['filename'] == 'a.png'
+
+    def test_unsafe_paths_rejected(self, tmp_path):
+        """Test filenames cannot escape the download directory"""
+        from result_prefetch import ResultPrefetcher
+
+        prefetcher = ResultPrefetcher(None, str(tmp_path), max_workers=1)
+        assert prefetcher.local_path('http://a', ('output', '..', 'x.png')) is None
+        assert prefetcher.local_path('http://a', ('output', '', '../../etc/passwd')) is None
+
+    def test_same_filename_on_two_backends(self, fake_upstream, monkeypatch, tmp_path):
+        """Test identically named outputs from different backends stay separate"""
+        backends = [fake_upstream('a'), fake_upstream('b')]
+        for upstream in backends:
+            name = upstream.name
+            upstream.routes[('GET', '/api/result')] = lambda req: (200, {
+                'status': 'success',
+                'images': [{'filename': 'ComfyUI_00001_.png', 'url': '/api/proxy/view?filename=ComfyUI_00001_.png&type=output'}],
+            })
+            upstream.routes[('GET', '/api/proxy/view')] = lambda req, name=name: (200, f'image-from-{name}'.encode(), 'image/png')
+        monkeypatch.setenv('SERVER_URL', ','.join(upstream.url for upstream in backends))
+        monkeypatch.setenv('DOWNLOAD_DIR', str(tmp_path))
+        from app_local import create_app
+
+        app = create_app(database_uri='sqlite:///:memory:')
+        with app.test_client() as client:
+            prompt_ids = [client.post('/api/generate', json={'mode': 'txt2img'}).get_json()['prompt_id']
+                          for _ in range(2)]
+            urls = {prompt_id: client.get(f'/api/result?prompt_id={prompt_id}').get_json()['images'][0]['url']
+                    for prompt_id in prompt_ids}
+            prefetcher = app.extensions['result_prefetcher']
+            for upstream in backends:
+                assert prefetcher.lookup(upstream.url, ('output', '', 'ComfyUI_00001_.png'), wait=5)
+            for prompt_id, url in urls.items():
+                response = client.get(url)
+                assert response.data == f"image-from-{prompt_id.split('-')[1]}".encode()
+                response.close()
@@ -0,0 +1,52 @@
+"""
+Tests for Server-Timing header and slow request profiler
+"""
+import sys
+import time
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+import server_timing
+
+
+class TestServerTiming:
+    """Test Server-Timing header generation"""
+
+    def test_format_header(self):
+        """Test phases are rendered with duration and description"""
+        header = server_timing.format_header({'ttfb': 12.345, 'custom': 1})
+        assert 'ttfb;dur=12.3;desc="upstream ttfb"' in header
+        assert 'custom;dur=1.0' in header
+
+    def test_response_has_server_timing(self):
+        """Test every response carries a Server-Timing header"""
+        from app_local import app
+
+        with app.test_client() as client:
+            response = client.get('/health')
+            assert 'total;dur=' in response.headers['Server-Timing']
+
+
+class TestSlowRequestProfiler:
+    """Test slow request sampling profiler"""
+
+    def test_profile_written_and_rotated(self, tmp_path):
+        """Test slow requests produce folded stacks and old files are pruned"""
+        profiler = server_timing.SlowRequestProfiler(10, str(tmp_path), keep=2, interval_ms=1)
+        for _ in range(3):
+            profiler.begin()
+            time.sleep(0.05)
+            assert profiler.end(50, 'GET_/api/result') is not None
+
+        files = list(tmp_path.glob('*.folded'))
+        assert len(files) == 2
+        assert 'test_server_timing.py' in files[0].read_text(encoding='utf-8')
+
+    def test_fast_request_not_written(self, tmp_path):
+        """Test requests under the threshold are discarded"""
+        profiler = server_timing.SlowRequestProfiler(1000, str(tmp_path))
+        profiler.begin()
+        assert profiler.end(5, 'GET_/health') is None
+        assert not list(tmp_path.iterdir())
@@ -0,0 +1,117 @@
+"""
+Tests for the cross-worker shared cache tier
+"""
+import io
+import sys
+import time
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from shared_cache import LocalCache, SharedCache
+
+
+def _app(fake_upstream, monkeypatch, cache_path):
+    monkeypatch.setenv('SERVER_URL', fake_upstream.url)
+    monkeypatch.setenv('PREFETCH_RESULTS', 'false')
+    monkeypatch.setenv('UPLOAD_PREPROCESS', 'false')
+    monkeypatch.setenv('SHARED_CACHE_PATH', str(cache_path))
+    from app_local import create_app
+
+    return create_app(database_uri='sqlite:///:memory:').test_client()
+
+
+class TestCacheSemantics:
+    """Test get/set/add/ttl behave the same for both cache tiers"""
+
+    def test_local_and_shared(self, tmp_path):
+        """Test values expire and add only succeeds once per ttl"""
+        for cache in (LocalCache(), SharedCache(str(tmp_path / 'cache.db'))):
+            cache.set('a', {'x': 1})
+            assert cache.get('a') == {'x': 1}
+            assert cache.get('missing', 'default') == 'default'
+
+            assert cache.add('lock', 1, ttl=0.05)
+            assert not cache.add('lock', 2, ttl=0.05)
+            time.sleep(0.06)
+            assert cache.get('lock') is None
+            assert cache.add('lock', 3, ttl=10)
+            assert cache.get('lock') == 3
+
+            assert cache.delete('a')
+            assert cache.get('a') is None
+            assert not cache.delete('a')
+
+            cache.set('jobs:http://a:p1', 1)
+            cache.set('jobs:http://a:p2', 1, ttl=-1)
+            cache.set('jobs:http://ab:p3', 1)
+            assert cache.count('jobs:http://a:') == 1
+
+    def test_eviction(self, tmp_path):
+        """Test the shared cache is trimmed back to max_entries"""
+        cache = SharedCache(str(tmp_path / 'cache.db'), max_entries=50, evict_every=10)
+        for i in range(200):
+            cache.set(f'k{i}', i, ttl=1000 + i)
+        count = cache._conn().execute('SELECT COUNT(*) FROM kv').fetchone()[0]
+        assert count <= 50
+        assert cache.get('k199') == 199
+
+    def test_shared_between_instances(self, tmp_path):
+        """Test two handles on the same file see each other's writes quickly"""
+        path = str(tmp_path / 'cache.db')
+        first, second = SharedCache(path), SharedCache(path)
+        first.set('pin:p-1', 'http://a')
+        assert second.get('pin:p-1') == 'http://a'
+        assert not second.add('pin:p-1', 'http://b')
+
+        start = time.perf_counter()
+        for _ in range(1000):
+            second.get('pin:p-1')
+        assert (time.perf_counter() - start) / 1000 < 0.001
+
+
+class TestWorkerSharing:
+    """Test app instances sharing a cache file act as one deployment"""
+
+    def test_pin_and_result_shared(self, fake_upstream, monkeypatch, tmp_path):
+        """Test a job submitted in one worker is polled in another from the cache"""
+        upstream = fake_upstream('a')
+        upstream.routes[('GET', '/api/result')] = lambda req: (200, {'status': 'success', 'images': []})
+        worker_a = _app(upstream, monkeypatch, tmp_path / 'cache.db')
+        worker_b = _app(upstream, monkeypatch, tmp_path / 'cache.db')
+
+        assert worker_a.post('/api/generate', json={'mode': 'txt2img'}).get_json()['prompt_id'] == 'prompt-a'
+        assert worker_b.application.extensions['shared_cache'].get('pin:prompt-a') == upstream.url
+
+        assert worker_b.get('/api/result?prompt_id=prompt-a').get_json()['status'] == 'success'
+        polls = sum(req['path'] == '/api/result' for req in upstream.requests)
+        assert worker_a.get('/api/result?prompt_id=prompt-a').get_json()['status'] == 'success'
+        assert sum(req['path'] == '/api/result' for req in upstream.requests) == polls
+
+    def test_cached_result_releases_outstanding(self, fake_upstream, monkeypatch, tmp_path):
+        """Test a worker served a cached result stops counting the job as outstanding"""
+        upstream = fake_upstream('a')
+        upstream.routes[('GET', '/api/result')] = lambda req: (200, {'status': 'success', 'images': []})
+        worker_a = _app(upstream, monkeypatch, tmp_path / 'cache.db')
+        worker_b = _app(upstream, monkeypatch, tmp_path / 'cache.db')
+
+        worker_a.post('/api/generate', json={'mode': 'txt2img'})
+        backend = worker_a.application.extensions['api_client'].pool.backends[0]
+        assert backend.outstanding() == 1
+        worker_b.get('/api/result?prompt_id=prompt-a')
+        worker_a.get('/api/result?prompt_id=prompt-a')
+        assert backend.outstanding() == 0
+
+    def test_same_upload_sent_once(self, fake_upstream, monkeypatch, tmp_path):
+        """Test identical files uploaded through different workers reach upstream once"""
+        upstream = fake_upstream('a')
+        upstream.routes[('POST', '/api/upload')] = lambda req: (200, {'status': 'success', 'path': 'a/cat.png'})
+        worker_a = _app(upstream, monkeypatch, tmp_path / 'cache.db')
+        worker_b = _app(upstream, monkeypatch, tmp_path / 'cache.db')
+
+        for worker in (worker_a, worker_b):
+            response = worker.post('/api/upload', content_type='multipart/form-data',
+                                   data={'file': (io.BytesIO(b'same bytes'), 'cat.png')})
+            assert response.get_json()['path'] == 'a/cat.png'
+        assert sum(req['path'] == '/api/upload' for req in upstream.requests) == 1
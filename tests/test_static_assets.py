@@ -0,0 +1,74 @@
+"""
+Tests for fingerprinted, precompressed static assets
+"""
+import gzip
+import sys
+from pathlib import Path
+
+from flask import Flask
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+import build_static
+import static_assets
+
+
+def build_into(tmp_path, monkeypatch):
+    """Build a small static tree under tmp_path"""
+    static_dir = tmp_path / 'static'
+    (static_dir / 'js').mkdir(parents=True)
+    (static_dir / 'js' / 'app.js').write_text('console.log("hello");\n' * 100, encoding='utf-8')
+    monkeypatch.setattr(build_static, 'STATIC_DIR', static_dir)
+    monkeypatch.setattr(build_static, 'DIST_DIR', static_dir / 'dist')
+    return static_dir, build_static.build()
+
+
+class TestBuildStatic:
+    """Test the static asset build step"""
+
+    def test_fingerprint_and_precompress(self, tmp_path, monkeypatch):
+        """Test assets are content-hashed and gzip variants are generated"""
+        static_dir, manifest = build_into(tmp_path, monkeypatch)
+
+        hashed = manifest['js/app.js']
+        assert hashed.startswith('dist/js/app.') and hashed.endswith('.js')
+        original = (static_dir / 'js' / 'app.js').read_bytes()
+        assert gzip.decompress((static_dir / (hashed + '.gz')).read_bytes()) == original
+
+
+class TestStaticServing:
+    """Test fingerprinted asset serving"""
+
+    def test_negotiates_precompressed_variant(self, tmp_path, monkeypatch):
+        """Test gzip variant is served with immutable caching"""
+        static_dir, manifest = build_into(tmp_path, monkeypatch)
+        app = Flask(__name__, static_folder=str(static_dir))
+        static_assets.init_app(app)
+
+        with app.test_request_context():
+            url = app.jinja_env.globals['asset_url']('js/app.js')
+        assert url == '/static/' + manifest['js/app.js']
+
+        with app.test_client() as client:
+            response = client.get(url, headers={'Accept-Encoding': 'gzip'})
+            assert response.headers['Content-Encoding'] == 'gzip'
+            assert 'immutable' in response.headers['Cache-Control']
+            assert 'Accept-Encoding' in response.headers['Vary']
+            response.close()
+
+            plain = client.get(url, headers={'Accept-Encoding': 'identity'})
+            assert 'Content-Encoding' not in plain.headers
+            plain.close()
+
+    def test_index_etag(self):
+        """Test the index page is served with an ETag and honours If-None-Match"""
+        from app_local import app
+
+        with app.test_client() as client:
+            response = client.get('/')
+            assert response.status_code == 200
+            etag = response.headers['ETag']
+
+            cached = client.get('/', headers={'If-None-Match': etag})
+            assert cached.status_code == 304
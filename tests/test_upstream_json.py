@@ -0,0 +1,63 @@
+"""
+Tests for raw-bytes JSON passthrough in the proxy routes
+"""
+import json
+import sys
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+import upstream_json
+
+
+def _client(fake_upstream, monkeypatch):
+    upstream = fake_upstream('a')
+    monkeypatch.setenv('SERVER_URL', upstream.url)
+    monkeypatch.setenv('PREFETCH_RESULTS', 'false')
+    from app_local import create_app
+
+    return upstream, create_app(database_uri='sqlite:///:memory:').test_client()
+
+
+class TestPassthrough:
+    """Test upstream bodies and statuses reach the client unchanged"""
+
+    def test_body_bytes_unchanged(self, fake_upstream, monkeypatch):
+        """Test the upstream JSON is forwarded byte for byte"""
+        upstream, client = _client(fake_upstream, monkeypatch)
+        raw = b'{"job_id": 7,   "prompt_id": "p-7", "note": "\\u4e2d"}'
+        upstream.routes[('POST', '/api/generate')] = lambda req: (200, raw, 'application/json; charset=utf-8')
+
+        response = client.post('/api/generate', json={'mode': 'txt2img'})
+        assert response.data == raw
+        assert response.headers['Content-Type'] == 'application/json; charset=utf-8'
+        assert client.get('/api/jobs').get_json()[0]['prompt_id'] == 'p-7'
+
+    def test_error_status_preserved(self, fake_upstream, monkeypatch):
+        """Test upstream errors keep their status, including non-JSON bodies"""
+        upstream, client = _client(fake_upstream, monkeypatch)
+        upstream.routes[('POST', '/api/generate')] = lambda req: (503, b'busy', 'text/plain')
+        upstream.routes[('POST', '/api/upload')] = lambda req: (413, {'error': 'too large'})
+
+        response = client.post('/api/generate', json={'mode': 'txt2img'})
+        assert (response.status_code, response.data) == (503, b'busy')
+        response = client.post('/api/upload')
+        assert (response.status_code, response.get_json()) == (413, {'error': 'too large'})
+
+    def test_pending_result_not_parsed(self, fake_upstream, monkeypatch):
+        """Test polling responses without a final status skip JSON parsing"""
+        upstream, client = _client(fake_upstream, monkeypatch)
+        upstream.routes[('GET', '/api/result')] = lambda req: (200, {'status': 'pending'})
+
+        def fail(data):
+            raise AssertionError('parsed a pending result')
+        monkeypatch.setattr(upstream_json, 'loads', fail)
+        assert client.get('/api/result?prompt_id=x').get_json() == {'status': 'pending'}
+
+    def test_with_fields(self):
+        """Test fields are spliced into JSON object bodies without duplicating keys"""
+        assert upstream_json.with_fields(b'{}', eta_seconds=1.5) == b'{"eta_seconds":1.5}'
+        assert upstream_json.with_fields(b'{"status":"queued"}', eta_seconds=2) == b'{"eta_seconds":2,"status":"queued"}'
+        assert upstream_json.with_fields(b'[1]', eta_seconds=2) == b'[1]'
+        assert upstream_json.with_fields(b'{"eta_seconds":5}', eta_seconds=2) == b'{"eta_seconds":5}'
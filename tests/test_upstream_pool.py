@@ -0,0 +1,111 @@
+"""
+Tests for multi-backend routing and prompt affinity
+"""
+import json
+import sys
+import time
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from upstream_pool import BackendPool, parse_server_urls
+
+
+class TestBackendPool:
+    """Test backend selection"""
+
+    def test_parse_server_urls(self):
+        """Test SERVER_URL accepts a list of backends"""
+        assert parse_server_urls('http://a:1, http://b:2/;http://a:1') == ['http://a:1', 'http://b:2']
+
+    def test_least_outstanding(self):
+        """Test new jobs go to the backend with the fewest outstanding jobs"""
+        pool = BackendPool(['http://a', 'http://b'])
+        pool.begin_job(pool.get('http://a'), 'p1')
+        assert all(pool.choose().url == 'http://b' for _ in range(4))
+
+        pool.finish_job('p1')
+        assert {pool.choose().url for _ in range(4)} == {'http://a', 'http://b'}
+
+    def test_unhealthy_backend_skipped(self):
+        """Test backends marked down are not chosen while others are up"""
+        pool = BackendPool(['http://a', 'http://b'])
+        pool.get('http://b').healthy = False
+        assert all(pool.choose().url == 'http://a' for _ in range(4))
+
+    def test_outstanding_expires(self):
+        """Test jobs never seen completing stop counting after job_ttl"""
+        pool = BackendPool(['http://a'], job_ttl=0.01)
+        pool.begin_job(pool.primary, 'p1')
+        time.sleep(0.02)
+        assert pool.primary.outstanding() == 0
+
+
+class TestPromptAffinity:
+    """Test follow-up calls are pinned to the backend owning the job"""
+
+    def test_follow_up_calls_pinned(self, fake_upstream, monkeypatch):
+        """Test result and view requests reach the backend that ran the job"""
+        first, second = fake_upstream('a'), fake_upstream('b')
+        monkeypatch.setenv('SERVER_URL', f'{first.url},{second.url}')
+        monkeypatch.setenv('PREFETCH_RESULTS', 'false')
+        from app_local import LocalJob, create_app
+
+        app = create_app(database_uri='sqlite:///:memory:')
+        with app.test_client() as client:
+            prompt_ids = [client.post('/api/generate', json={'mode': 'txt2img'}).get_json()['prompt_id']
+                          for _ in range(2)]
+            assert sorted(prompt_ids) == ['prompt-a', 'prompt-b']
+
+            for prompt_id in prompt_ids:
+                name = prompt_id.split('-')[1]
+                result = client.get(f'/api/result?prompt_id={prompt_id}').get_json()
+                assert result['images'][0]['filename'] == f'{name}.png'
+                view = client.get(result['images'][0]['url'])
+                assert view.data == f'image-from-{name}'.encode()
+
+        with app.app_context():
+            owners = {job.prompt_id: job.backend for job in LocalJob.query.all()}
+        assert owners == {'prompt-a': first.url, 'prompt-b': second.url}
+
+    def test_untagged_view_tries_each_backend(self, fake_upstream, monkeypatch):
+        """Test view links without a backend parameter still find the file"""
+        first, second = fake_upstream('a'), fake_upstream('b')
+        monkeypatch.setenv('SERVER_URL', f'{first.url},{second.url}')
+        monkeypatch.setenv('PREFETCH_RESULTS', 'false')
+        from app_local import create_app
+
+        client = create_app(database_uri='sqlite:///:memory:').test_client()
+        assert client.get('/api/proxy/view?filename=b.png').data == b'image-from-b'
+        missing = client.get('/api/proxy/view?filename=c.png')
+        assert missing.status_code == 404
+        assert json.loads(missing.data) == {'error': 'not found'}
+
+    def test_missing_prompt_id_not_counted(self, fake_upstream, monkeypatch):
+        """Test jobs accepted without a prompt_id do not count as outstanding"""
+        upstream = fake_upstream('a')
+        upstream.routes[('POST', '/api/generate')] = lambda req: (200, {'job_id': 1})
+        monkeypatch.setenv('SERVER_URL', upstream.url)
+        monkeypatch.setenv('PREFETCH_RESULTS', 'false')
+        from app_local import create_app
+
+        client = create_app(database_uri='sqlite:///:memory:').test_client()
+        assert client.post('/api/generate', json={'mode': 'txt2img'}).status_code == 200
+        assert client.application.extensions['api_client'].pool.primary.outstanding() == 0
+
+    def test_outstanding_shared_between_workers(self, fake_upstream, monkeypatch, tmp_path):
+        """Test workers sharing a cache see one load and any of them releases finished jobs"""
+        upstream = fake_upstream('a')
+        monkeypatch.setenv('SERVER_URL', upstream.url)
+        monkeypatch.setenv('PREFETCH_RESULTS', 'false')
+        monkeypatch.setenv('SHARED_CACHE_PATH', str(tmp_path / 'cache.db'))
+        from app_local import create_app
+
+        workers = [create_app(database_uri='sqlite:///:memory:').test_client() for _ in range(2)]
+        backends = [worker.application.extensions['api_client'].pool.primary for worker in workers]
+        workers[0].post('/api/generate', json={'mode': 'txt2img'})
+        assert [backend.outstanding() for backend in backends] == [1, 1]
+
+        workers[1].get('/api/result?prompt_id=prompt-a')
+        assert [backend.outstanding() for backend in backends] == [0, 0]
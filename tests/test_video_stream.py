@@ -0,0 +1,97 @@
+"""
+Tests for the Range-capable video playback route
+"""
+import gzip
+import re
+import sys
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+VIDEO = bytes(range(256)) * 40
+
+
+def _serve_video(req):
+    match = re.fullmatch(r'bytes=(\d+)-(\d*)', req['headers'].get('Range', ''))
+    if not match:
+        return 200, VIDEO, 'video/mp4', {'Accept-Ranges': 'bytes'}
+    start = int(match.group(1))
+    end = int(match.group(2) or len(VIDEO) - 1)
+    return 206, VIDEO[start:end + 1], 'video/mp4', {'Content-Range': f'bytes {start}-{end}/{len(VIDEO)}'}
+
+
+def _client(fake_upstream, monkeypatch, tmp_path, cache):
+    upstream = fake_upstream('a')
+    upstream.routes[('POST', '/api/video/generate')] = lambda req: (200, {'task_id': 't1'})
+    upstream.routes[('GET', '/api/video/status/t1')] = lambda req: (200, {'status': 'done', 'video_url': '/videos/t1.mp4'})
+    upstream.routes[('GET', '/videos/t1.mp4')] = _serve_video
+    monkeypatch.setenv('SERVER_URL', upstream.url)
+    monkeypatch.setenv('PREFETCH_RESULTS', 'false')
+    monkeypatch.setenv('DOWNLOAD_DIR', str(tmp_path))
+    monkeypatch.setenv('VIDEO_CACHE', 'true' if cache else 'false')
+    from app_local import create_app
+
+    client = create_app(database_uri='sqlite:///:memory:').test_client()
+    client.post('/api/video/generate', json={'prompt': 'sea'})
+    assert client.get('/api/video/status/t1').get_json()['status'] == 'done'
+    return upstream, client
+
+
+class TestVideoStream:
+    """Test videos stream with Range support and optional local caching"""
+
+    def test_range_forwarded(self, fake_upstream, monkeypatch, tmp_path):
+        """Test Range requests are forwarded and partial content streams back"""
+        upstream, client = _client(fake_upstream, monkeypatch, tmp_path, cache=False)
+
+        response = client.get('/api/video/file/t1', headers={'Range': 'bytes=100-199'})
+        assert response.status_code == 206
+        assert response.headers['Content-Range'] == f'bytes 100-199/{len(VIDEO)}'
+        assert response.headers['Content-Type'] == 'video/mp4'
+        assert response.data == VIDEO[100:200]
+        assert upstream.requests[-1]['headers']['Range'] == 'bytes=100-199'
+
+        response = client.get('/api/video/file/t1?download=1')
+        assert (response.status_code, response.data) == (200, VIDEO)
+        assert response.headers['Accept-Ranges'] == 'bytes'
+        assert response.headers['Content-Disposition'].startswith('attachment')
+        assert client.get('/api/video/file/unknown').status_code == 404
+
+    def test_encoded_body_forwarded_as_is(self, fake_upstream, monkeypatch, tmp_path):
+        """Test compressed upstream bodies keep matching Content-Length and Content-Encoding"""
+        upstream, client = _client(fake_upstream, monkeypatch, tmp_path, cache=False)
+        compressed = gzip.compress(VIDEO)
+        upstream.routes[('GET', '/videos/t1.mp4')] = lambda req: (200, compressed, 'video/mp4', {'Content-Encoding': 'gzip'})
+
+        response = client.get('/api/video/file/t1', headers={'Accept-Encoding': 'gzip'})
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert response.headers['Content-Length'] == str(len(compressed))
+        assert response.data == compressed
+        assert upstream.requests[-1]['headers']['Accept-Encoding'] == 'gzip'
+
+        client.get('/api/video/file/t1').close()
+        assert upstream.requests[-1]['headers']['Accept-Encoding'] == 'identity'
+
+    def test_completed_video_cached(self, fake_upstream, monkeypatch, tmp_path):
+        """Test a completed video is cached and later seeks are served from disk"""
+        upstream, client = _client(fake_upstream, monkeypatch, tmp_path, cache=True)
+        cache = client.application.extensions['video_cache']
+        cache.wait('t1', timeout=5)
+        assert (tmp_path / 'videos' / 't1.mp4').read_bytes() == VIDEO
+
+        fetches = sum(req['path'] == '/videos/t1.mp4' for req in upstream.requests)
+        response = client.get('/api/video/file/t1', headers={'Range': 'bytes=1000-'})
+        assert response.status_code == 206
+        assert response.data == VIDEO[1000:]
+        response.close()
+        assert sum(req['path'] == '/videos/t1.mp4' for req in upstream.requests) == fetches
+
+    def test_unsafe_task_ids_not_cached(self, tmp_path):
+        """Test task ids cannot escape the cache directory"""
+        from video_stream import VideoCache
+
+        cache = VideoCache(None, str(tmp_path), max_workers=1)
+        assert cache.local_path('../x') is None
+        assert cache.local_path('..') is None
+        assert cache.local_path('abc-1.2') == tmp_path.resolve() / 'abc-1.2.mp4'
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+上游JSON响应透传 - 原样转发远程服务器的响应字节与状态码
+只在需要读取字段（如 job_id、prompt_id、status）时才解析，优先使用 orjson
+"""
+
+import json
+from typing import Any, Optional
+
+from flask import Response
+
+try:
+    import orjson
+except ImportError:  # orjson 为可选依赖，缺失时使用标准库
+    orjson = None
+
+
+def loads(data: bytes) -> Any:
+    """解析JSON字节"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(value: Any) -> bytes:
+    """序列化为JSON字节"""
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def try_loads(data: bytes) -> Optional[Any]:
+    """解析JSON字节，不是合法JSON时返回 None"""
+    try:
+        return loads(data)
+    except ValueError:
+        return None
+
+
+def mentions(data: bytes, *values: str) -> bool:
+    """响应体中是否出现某个JSON字符串值
+
+    只是字节级粗筛，用于跳过轮询中占多数的“进行中”响应的解析；命中后仍需解析确认。
+    """
+    return any(b'"' + value.encode('utf-8') + b'"' in data for value in values)
+
+
+def with_fields(data: bytes, **fields) -> bytes:
+    """在JSON对象开头插入字段，其余字节保持不变；不是JSON对象时原样返回
+
+    响应体中已出现同名键时不插入该字段，避免产生重复键。
+    """
+    fields = {key: value for key, value in fields.items() if not mentions(data, key)}
+    body = data.lstrip()
+    if not fields or not body.startswith(b'{'):
+        return data
+    extra = json.dumps(fields, ensure_ascii=False, separators=(',', ':')).encode('utf-8')[1:-1]
+    rest = body[1:].lstrip()
+    return b'{' + extra + (b'' if rest.startswith(b'}') else b',') + rest
+
+
+def passthrough(response, **fields) -> Response:
+    """把上游响应体、状态码和内容类型原样返回给客户端，给出 fields 时插入这些字段"""
+    content_type = response.headers.get('Content-Type') or 'application/json'
+    return Response(with_fields(response.content, **fields), status=response.status_code, content_type=content_type)
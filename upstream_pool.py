@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+多后端上游池 - 按未完成任务数与健康状态路由，并维护任务/文件与后端的亲和映射
+"""
+
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+
+def parse_server_urls(value: str) -> List[str]:
+    """解析 SERVER_URL，支持逗号、分号或空白分隔的多个后端"""
+    urls = [u.strip().rstrip('/') for u in re.split(r'[,;\s]+', value or '') if u.strip()]
+    # 去重并保持顺序
+    return list(dict.fromkeys(urls))
+
+
+def backend_tag(url: str) -> str:
+    """后端地址的短标识，用于区分各后端上同名的输出文件（ComfyUI 按实例计数命名）"""
+    return hashlib.sha1(url.rstrip('/').encode('utf-8')).hexdigest()[:10]
+
+
+class Backend:
+    """单个GPU后端
+
+    给出 cache（见 shared_cache）时未完成任务记录在缓存中，多个 worker 进程看到同一个负载，
+    任一进程观察到任务结束都会释放；否则记录在进程内。
+    """
+
+    def __init__(self, url: str, job_ttl: float, cache=None):
+        self.url = url
+        self.tag = backend_tag(url)
+        self.job_ttl = job_ttl
+        self.cache = cache
+        # 后台探测结果，首次探测完成前为 None
+        self.healthy: Optional[bool] = None
+        # 未完成任务: prompt_id -> 提交时间
+        self._jobs: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def _job_key(self, key: str) -> str:
+        return f"jobs:{self.url}:{key}"
+
+    def outstanding(self) -> int:
+        """未完成任务数，超过 job_ttl 仍未见完成的任务视为已丢失"""
+        if self.cache is not None:
+            return self.cache.count(self._job_key(''))
+        cutoff = time.monotonic() - self.job_ttl
+        with self._lock:
+            expired = [key for key, ts in self._jobs.items() if ts < cutoff]
+            for key in expired:
+                del self._jobs[key]
+            return len(self._jobs)
+
+    def begin_job(self, key: str):
+        if self.cache is not None:
+            self.cache.set(self._job_key(key), 1, ttl=self.job_ttl)
+            return
+        with self._lock:
+            self._jobs[key] = time.monotonic()
+
+    def finish_job(self, key: str) -> bool:
+        if self.cache is not None:
+            return self.cache.delete(self._job_key(key))
+        with self._lock:
+            return self._jobs.pop(key, None) is not None
+
+    def to_dict(self) -> dict:
+        return {'url': self.url, 'tag': self.tag, 'healthy': self.healthy, 'outstanding': self.outstanding()}
+
+
+class BackendPool:
+    """后端池
+
+    新任务路由到健康后端中未完成任务最少的一个（相同时轮询），
+    后续请求通过 pin()/pinned() 固定到拥有该任务或文件的后端；
+    给出 cache（见 shared_cache）时归属关系与未完成任务数在多个 worker 进程间共享。
+    """
+
+    def __init__(self, urls: List[str], job_ttl: float = 1800, affinity_size: int = 10000,
+                 cache=None, pin_ttl: float = 86400):
+        if not urls:
+            raise ValueError("至少需要配置一个后端地址")
+        self.backends = [Backend(url, job_ttl, cache) for url in urls]
+        self._by_url = {b.url: b for b in self.backends}
+        self._by_tag = {b.tag: b for b in self.backends}
+        self._affinity: 'OrderedDict[str, str]' = OrderedDict()
+        self._affinity_size = affinity_size
+        self._cache = cache
+        self._pin_ttl = pin_ttl
+        self._lock = threading.Lock()
+        self._rr = 0
+
+    @property
+    def primary(self) -> Backend:
+        """第一个后端，用于无法确定归属的请求"""
+        return self.backends[0]
+
+    def get(self, url: Optional[str]) -> Optional[Backend]:
+        """按地址查找后端，已不在配置中的地址返回 None"""
+        return self._by_url.get((url or '').rstrip('/'))
+
+    def by_tag(self, tag: Optional[str]) -> Optional[Backend]:
+        """按短标识查找后端"""
+        return self._by_tag.get(tag or '')
+
+    def choose(self) -> Backend:
+        """选择新任务的后端"""
+        candidates = [b for b in self.backends if b.healthy is not False] or self.backends
+        with self._lock:
+            self._rr = (self._rr + 1) % len(candidates)
+            start = self._rr
+        ordered = candidates[start:] + candidates[:start]
+        return min(ordered, key=lambda b: b.outstanding())
+
+    def begin_job(self, backend: Backend, job_key: str):
+        """登记已提交的任务"""
+        backend.begin_job(job_key)
+        self.pin(job_key, backend.url)
+
+    def finish_job(self, job_key: str):
+        """任务完成或失败后释放计数"""
+        backend = self.get(self.pinned(job_key))
+        if backend:
+            backend.finish_job(job_key)
+
+    def pin(self, key: str, url: str):
+        """记录 key（prompt_id、上传路径、输出文件名等）归属的后端"""
+        if not key:
+            return
+        self._remember(key, url)
+        if self._cache is not None:
+            self._cache.set(f"pin:{key}", url, ttl=self._pin_ttl)
+
+    def _remember(self, key: str, url: str):
+        with self._lock:
+            self._affinity[key] = url
+            self._affinity.move_to_end(key)
+            while len(self._affinity) > self._affinity_size:
+                self._affinity.popitem(last=False)
+
+    def pinned(self, key: str) -> Optional[str]:
+        """查询 key 归属的后端地址"""
+        if not key:
+            return None
+        with self._lock:
+            url = self._affinity.get(key)
+        if url is None and self._cache is not None:
+            # 其他 worker 记录的归属
+            url = self._cache.get(f"pin:{key}")
+            if url:
+                self._remember(key, url)
+        return url if url in self._by_url else None
+
+    @property
+    def healthy(self) -> Optional[bool]:
+        """任一后端可用即视为可用，全部尚未探测时为 None"""
+        states = [b.healthy for b in self.backends]
+        if all(s is None for s in states):
+            return None
+        return any(states)
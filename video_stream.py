@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+视频播放代理 - 按 HTTP Range 分段转发远程服务器上的视频，浏览器可以随意拖动进度
+转发时不缓冲整个文件；启用本地缓存时，完成的视频在后台下载到 downloads/videos，
+之后的请求（含 Range）直接从磁盘返回
+"""
+
+import os
+import re
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Optional
+
+from flask import Response
+
+# 转发给上游的请求头（Range、条件请求与浏览器可接受的压缩方式）
+FORWARD_REQUEST_HEADERS = ('Range', 'If-Range', 'If-None-Match', 'If-Modified-Since', 'Accept-Encoding')
+# 返回给浏览器的上游响应头；响应体按原始字节转发，Content-Length 与 Content-Encoding 保持一致
+FORWARD_RESPONSE_HEADERS = ('Content-Length', 'Content-Encoding', 'Content-Range', 'Accept-Ranges', 'ETag',
+                            'Last-Modified', 'Cache-Control')
+# 可用作缓存文件名的任务ID
+TASK_ID_RE = re.compile(r'[\w.-]{1,128}')
+
+CHUNK_SIZE = 256 * 1024
+
+
+def request_headers(incoming) -> Dict[str, str]:
+    """转发给上游的请求头；浏览器未声明压缩方式时要求上游不压缩"""
+    headers = {name: incoming[name] for name in FORWARD_REQUEST_HEADERS if name in incoming}
+    headers.setdefault('Accept-Encoding', 'identity')
+    return headers
+
+
+def stream_response(upstream) -> Response:
+    """把上游的流式响应原样转发（状态码 200/206/304/416 及 Range 相关响应头）
+
+    转发 raw 字节而不是 iter_content()，后者会解压 gzip/deflate，与转发的 Content-Length 不符。
+    """
+    headers = {name: upstream.headers[name] for name in FORWARD_RESPONSE_HEADERS if name in upstream.headers}
+    headers.setdefault('Accept-Ranges', 'bytes')
+    response = Response(
+        upstream.raw.stream(CHUNK_SIZE, decode_content=False),
+        status=upstream.status_code,
+        headers=headers,
+        mimetype=upstream.headers.get('Content-Type', 'video/mp4'),
+        direct_passthrough=True,
+    )
+    # HEAD 请求或浏览器中途断开时也要释放上游连接
+    response.call_on_close(upstream.close)
+    return response
+
+
+class VideoCache:
+    """完成视频的本地缓存
+
+    同一视频同时只下载一次；先写入临时文件再原子替换，读取方不会看到半个文件。
+    """
+
+    def __init__(self, session, cache_dir: str, max_workers: int = 2, timeout: float = 300):
+        self.session = session
+        self.cache_dir = Path(cache_dir).resolve()
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='video-cache')
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def local_path(self, task_id: str) -> Optional[Path]:
+        """视频在本地缓存中的位置，任务ID不适合作为文件名时返回 None"""
+        if not TASK_ID_RE.fullmatch(task_id) or task_id.startswith('.'):
+            return None
+        return self.cache_dir / f"{task_id}.mp4"
+
+    def lookup(self, task_id: str) -> Optional[Path]:
+        path = self.local_path(task_id)
+        return path if path is not None and path.exists() else None
+
+    def remove(self, task_id: str) -> bool:
+        """删除缓存的视频"""
+        path = self.lookup(task_id)
+        if path is None:
+            return False
+        path.unlink(missing_ok=True)
+        return True
+
+    def submit(self, task_id: str, url: str):
+        """在后台下载完成的视频"""
+        path = self.local_path(task_id)
+        if path is None or path.exists():
+            return
+        with self._lock:
+            if task_id in self._inflight:
+                return
+            future = self._executor.submit(self._download, url, path)
+            self._inflight[task_id] = future
+        future.add_done_callback(lambda _, t=task_id: self._done(t))
+
+    def wait(self, task_id: str, timeout: float = None):
+        """等待正在进行的下载（测试与关闭时使用）"""
+        with self._lock:
+            future = self._inflight.get(task_id)
+        if future is not None:
+            future.exception(timeout=timeout)
+
+    def _done(self, task_id: str):
+        with self._lock:
+            future = self._inflight.pop(task_id, None)
+        if future is not None and future.exception() is not None:
+            print(f"⚠️ 缓存视频失败 {task_id}: {future.exception()}")
+
+    def _download(self, url: str, path: Path):
+        response = self.session.get(url, timeout=self.timeout, stream=True)
+        try:
+            if response.status_code != 200:
+                return
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_name(f".{path.name}.{threading.get_ident()}.part")
+            try:
+                with open(tmp, 'wb') as f:
+                    for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                        f.write(chunk)
+                os.replace(tmp, path)
+            finally:
+                if tmp.exists():
+                    tmp.unlink()
+        finally:
+            response.close()